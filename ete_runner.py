@@ -0,0 +1,307 @@
+"""
+Run the Makefile's end-to-end test targets as a dependency graph.
+
+`make test-end-to-end` used to run its seven targets one after another,
+although only the targets of the same policy depend on each other:
+
+    test-act-ete-train -> test-act-ete-train-resume -> test-act-ete-eval
+    test-diffusion-ete-train -> test-diffusion-ete-eval
+    test-tdmpc-ete-train -> test-tdmpc-ete-eval
+
+This runner starts every target whose dependencies have succeeded, as long
+as the CPUs and memory it is expected to use fit in the budget, so the
+independent chains run at the same time and the wall time comes down to
+about that of the longest chain. Each target still runs through `make`,
+so the Makefile stays the one place its command line is defined.
+
+Output lines are prefixed with the target's short name. The first failure
+stops the jobs still running and nothing else is started.
+
+Usage:
+    python ete_runner.py
+    python ete_runner.py --device cuda --cpus 8 --memory-gb 32
+    python ete_runner.py --only act,diffusion --dry-run
+"""
+
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from collections import namedtuple
+
+# A Makefile target, the targets it needs, and the CPUs and memory (GB) it
+# is expected to use on DEVICE=cpu
+Job = namedtuple("Job", ["target", "needs", "cpus", "memory_gb"])
+
+JOBS = [
+    Job("test-act-ete-train", [], 2, 3.0),
+    Job("test-act-ete-train-resume", ["test-act-ete-train"], 2, 3.0),
+    Job("test-act-ete-eval", ["test-act-ete-train-resume"], 1, 2.0),
+    Job("test-diffusion-ete-train", [], 2, 3.0),
+    Job("test-diffusion-ete-eval", ["test-diffusion-ete-train"], 1, 2.0),
+    Job("test-tdmpc-ete-train", [], 2, 3.0),
+    Job("test-tdmpc-ete-eval", ["test-tdmpc-ete-train"], 1, 2.0),
+]
+
+
+def short_name(target):
+    """e.g. "test-act-ete-train-resume" -> "act-train-resume"."""
+    return target.removeprefix("test-").replace("-ete-", "-")
+
+
+def total_memory_gb():
+    """Return the machine's memory in GB, or None if it is unknown."""
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 1e9
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def check_graph(jobs):
+    """Raise ValueError if a job needs an unknown job or the graph has a cycle."""
+    by_target = {job.target: job for job in jobs}
+    for job in jobs:
+        for need in job.needs:
+            if need not in by_target:
+                raise ValueError(f"{job.target} needs unknown target {need}")
+
+    done = set()
+    visiting = set()
+
+    def visit(target):
+        if target in done:
+            return
+        if target in visiting:
+            raise ValueError(f"Dependency cycle through {target}")
+        visiting.add(target)
+        for need in by_target[target].needs:
+            visit(need)
+        visiting.discard(target)
+        done.add(target)
+
+    for job in jobs:
+        visit(job.target)
+
+
+def select_jobs(jobs, only):
+    """Keep the jobs whose short name starts with one of `only` (e.g. "act"), plus what they need."""
+    if not only:
+        return list(jobs)
+    by_target = {job.target: job for job in jobs}
+    selected = set()
+    stack = [job.target for job in jobs if any(short_name(job.target).startswith(name) for name in only)]
+    while stack:
+        target = stack.pop()
+        if target not in selected:
+            selected.add(target)
+            stack.extend(by_target[target].needs)
+    return [job for job in jobs if job.target in selected]
+
+
+def chains(jobs):
+    """Return the longest dependency chain ending at each job, as lists of targets."""
+    by_target = {job.target: job for job in jobs}
+    longest = {}
+
+    def chain(target):
+        if target not in longest:
+            needs = [chain(need) for need in by_target[target].needs]
+            longest[target] = max(needs, key=len, default=[]) + [target]
+        return longest[target]
+
+    return {job.target: chain(job.target) for job in jobs}
+
+
+class Scheduler:
+    """
+    Start jobs once their dependencies succeeded and they fit in the budget.
+
+    A job larger than the whole budget still runs, alone, so the budget
+    only limits concurrency and never deadlocks the graph.
+
+    Args:
+        jobs (list): `Job`s to run
+        start (callable): Starts a job and returns its running handle
+        cpus (float): CPU budget
+        memory_gb (float): Memory budget, None for no limit
+    """
+
+    def __init__(self, jobs, start, cpus, memory_gb=None):
+        check_graph(jobs)
+        self.jobs = jobs
+        self.start = start
+        self.cpus = cpus
+        self.memory_gb = memory_gb
+        self.running = {}  # target -> handle
+        self.succeeded = set()
+        self.failed = set()
+
+    def _fits(self, job):
+        if not self.running:
+            return True
+        running = [job for job in self.jobs if job.target in self.running]
+        cpus = sum(other.cpus for other in running) + job.cpus
+        memory = sum(other.memory_gb for other in running) + job.memory_gb
+        return cpus <= self.cpus and (self.memory_gb is None or memory <= self.memory_gb)
+
+    def pending(self):
+        finished = self.succeeded | self.failed
+        return [job for job in self.jobs if job.target not in finished and job.target not in self.running]
+
+    def start_ready(self):
+        """Start every ready job that fits, in the order of `jobs`; return their targets."""
+        started = []
+        if self.failed:
+            return started  # Fail fast
+        for job in self.pending():
+            if all(need in self.succeeded for need in job.needs) and self._fits(job):
+                self.running[job.target] = self.start(job)
+                started.append(job.target)
+        return started
+
+    def finished(self, target, success):
+        del self.running[target]
+        (self.succeeded if success else self.failed).add(target)
+
+    def done(self):
+        return not self.running and (bool(self.failed) or not self.pending())
+
+
+class MakeJob:
+    """
+    A Makefile target running in its own process group, with its output
+    printed line by line behind a prefix.
+    """
+
+    def __init__(self, job, device, print_lock, prefix_width, make=None):
+        self.job = job
+        self.started = time.monotonic()
+        self.duration_s = None
+        env = dict(os.environ)
+        # Keep each job's torch/BLAS threads within its CPU share
+        for name in ["OMP_NUM_THREADS", "MKL_NUM_THREADS"]:
+            env[name] = str(job.cpus)
+        self.process = subprocess.Popen(
+            [make or os.environ.get("MAKE", "make"), "--no-print-directory", f"DEVICE={device}", job.target],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1,
+            env=env,
+            start_new_session=True,
+        )
+        self.prefix = f"[{short_name(job.target)}]".ljust(prefix_width + 2)
+        self.print_lock = print_lock
+        self.reader = threading.Thread(target=self._print_output, daemon=True)
+        self.reader.start()
+
+    def _print_output(self):
+        for line in self.process.stdout:
+            with self.print_lock:
+                print(f"{self.prefix} {line.rstrip()}", flush=True)
+
+    def poll(self):
+        """Return the exit code, or None while running."""
+        return_code = self.process.poll()
+        if return_code is not None and self.duration_s is None:
+            self.reader.join()
+            self.duration_s = time.monotonic() - self.started
+        return return_code
+
+    def stop(self):
+        """Terminate the whole process group (make and the python it started)."""
+        try:
+            os.killpg(self.process.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            return
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            os.killpg(self.process.pid, signal.SIGKILL)
+            self.process.wait()
+
+
+def run(jobs, device="cpu", cpus=None, memory_gb=None, poll_interval=0.2):
+    """
+    Run `jobs` and print a summary.
+
+    Returns:
+        dict: target -> (exit code or None if it never started, duration in s)
+    """
+    print_lock = threading.Lock()
+    width = max(len(short_name(job.target)) for job in jobs)
+    handles = {}
+
+    def start(job):
+        with print_lock:
+            print(f"==> Starting {job.target}", flush=True)
+        handles[job.target] = MakeJob(job, device, print_lock, width)
+        return handles[job.target]
+
+    scheduler = Scheduler(jobs, start, cpus or os.cpu_count() or 1, memory_gb)
+    started = time.monotonic()
+    try:
+        scheduler.start_ready()
+        while not scheduler.done():
+            time.sleep(poll_interval)
+            for target, handle in list(scheduler.running.items()):
+                return_code = handle.poll()
+                if return_code is None:
+                    continue
+                scheduler.finished(target, return_code == 0)
+                with print_lock:
+                    status = "ok" if return_code == 0 else f"FAILED with exit code {return_code}"
+                    print(f"==> {target} {status} in {handle.duration_s:.1f}s", flush=True)
+                if return_code != 0:
+                    for other in scheduler.running.values():
+                        other.stop()
+            scheduler.start_ready()
+    finally:
+        for handle in scheduler.running.values():
+            handle.stop()
+
+    wall_time_s = time.monotonic() - started
+    results = {
+        job.target: (
+            handles[job.target].poll() if job.target in handles else None,
+            handles[job.target].duration_s if job.target in handles else None,
+        )
+        for job in jobs
+    }
+
+    print(f"\n{'target':<28} {'result':<10} {'time':>8}")
+    for target, (return_code, duration_s) in results.items():
+        result = "not run" if return_code is None else "ok" if return_code == 0 else f"exit {return_code}"
+        duration = f"{duration_s:.1f}s" if duration_s is not None else "-"
+        print(f"{target:<28} {result:<10} {duration:>8}")
+    serial_s = sum(duration_s for _, duration_s in results.values() if duration_s is not None)
+    print(f"Wall time {wall_time_s:.1f}s, {serial_s:.1f}s of jobs")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the end-to-end test targets in parallel")
+    parser.add_argument("--device", type=str, default=os.environ.get("DEVICE", "cpu"))
+    parser.add_argument("--cpus", type=float, default=os.cpu_count(), help="CPU budget")
+    parser.add_argument("--memory-gb", type=float, default=None,
+                        help="Memory budget, defaults to 80%% of the machine's memory")
+    parser.add_argument("--only", type=str, default=None, help="Comma-separated policies, e.g. act,tdmpc")
+    parser.add_argument("--dry-run", action="store_true", help="Print the dependency chains and exit")
+    args = parser.parse_args()
+
+    jobs = select_jobs(JOBS, args.only.split(",") if args.only else None)
+    if args.dry_run:
+        longest = chains(jobs)
+        for job in jobs:
+            if not any(job.target in chain[:-1] for chain in longest.values()):
+                print(" -> ".join(longest[job.target]))
+        sys.exit(0)
+
+    memory_gb = args.memory_gb
+    if memory_gb is None and total_memory_gb() is not None:
+        memory_gb = 0.8 * total_memory_gb()
+    results = run(jobs, args.device, args.cpus, memory_gb)
+    sys.exit(0 if all(return_code == 0 for return_code, _ in results.values()) else 1)
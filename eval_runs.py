@@ -0,0 +1,274 @@
+"""
+Run several evaluations of a policy in parallel and summarize them.
+
+Each run gets its own seed and its own directory under the work directory,
+so runs never share (or have to delete) a dataset.
+
+Two kinds of runs are supported:
+
+- `sim`: lerobot/scripts/eval.py on a simulated env, with its own
+  `HF_LEROBOT_HOME`. Runs are run by parallel workers, and each run steps
+  `--batch-size` vectorized envs (`eval.batch_size`). eval.py steps them
+  synchronously in one process, so by default every run gets a worker (up
+  to one per CPU) and the CPUs are split between them. Success and reward
+  come from each run's eval_info.json and are combined into one summary
+  with 95% confidence intervals.
+- `robot`: `lerobot.record` with a policy on a real robot, one dataset
+  (`<repo-id>_run<N>`) per run, recorded under the run's directory with
+  `--dataset.root`. `HF_LEROBOT_HOME` is left alone, so the robot's
+  calibration (from `make cal-fol`) is found. All runs drive the same arm,
+  so they run one at a time. record.py does not score episodes, so only
+  the return codes are summarized.
+
+Usage:
+    python eval_runs.py sim --policy-path lerobot/diffusion_pusht --env-type pusht --runs 5 --n-episodes 50
+    python eval_runs.py robot --runs 1 2 3 4 5 --repo-id Razane-1/eval_record-test -- \\
+        --robot.type=so100_follower --robot.port=/dev/tty.usbmodem58760434471 ...
+"""
+
+import argparse
+import json
+import math
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+EVAL_INFO_NAME = "eval_info.json"
+
+# Two-sided 95% critical values of Student's t, by degrees of freedom
+T_95 = {1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365, 8: 2.306, 9: 2.262, 10: 2.228,
+        15: 2.131, 20: 2.086, 30: 2.042}
+Z_95 = 1.96
+
+
+def t_critical(dof):
+    """Return the 95% t critical value for `dof` degrees of freedom (rounded down to a tabulated one)."""
+    tabulated = [value for value in T_95 if value <= dof]
+    return T_95[max(tabulated)] if dof <= 30 else Z_95
+
+
+def wilson_interval(successes, n, z=Z_95):
+    """Return the Wilson score interval of a success rate, as fractions."""
+    if n == 0:
+        return None, None
+    p = successes / n
+    denominator = 1 + z ** 2 / n
+    center = (p + z ** 2 / (2 * n)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / n + z ** 2 / (4 * n ** 2)) / denominator
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+
+def mean_interval(values):
+    """Return the mean of `values` and its 95% t confidence interval."""
+    n = len(values)
+    if n == 0:
+        return None, None, None
+    mean = sum(values) / n
+    if n == 1:
+        return mean, None, None
+    std = math.sqrt(sum((value - mean) ** 2 for value in values) / (n - 1))
+    margin = t_critical(n - 1) * std / math.sqrt(n)
+    return mean, mean - margin, mean + margin
+
+
+def sim_command(policy_path, env_type, n_episodes, batch_size, device, output_dir, seed, extra_args=()):
+    """Build the eval.py command line of a simulated run."""
+    return [
+        sys.executable, "lerobot/scripts/eval.py",
+        f"--policy.path={policy_path}",
+        f"--policy.device={device}",
+        f"--env.type={env_type}",
+        f"--eval.n_episodes={n_episodes}",
+        f"--eval.batch_size={min(batch_size, n_episodes)}",  # Vectorized envs
+        f"--seed={seed}",
+        f"--output_dir={output_dir}",
+        *extra_args,
+    ]
+
+
+def robot_command(run, repo_id, record_args, dataset_root):
+    """Build the lerobot.record command line of a robot run, recording to `dataset_root`."""
+    return [
+        sys.executable, "-m", "lerobot.record", *record_args,
+        f"--dataset.repo_id={repo_id}_run{run}",
+        f"--dataset.root={dataset_root}",
+    ]
+
+
+def run_process(name, cmd, env, print_lock):
+    """Run `cmd`, printing its output prefixed with `[name]`; return its exit code and duration."""
+    started = time.monotonic()
+    with print_lock:
+        print(f"==> Starting {name}: {' '.join(cmd)}", flush=True)
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1, env=env)
+    for line in process.stdout:
+        with print_lock:
+            print(f"[{name}] {line.rstrip()}", flush=True)
+    return_code = process.wait()
+    duration_s = time.monotonic() - started
+    with print_lock:
+        print(f"==> {name} {'ok' if return_code == 0 else f'FAILED with exit code {return_code}'} "
+              f"in {duration_s:.1f}s", flush=True)
+    return return_code, duration_s
+
+
+def run_all(runs, command_for, work_dir, workers, pause_s=0.0, threads_per_run=None, isolate_home=True):
+    """
+    Run every run with at most `workers` at a time.
+
+    Args:
+        runs (list): Run identifiers
+        command_for (callable): run -> (command line, output directory)
+        work_dir (str): Holds each run's `run<N>/` directory
+        workers (int): Runs at once
+        pause_s (float): Wait between the end of a run and the start of the
+            next one, only used with one worker (e.g. to let a robot settle)
+        threads_per_run (int): OMP/MKL threads of each run, None to leave unset
+        isolate_home (bool): Give each run its own `HF_LEROBOT_HOME`. Robot
+            runs keep the user's, which holds the calibration files.
+
+    Returns:
+        list: One dict per run with "run", "return_code", "duration_s" and "output_dir"
+    """
+    print_lock = threading.Lock()
+
+    def run_one(run):
+        run_dir = os.path.join(work_dir, f"run{run}")
+        env = dict(os.environ)
+        if isolate_home:
+            env["HF_LEROBOT_HOME"] = os.path.join(run_dir, "lerobot")
+        if threads_per_run:
+            env.update(OMP_NUM_THREADS=str(threads_per_run), MKL_NUM_THREADS=str(threads_per_run))
+        cmd, output_dir = command_for(run)
+        return_code, duration_s = run_process(f"run{run}", cmd, env, print_lock)
+        if workers == 1 and pause_s and run != runs[-1]:
+            time.sleep(pause_s)
+        return {"run": run, "return_code": return_code, "duration_s": duration_s, "output_dir": output_dir}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(run_one, runs))
+
+
+def summarize(results):
+    """
+    Combine the eval_info.json of every sim run.
+
+    Success is pooled over all episodes (Wilson interval). Rewards and
+    per-run success rates are averaged over runs (t interval).
+    """
+    rows = []
+    episode_successes = []
+    for result in results:
+        row = {"run": result["run"], "return_code": result["return_code"], "duration_s": result["duration_s"]}
+        info_path = os.path.join(result["output_dir"] or "", EVAL_INFO_NAME)
+        if result["return_code"] == 0 and os.path.isfile(info_path):
+            with open(info_path) as f:
+                info = json.load(f)
+            row.update(
+                n_episodes=len(info["per_episode"]),
+                pc_success=info["aggregated"]["pc_success"],
+                avg_sum_reward=info["aggregated"]["avg_sum_reward"],
+                avg_max_reward=info["aggregated"]["avg_max_reward"],
+            )
+            episode_successes.extend(bool(episode["success"]) for episode in info["per_episode"])
+        rows.append(row)
+
+    scored = [row for row in rows if "pc_success" in row]
+    low, high = wilson_interval(sum(episode_successes), len(episode_successes))
+    summary = {
+        "runs": len(rows),
+        "failed_runs": [row["run"] for row in rows if row["return_code"] != 0],
+        "episodes": len(episode_successes),
+        "pc_success": 100 * sum(episode_successes) / len(episode_successes) if episode_successes else None,
+        "pc_success_ci95": [100 * low, 100 * high] if low is not None else None,
+    }
+    for key in ["pc_success", "avg_sum_reward", "avg_max_reward"]:
+        mean, low, high = mean_interval([row[key] for row in scored])
+        summary[f"run_mean_{key}"] = mean
+        summary[f"run_mean_{key}_ci95"] = [low, high] if low is not None else None
+    return {"summary": summary, "runs": rows}
+
+
+def format_summary(report):
+    lines = [f"{'run':<6} {'result':<8} {'episodes':>8} {'success %':>10} {'sum reward':>11} {'time':>8}"]
+    for row in report["runs"]:
+        result = "ok" if row["return_code"] == 0 else f"exit {row['return_code']}"
+        success = f"{row['pc_success']:.1f}" if "pc_success" in row else "-"
+        reward = f"{row['avg_sum_reward']:.2f}" if "avg_sum_reward" in row else "-"
+        lines.append(f"{row['run']!s:<6} {result:<8} {row.get('n_episodes', '-')!s:>8} {success:>10} {reward:>11} "
+                     f"{row['duration_s']:>7.1f}s")
+
+    summary = report["summary"]
+    if summary.get("pc_success") is not None:
+        low, high = summary["pc_success_ci95"]
+        lines.append(f"Success: {summary['pc_success']:.1f}% over {summary['episodes']} episodes "
+                     f"(95% CI {low:.1f}-{high:.1f}%)")
+        reward_ci = summary["run_mean_avg_sum_reward_ci95"]
+        reward = f"{summary['run_mean_avg_sum_reward']:.2f}"
+        if reward_ci:
+            reward += f" (95% CI {reward_ci[0]:.2f}-{reward_ci[1]:.2f})"
+        lines.append(f"Sum reward per episode, mean over runs: {reward}")
+    if summary["failed_runs"]:
+        lines.append(f"Failed runs: {summary['failed_runs']}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run several policy evaluations in parallel")
+    subparsers = parser.add_subparsers(dest="mode", required=True)
+
+    sim_parser = subparsers.add_parser("sim", help="eval.py on a simulated env")
+    sim_parser.add_argument("--policy-path", required=True)
+    sim_parser.add_argument("--env-type", required=True)
+    sim_parser.add_argument("--runs", type=int, default=5)
+    sim_parser.add_argument("--n-episodes", type=int, default=50, help="Episodes per run")
+    sim_parser.add_argument("--batch-size", type=int, default=10, help="Vectorized envs per run")
+    sim_parser.add_argument("--device", default="cpu")
+    sim_parser.add_argument("--seed", type=int, default=1000, help="Seed of the first run, then +1 per run")
+    sim_parser.add_argument("--workers", type=int, default=None,
+                            help="Most runs at once, defaults to one per run up to one per CPU")
+
+    robot_parser = subparsers.add_parser("robot", help="lerobot.record with a policy on a real robot")
+    robot_parser.add_argument("--runs", nargs="+", default=["1", "2", "3", "4", "5"])
+    robot_parser.add_argument("--repo-id", required=True, help="Each run records to <repo-id>_run<N>")
+    robot_parser.add_argument("--pause-s", type=float, default=5.0, help="Pause between runs")
+
+    for subparser in [sim_parser, robot_parser]:
+        subparser.add_argument("--work-dir", default="outputs/eval_runs")
+        subparser.add_argument("extra_args", nargs="*", help="Passed on to eval.py / lerobot.record, after --")
+    args = parser.parse_args()
+
+    work_dir = os.path.join(args.work_dir, time.strftime("%Y%m%d_%H%M%S"))
+    if args.mode == "sim":
+        runs = list(range(1, args.runs + 1))
+        batch_size = min(args.batch_size, args.n_episodes)
+        # eval.py steps its vectorized envs in one process, so a run mostly
+        # keeps one CPU busy whatever --batch-size is
+        workers = min(len(runs), args.workers or os.cpu_count() or 1)
+
+        def command_for(run):
+            output_dir = os.path.join(work_dir, f"run{run}", "eval")
+            cmd = sim_command(args.policy_path, args.env_type, args.n_episodes, batch_size, args.device,
+                              output_dir, args.seed + run - 1, args.extra_args)
+            return cmd, output_dir
+
+        results = run_all(runs, command_for, work_dir, workers,
+                          threads_per_run=max(1, (os.cpu_count() or 1) // workers))
+        report = summarize(results)
+        print(format_summary(report))
+        os.makedirs(work_dir, exist_ok=True)
+        with open(os.path.join(work_dir, "summary.json"), "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Summary written to {os.path.join(work_dir, 'summary.json')}")
+    else:
+        def command_for(run):
+            dataset_root = os.path.join(work_dir, f"run{run}", "dataset")
+            return robot_command(run, args.repo_id, args.extra_args, dataset_root), dataset_root
+
+        results = run_all(args.runs, command_for, work_dir, workers=1, pause_s=args.pause_s, isolate_home=False)
+        for result in results:
+            print(f"run{result['run']}: exit {result['return_code']} in {result['duration_s']:.1f}s")
+    sys.exit(0 if all(result["return_code"] == 0 for result in results) else 1)
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Compare the latency of running print_params.py in-process and in a subprocess.
+
+Each command of the chat examples (plus `--help` and an argparse error) is
+run through both paths, checking first that they give the same exit code,
+stdout and stderr (the `Execution time` line aside). Then p50/p99 latency is
+reported for each path.
+
+Usage:
+    python benchmark_runner.py
+    python benchmark_runner.py --iterations 500
+"""
+
+import argparse
+import re
+import shlex
+import statistics
+
+from command_runner import run_in_process, run_subprocess
+
+COMMANDS = [
+    "hello world",
+    "--name John --age 25",
+    "item1 item2 item3 --verbose",
+    "--name 'Jane Doe' --city 'New York' --debug",
+    "test --output results.txt --verbose",
+    "--help",
+    "--age notanumber",
+]
+
+_EXECUTION_TIME_RE = re.compile(r"^Execution time: .*$", re.MULTILINE)
+
+
+def comparable(result):
+    """The parts of a result both paths must agree on."""
+    return result.returncode, _EXECUTION_TIME_RE.sub("Execution time: -", result.stdout), result.stderr
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def check_parity(commands):
+    """Return the commands whose in-process result differs from the subprocess one."""
+    mismatches = []
+    for command in commands:
+        args = shlex.split(command)
+        if comparable(run_in_process(args)) != comparable(run_subprocess(args)):
+            mismatches.append(command)
+    return mismatches
+
+
+def time_path(run, commands, iterations):
+    """Return the latencies in ms of `iterations` runs, cycling through `commands`."""
+    argvs = [shlex.split(command) for command in commands]
+    return [run(argvs[i % len(argvs)]).duration_s * 1000 for i in range(iterations)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark in-process against subprocess execution")
+    parser.add_argument("--iterations", type=int, default=200, help="Runs per path")
+    args = parser.parse_args()
+
+    mismatches = check_parity(COMMANDS)
+    print(f"Output parity: {'ok' if not mismatches else f'differs for {mismatches}'}")
+
+    print(f"{'path':<12} {'p50 ms':>8} {'p99 ms':>8} {'mean ms':>8} {'msgs/s':>8}")
+    for name, run in [("subprocess", run_subprocess), ("in-process", run_in_process)]:
+        latencies = time_path(run, COMMANDS, args.iterations)
+        mean = statistics.mean(latencies)
+        print(f"{name:<12} {percentile(latencies, 0.5):>8.2f} {percentile(latencies, 0.99):>8.2f} "
+              f"{mean:>8.2f} {1000 / mean:>8.0f}")
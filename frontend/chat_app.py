@@ -9,77 +9,187 @@ import gradio as gr
 import subprocess
 import shlex
 import os
+import queue
+import time
 from datetime import datetime
 
+from chat_history import SessionStore, collapse
+from command_runner import SCRIPT_DIR, TIMEOUT_S, display_command, run_command
+from result_cache import CachePolicy, SingleFlightCache
+from worker_pool import Busy, FairPool
 
-def execute_print_params(user_message, history):
+# Commands run on a bounded pool; requests beyond it are rejected as busy
+# (see worker_pool.py)
+POOL = FairPool(
+    max_workers=int(os.environ.get("CHAT_MAX_WORKERS", 4)),
+    max_queue=int(os.environ.get("CHAT_MAX_QUEUE", 16)),
+    max_per_user=int(os.environ.get("CHAT_MAX_PER_USER", 2))
+)
+
+# Shortest time between two updates of a running command's output
+STREAM_INTERVAL_S = float(os.environ.get("CHAT_STREAM_INTERVAL_S", 0.25))
+
+# Results of repeated commands; CHAT_CACHE_MODE is "refresh", "exact" or "off"
+CACHE = SingleFlightCache(
+    CachePolicy(mode=os.environ.get("CHAT_CACHE_MODE", "refresh")),
+    max_entries=int(os.environ.get("CHAT_CACHE_ENTRIES", 256)),
+    ttl_s=float(os.environ.get("CHAT_CACHE_TTL_S", 300))
+)
+
+# Chat histories, kept on the server and bounded per session
+SESSIONS = SessionStore(
+    max_turns=int(os.environ.get("CHAT_MAX_TURNS", 50)),
+    preview_chars=int(os.environ.get("CHAT_PREVIEW_CHARS", 4000))
+)
+
+
+def session_id(request):
+    """The browser session of a request ("local" when called directly)."""
+    return request.session_hash if request is not None else "local"
+
+
+def output_block(title, text, turn_id):
+    """Format one output as a code block, collapsed if it is long."""
+    preview, collapsed = collapse(text, SESSIONS.preview_chars)
+    block = f"**{title}:**\n```\n{preview}\n```"
+    if collapsed:
+        block += f"\n\n*Output collapsed: expand turn #{turn_id} below to see all of it.*"
+    return block
+
+
+def full_output(result):
+    """The complete output of a result, fetched when a turn is expanded."""
+    if result.stderr and result.stdout:
+        return f"{result.stdout}\n--- stderr ---\n{result.stderr}"
+    return result.stdout or result.stderr
+
+
+def format_response(timestamp, cmd, result, turn_id):
+    """Format a finished command's result as a chat message."""
+    if result.returncode == 0:
+        # Success
+        bot_response = f"**[{timestamp}] #{turn_id} Command executed successfully:**\n\n"
+        bot_response += f"**Command:** `{' '.join(cmd)}`\n\n"
+        bot_response += output_block("Output", result.stdout, turn_id)
+        
+        if result.stderr:
+            bot_response += "\n\n" + output_block("Warnings", result.stderr, turn_id)
+    else:
+        # Error
+        bot_response = f"**[{timestamp}] #{turn_id} Command failed:**\n\n"
+        bot_response += f"**Command:** `{' '.join(cmd)}`\n\n"
+        bot_response += output_block(f"Error (Exit Code {result.returncode})", result.stderr, turn_id)
+        
+        if result.stdout:
+            bot_response += "\n\n" + output_block("Partial Output", result.stdout, turn_id)
+    return bot_response
+
+
+def format_partial(timestamp, cmd, output, turn_id):
+    """Format the output of a command that is still running."""
+    bot_response = f"**[{timestamp}] #{turn_id} Running...**\n\n"
+    bot_response += f"**Command:** `{' '.join(cmd)}`\n\n"
+    if output:
+        bot_response += f"**Output so far:**\n```\n{collapse(output, SESSIONS.preview_chars)[0]}\n```"
+    return bot_response
+
+
+def execute_print_params(user_message, request: gr.Request = None):
     """
-    Execute the print_params.py script with user input and return the output.
+    Execute the print_params.py script with user input and stream the output.
+    
+    The chat shows the script's output while it runs, updated at most every
+    STREAM_INTERVAL_S seconds so that long outputs do not re-render the chat
+    on every line.
+    
+    The history is kept on the server (see chat_history.py): the browser
+    only sends the message, and gets back the last turns of its session
+    with long outputs collapsed.
     
     Args:
         user_message (str): The message from the user
-        history (list): Chat history (not used in this simple implementation)
+        request (gr.Request): The request, whose session identifies the user
     
-    Returns:
-        tuple: (updated_history, empty_string_for_user_input)
+    Yields:
+        tuple: (transcript, empty_string_for_user_input)
     """
+    timestamp = datetime.now().strftime("%H:%M:%S")
+    # Parse the user message to extract arguments
+    # Simple parsing: split by spaces but handle quoted strings
     try:
-        # Get the directory of this script to find print_params.py
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        print_params_path = os.path.join(script_dir, "print_params.py")
-        
-        # Parse the user message to extract arguments
-        # Simple parsing: split by spaces but handle quoted strings
-        try:
-            args = shlex.split(user_message)
-        except ValueError:
-            # If shlex fails, just split by spaces
-            args = user_message.split()
-        
-        # Construct the command
-        cmd = ["python", print_params_path] + args
-        
-        # Execute the script
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=30  # 30 second timeout
-        )
-        
-        # Format the response
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        
-        if result.returncode == 0:
-            # Success
-            bot_response = f"**[{timestamp}] Command executed successfully:**\n\n"
-            bot_response += f"**Command:** `{' '.join(cmd)}`\n\n"
-            bot_response += f"**Output:**\n```\n{result.stdout}\n```"
-            
-            if result.stderr:
-                bot_response += f"\n\n**Warnings:**\n```\n{result.stderr}\n```"
+        args = shlex.split(user_message)
+    except ValueError:
+        # If shlex fails, just split by spaces
+        args = user_message.split()
+    cmd = display_command(args)
+    
+    history = SESSIONS.history(session_id(request))
+    turn = history.add(user_message)
+    turn.response = format_partial(timestamp, cmd, "", turn.id)
+    yield history.messages(), ""
+    
+    try:
+        # Identical commands reuse a cached result or wait for the one
+        # already running (see result_cache.py)
+        state, cached = CACHE.acquire(args)
+        if state == "hit":
+            result = cached
+        elif state == "wait":
+            result = cached.result()
         else:
-            # Error
-            bot_response = f"**[{timestamp}] Command failed:**\n\n"
-            bot_response += f"**Command:** `{' '.join(cmd)}`\n\n"
-            bot_response += f"**Error (Exit Code {result.returncode}):**\n```\n{result.stderr}\n```"
+            # Run the script on the worker pool, in-process when possible (see
+            # command_runner.py); its stdout arrives in `chunks` as it is written
+            chunks = queue.Queue()
+            try:
+                future = POOL.submit(session_id(request), run_command, args, TIMEOUT_S, chunks.put)
+            except Busy as e:
+                if state == "lead":
+                    CACHE.abandon(args, cached, e)
+                raise
+            if state == "lead":
+                CACHE.track(args, cached, future)
+            
+            output = []
+            last_update = 0.0  # The first output is shown right away
+            while not future.done() or not chunks.empty():
+                try:
+                    output.append(chunks.get(timeout=0.05))
+                except queue.Empty:
+                    continue
+                if time.monotonic() - last_update >= STREAM_INTERVAL_S:
+                    turn.response = format_partial(timestamp, cmd, "".join(output), turn.id)
+                    yield history.messages(), ""
+                    last_update = time.monotonic()
             
-            if result.stdout:
-                bot_response += f"\n\n**Partial Output:**\n```\n{result.stdout}\n```"
+            result = future.result()
+        
+        turn.full_output = full_output(result)
+        bot_response = format_response(timestamp, cmd, result, turn.id)
                 
+    except Busy as e:
+        bot_response = f"**[{timestamp}] #{turn.id} Busy:**\n\n{e}. Please try again in a moment."
+        
     except subprocess.TimeoutExpired:
-        bot_response = f"**[{timestamp}] Command timed out:**\n\nThe script took too long to execute (>30 seconds)."
+        bot_response = f"**[{timestamp}] #{turn.id} Command timed out:**\n\nThe script took too long to execute (>{TIMEOUT_S} seconds)."
         
     except FileNotFoundError:
-        bot_response = f"**[{timestamp}] Error:**\n\nCould not find print_params.py script in {script_dir}"
+        bot_response = f"**[{timestamp}] #{turn.id} Error:**\n\nCould not find print_params.py script in {SCRIPT_DIR}"
         
     except Exception as e:
-        bot_response = f"**[{timestamp}] Unexpected error:**\n\n```\n{str(e)}\n```"
+        bot_response = f"**[{timestamp}] #{turn.id} Unexpected error:**\n\n```\n{str(e)}\n```"
     
     # Update history
-    history.append([user_message, bot_response])
+    turn.response = bot_response
     
-    return history, ""
+    yield history.messages(), ""
+
+
+def expand_output(turn_id, request: gr.Request = None):
+    """Return the full output of a turn of the session's history."""
+    turn = SESSIONS.history(session_id(request)).get(int(turn_id or 0))
+    if turn is None:
+        return f"Turn #{turn_id} is not in the history (only the last {SESSIONS.max_turns} turns are kept)."
+    return turn.full_output or "This turn has no output."
 
 
 def get_examples():
@@ -93,11 +203,17 @@ def get_examples():
     ]
 
 
-def clear_chat():
+def clear_chat(request: gr.Request = None):
     """Clear the chat history."""
+    SESSIONS.clear(session_id(request))
     return [], ""
 
 
+def server_stats():
+    """Return the worker pool's load and the result cache's counters."""
+    return {**POOL.stats(), "cache": CACHE.stats()}
+
+
 # Custom CSS for better styling
 custom_css = """
 #chatbot {
@@ -159,19 +275,37 @@ with gr.Blocks(css=custom_css, title="Print Params Chat App") as app:
             label="Try these examples:"
         )
     
+    with gr.Accordion("Expand output", open=False):
+        with gr.Row():
+            turn_number = gr.Number(label="Turn #", precision=0, scale=1)
+            expand_btn = gr.Button("Expand", variant="secondary", scale=1)
+        full_output_box = gr.Textbox(label="Full output", lines=15, max_lines=40, show_copy_button=True)
+    
+    with gr.Accordion("Server load", open=False):
+        stats = gr.JSON(label="Workers, queue, rejections and cache")
+        stats_btn = gr.Button("Refresh", variant="secondary")
+    
     # Event handlers
+    # Admission control is done by POOL, so Gradio does not serialize requests.
+    # The history stays on the server, so only the message is sent.
     msg.submit(
         execute_print_params,
-        inputs=[msg, chatbot],
-        outputs=[chatbot, msg]
+        inputs=[msg],
+        outputs=[chatbot, msg],
+        concurrency_limit=None
     )
     
     send_btn.click(
         execute_print_params,
-        inputs=[msg, chatbot],
-        outputs=[chatbot, msg]
+        inputs=[msg],
+        outputs=[chatbot, msg],
+        concurrency_limit=None
     )
     
+    expand_btn.click(expand_output, inputs=turn_number, outputs=full_output_box)
+    
+    stats_btn.click(server_stats, outputs=stats)
+    
     clear_btn.click(
         clear_chat,
         outputs=[chatbot, msg]
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Server-side chat history for the chat app.
+
+Each browser session keeps its last `max_turns` turns in a ring buffer, so
+the transcript is never sent back by the browser and what is sent to it
+stays bounded however long the conversation gets. Outputs longer than
+`preview_chars` are shown collapsed in the transcript; the full text stays
+on the server and is fetched by turn number when the user expands it.
+
+Sessions idle for `idle_ttl_s` are dropped, and at most `max_sessions` are
+kept (least recently used first out).
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+def collapse(text, preview_chars):
+    """
+    Return `text` cut to about `preview_chars` characters at a line break,
+    and whether it was cut.
+    """
+    if len(text) <= preview_chars:
+        return text, False
+    cut = text.rfind("\n", 0, preview_chars)
+    preview = text[:cut if cut > 0 else preview_chars]
+    hidden_lines = text.count("\n", len(preview)) + 1
+    return f"{preview}\n... {hidden_lines} more lines", True
+
+
+class Turn:
+    """A message, the response shown for it, and the full output behind it."""
+
+    def __init__(self, turn_id, message, response="", full_output=None):
+        self.id = turn_id
+        self.message = message
+        self.response = response
+        self.full_output = full_output
+
+
+class ChatHistory:
+    """The last `max_turns` turns of one session."""
+
+    def __init__(self, max_turns=50):
+        self.turns = deque(maxlen=max_turns)
+        self._next_id = 1
+        self.last_used = time.monotonic()
+
+    def add(self, message, response=""):
+        """Append a turn, evicting the oldest one if full; return it."""
+        turn = Turn(self._next_id, message, response)
+        self._next_id += 1
+        self.turns.append(turn)
+        return turn
+
+    def get(self, turn_id):
+        """Return the turn with this number, or None if it was evicted."""
+        for turn in list(self.turns):  # Copied at once, other requests may append
+            if turn.id == turn_id:
+                return turn
+        return None
+
+    def messages(self):
+        """The transcript in gr.Chatbot's [user, bot] format."""
+        return [[turn.message, turn.response] for turn in list(self.turns)]
+
+
+class SessionStore:
+    """
+    Chat histories keyed by session id.
+
+    Args:
+        max_turns (int): Turns kept per session
+        preview_chars (int): Longest output shown in full in the transcript
+        max_sessions (int): Sessions kept at once
+        idle_ttl_s (float): Sessions unused for this long are dropped
+    """
+
+    def __init__(self, max_turns=50, preview_chars=4000, max_sessions=1000, idle_ttl_s=3600):
+        self.max_turns = max_turns
+        self.preview_chars = preview_chars
+        self.max_sessions = max_sessions
+        self.idle_ttl_s = idle_ttl_s
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def history(self, session_id):
+        """Return the session's history, creating it if needed."""
+        now = time.monotonic()
+        with self._lock:
+            history = self._sessions.pop(session_id, None)
+            if history is None:
+                history = ChatHistory(self.max_turns)
+            history.last_used = now
+            self._sessions[session_id] = history  # Most recently used last
+
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            for other_id, other in list(self._sessions.items()):
+                if now - other.last_used < self.idle_ttl_s:
+                    break  # Ordered by last use
+                del self._sessions[other_id]
+        return history
+
+    def clear(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self):
+        return len(self._sessions)
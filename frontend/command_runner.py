@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Run print_params.py for the chat app.
+
+Spawning `python print_params.py` for every message pays for interpreter
+startup and imports each time. `run_command` instead calls
+`print_params.main()` in this process with the message's argv, capturing
+what it writes to stdout and stderr. Output and exit codes are the same as
+the subprocess: `--help` exits 0, argparse errors exit 2 with the usage on
+stderr, and an uncaught exception exits 1 with its traceback on stderr.
+
+Commands using one of `SUBPROCESS_ONLY_ARGS` still run in a subprocess.
+
+Both paths can pass stdout to an `on_output` callback as it is written, so
+the chat can show partial output before the command finishes.
+"""
+
+import contextlib
+import io
+import os
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from collections import namedtuple
+
+import print_params
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PRINT_PARAMS_PATH = os.path.join(SCRIPT_DIR, "print_params.py")
+
+# --debug reports on the interpreter that ran the script, so it gets a
+# process of its own
+SUBPROCESS_ONLY_ARGS = {"--debug"}
+
+# Set to 0 to run every command in a subprocess
+IN_PROCESS = os.environ.get("PRINT_PARAMS_IN_PROCESS", "1") != "0"
+
+TIMEOUT_S = 30
+
+CommandResult = namedtuple("CommandResult", ["returncode", "stdout", "stderr", "in_process", "duration_s"])
+
+
+def display_command(args):
+    """The command line shown in the chat, the same for both paths."""
+    return ["python", PRINT_PARAMS_PATH] + args
+
+
+def needs_subprocess(args):
+    """Return True if `args` must not run in-process."""
+    return not IN_PROCESS or any(arg.split("=", 1)[0] in SUBPROCESS_ONLY_ARGS for arg in args)
+
+
+class _ThreadLocalStream:
+    """
+    Stand-in for sys.stdout/sys.stderr that writes to the current thread's
+    capture buffer if it has one, and to the real stream otherwise, so
+    commands running in several threads do not mix their output.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._local = threading.local()
+
+    @contextlib.contextmanager
+    def capture(self, buffer):
+        self._local.buffer = buffer
+        try:
+            yield buffer
+        finally:
+            self._local.buffer = None
+
+    def _target(self):
+        return getattr(self._local, "buffer", None) or self._stream
+
+    def write(self, text):
+        return self._target().write(text)
+
+    def flush(self):
+        self._target().flush()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+_install_lock = threading.Lock()
+
+
+def _streams():
+    """Install the thread-local stdout/stderr once and return them."""
+    with _install_lock:
+        if not isinstance(sys.stdout, _ThreadLocalStream):
+            sys.stdout = _ThreadLocalStream(sys.stdout)
+        if not isinstance(sys.stderr, _ThreadLocalStream):
+            sys.stderr = _ThreadLocalStream(sys.stderr)
+    return sys.stdout, sys.stderr
+
+
+class _CallbackBuffer(io.StringIO):
+    """A StringIO that also passes everything written to `on_output`."""
+
+    def __init__(self, on_output):
+        super().__init__()
+        self._on_output = on_output
+
+    def write(self, text):
+        if text:
+            self._on_output(text)
+        return super().write(text)
+
+
+def _exit_code(exit):
+    """Map a SystemExit to the exit status the interpreter would report."""
+    if exit.code is None:
+        return 0, None
+    if isinstance(exit.code, int):
+        return exit.code, None
+    return 1, f"{exit.code}\n"  # sys.exit("message") prints the message to stderr
+
+
+def run_in_process(args, on_output=None):
+    """Call print_params.main() with `args` and capture its output."""
+    started = time.perf_counter()
+    stdout_stream, stderr_stream = _streams()
+    stdout = _CallbackBuffer(on_output) if on_output else io.StringIO()
+    stderr = io.StringIO()
+    with stdout_stream.capture(stdout), stderr_stream.capture(stderr):
+        try:
+            print_params.main([PRINT_PARAMS_PATH] + args)
+            returncode = 0
+        except SystemExit as exit:
+            returncode, message = _exit_code(exit)
+            if message:
+                stderr.write(message)
+        except Exception:
+            traceback.print_exc(file=stderr)
+            returncode = 1
+    return CommandResult(returncode, stdout.getvalue(), stderr.getvalue(), True, time.perf_counter() - started)
+
+
+def run_subprocess(args, timeout=TIMEOUT_S, on_output=None):
+    """
+    Run print_params.py in a new interpreter.
+
+    With `on_output`, stdout is read line by line as the script writes it.
+
+    Raises:
+        subprocess.TimeoutExpired: If it runs for more than `timeout` seconds
+    """
+    started = time.perf_counter()
+    cmd = [sys.executable, PRINT_PARAMS_PATH] + args
+    if on_output is None:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+        return CommandResult(result.returncode, result.stdout, result.stderr, False, time.perf_counter() - started)
+
+    # Unbuffered, so lines arrive as they are printed rather than at exit
+    env = dict(os.environ, PYTHONUNBUFFERED="1")
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, bufsize=1, env=env)
+    stderr = []
+    stderr_reader = threading.Thread(target=lambda: stderr.append(process.stderr.read()), daemon=True)
+    stderr_reader.start()
+    # Kill the script at the deadline, which also ends the read loop below
+    timed_out = threading.Event()
+
+    def kill():
+        timed_out.set()
+        process.kill()
+
+    killer = threading.Timer(timeout, kill)
+    killer.start()
+    stdout = []
+    try:
+        for line in process.stdout:
+            stdout.append(line)
+            on_output(line)
+        process.wait()
+    finally:
+        killer.cancel()
+    stderr_reader.join()
+    if timed_out.is_set():
+        raise subprocess.TimeoutExpired(cmd, timeout, "".join(stdout), "".join(stderr))
+    return CommandResult(process.returncode, "".join(stdout), "".join(stderr), False, time.perf_counter() - started)
+
+
+def run_command(args, timeout=TIMEOUT_S, on_output=None):
+    """
+    Run print_params.py with `args`, in-process unless `needs_subprocess(args)`.
+
+    Args:
+        args (list): Arguments of the script
+        timeout (float): Limit of a subprocess run, in seconds
+        on_output (callable): Called with each piece of stdout as it is written
+    """
+    if needs_subprocess(args):
+        return run_subprocess(args, timeout, on_output)
+    return run_in_process(args, on_output)
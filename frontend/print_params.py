@@ -10,12 +10,22 @@ Usage examples:
 """
 
 import argparse
+import os
 import sys
 from datetime import datetime
 
 
-def main():
+def main(argv=None):
+    """
+    Parse and print the parameters.
+
+    Args:
+        argv (list): Command line including the script name, defaults to
+            sys.argv. Lets callers run the script in-process.
+    """
+    argv = sys.argv if argv is None else argv
     parser = argparse.ArgumentParser(
+        prog=os.path.basename(argv[0]),
         description="Print multiple parameters to terminal",
         formatter_class=argparse.RawDescriptionHelpFormatter,
         epilog="""
@@ -38,7 +48,7 @@ Examples:
     parser.add_argument("items", nargs="*", help="Positional arguments")
     
     # Parse arguments
-    args = parser.parse_args()
+    args = parser.parse_args(argv[1:])
     
     # Print header
     print("=" * 50)
@@ -95,15 +105,15 @@ Examples:
     # Verbose output
     if args.verbose:
         print("\nVERBOSE OUTPUT:")
-        print(f"  Script name: {sys.argv[0]}")
+        print(f"  Script name: {argv[0]}")
         print(f"  Python version: {sys.version.split()[0]}")
-        print(f"  Command line: {' '.join(sys.argv)}")
+        print(f"  Command line: {' '.join(argv)}")
     
     # Debug output
     if args.debug:
         print("\nDEBUG OUTPUT:")
         print(f"  Raw args object: {args}")
-        print(f"  sys.argv: {sys.argv}")
+        print(f"  sys.argv: {argv}")
     
     print("=" * 50)
 
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Single-flight LRU+TTL cache of command results for the chat app.
+
+Results are keyed by the command's argv (the `shlex.split` of the message),
+so "--name  John" and "--name John" share an entry. While a command runs,
+identical requests wait for it instead of starting their own ("coalesced").
+Finished results are kept for `ttl_s` seconds, at most `max_entries` of
+them, least recently used first out.
+
+Whether a result may be reused is decided by a `CachePolicy`: print_params.py
+prints an `Execution time` line, the one part of its output that changes
+between runs.
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime
+
+# Output lines that differ between two runs of the same command, and how to
+# render them for the current time
+VOLATILE_LINES = {
+    re.compile(r"^Execution time: .*$", re.MULTILINE):
+        lambda: f"Execution time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
+}
+
+# "refresh": reuse results, re-rendering their volatile lines on each hit
+# "exact": only reuse results without volatile lines (e.g. --help, errors)
+# "off": never cache
+CACHE_MODES = ("refresh", "exact", "off")
+
+
+class CachePolicy:
+    """
+    Decide which commands and results are cached.
+
+    Args:
+        mode (str): One of `CACHE_MODES`
+        uncacheable_args (set): Commands using one of these are always run
+    """
+
+    def __init__(self, mode="refresh", uncacheable_args=()):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode {mode!r}, expected one of {CACHE_MODES}")
+        self.mode = mode
+        self.uncacheable_args = set(uncacheable_args)
+
+    def should_cache(self, args):
+        """Return True if results of `args` may come from, or go to, the cache."""
+        return self.mode != "off" and not any(arg.split("=", 1)[0] in self.uncacheable_args for arg in args)
+
+    def cacheable(self, result):
+        """Return True if `result` may be stored."""
+        volatile = any(pattern.search(result.stdout) for pattern in VOLATILE_LINES)
+        return self.mode == "refresh" or not volatile
+
+    def on_hit(self, result):
+        """Return a cached `result` as a fresh run would have printed it."""
+        stdout = result.stdout
+        for pattern, render in VOLATILE_LINES.items():
+            stdout = pattern.sub(lambda _: render(), stdout)
+        return result._replace(stdout=stdout)
+
+
+class SingleFlightCache:
+    """
+    Args:
+        policy (CachePolicy): What is cached
+        max_entries (int): Results kept at once
+        ttl_s (float): How long a result is reused
+    """
+
+    def __init__(self, policy=None, max_entries=256, ttl_s=300):
+        self.policy = policy or CachePolicy()
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._entries = OrderedDict()  # key -> (result, stored at)
+        self._in_flight = {}  # key -> Future of the running command
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "coalesced": 0, "bypassed": 0, "stored": 0, "evicted": 0,
+                          "expired": 0}
+
+    def acquire(self, args):
+        """
+        Look up `args`.
+
+        Returns:
+            tuple: ("hit", result), ("wait", future of the identical command
+            already running), ("lead", future that `track` must complete)
+            or ("bypass", None) for commands the policy does not cache
+        """
+        if not self.policy.should_cache(args):
+            with self._lock:
+                self._counters["bypassed"] += 1
+            return "bypass", None
+
+        key = tuple(args)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                result, stored = entry
+                if now - stored < self.ttl_s:
+                    self._entries.move_to_end(key)
+                    self._counters["hits"] += 1
+                    return "hit", self.policy.on_hit(result)
+                del self._entries[key]
+                self._counters["expired"] += 1
+
+            if key in self._in_flight:
+                self._counters["coalesced"] += 1
+                return "wait", self._in_flight[key]
+
+            self._counters["misses"] += 1
+            future = Future()
+            future.set_running_or_notify_cancel()
+            self._in_flight[key] = future
+            return "lead", future
+
+    def track(self, args, future, execution):
+        """
+        Complete the leader's `future` from `execution` (the Future of the
+        command run) once it finishes, storing its result if cacheable.
+        Exceptions are passed on to the waiters but not cached.
+        """
+        execution.add_done_callback(lambda done: self._settle(tuple(args), future, done))
+
+    def abandon(self, args, future, exception):
+        """Fail the leader's `future` when the command could not be started."""
+        with self._lock:
+            self._in_flight.pop(tuple(args), None)
+        future.set_exception(exception)
+
+    def _settle(self, key, future, execution):
+        exception = execution.exception()
+        with self._lock:
+            self._in_flight.pop(key, None)
+            if exception is None and self.policy.cacheable(execution.result()):
+                self._entries[key] = (execution.result(), time.monotonic())
+                self._entries.move_to_end(key)
+                self._counters["stored"] += 1
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self._counters["evicted"] += 1
+        if exception is None:
+            future.set_result(execution.result())
+        else:
+            future.set_exception(exception)
+
+    def stats(self):
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"] + self._counters["coalesced"]
+            return {
+                **self._counters,
+                "entries": len(self._entries),
+                "in_flight": len(self._in_flight),
+                "hit_rate": (self._counters["hits"] + self._counters["coalesced"]) / lookups if lookups else None,
+                "mode": self.policy.mode,
+            }
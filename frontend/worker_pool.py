@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Bounded, per-user fair worker pool for the chat app's commands.
+
+At most `max_workers` commands run at once and at most `max_queue` wait.
+A request arriving when the queue is full, or from a user who already has
+`max_per_user` commands queued or running, is rejected right away with
+`Busy` instead of piling up. Waiting commands are taken round-robin across
+users, so one user sending many commands does not delay everyone else.
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+
+
+class Busy(Exception):
+    """Raised when a request is rejected by admission control."""
+
+
+class FairPool:
+    """
+    Args:
+        max_workers (int): Commands running at once
+        max_queue (int): Commands waiting for a worker, across users
+        max_per_user (int): Commands queued or running for one user
+    """
+
+    def __init__(self, max_workers=4, max_queue=16, max_per_user=2):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.max_per_user = max_per_user
+        self._lock = threading.Condition()
+        self._queues = OrderedDict()  # user -> deque of (future, fn, args), in round-robin order
+        self._queued = 0
+        self._outstanding = {}  # user -> commands queued or running
+        self._active = 0
+        self._submitted = 0
+        self._rejected = 0
+        self._completed = 0
+        self._wait_s = 0.0
+        self._threads = [
+            threading.Thread(target=self._work, daemon=True, name=f"chat-worker-{i}") for i in range(max_workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, user, fn, *args):
+        """
+        Queue `fn(*args)` for `user`.
+
+        Returns:
+            Future: Its result
+
+        Raises:
+            Busy: If the queue or the user's share is full
+        """
+        with self._lock:
+            if self._queued >= self.max_queue:
+                self._rejected += 1
+                raise Busy(f"Server busy: {self._queued} commands are already waiting")
+            if self._outstanding.get(user, 0) >= self.max_per_user:
+                self._rejected += 1
+                raise Busy(f"You already have {self.max_per_user} commands in progress")
+
+            future = Future()
+            self._queues.setdefault(user, deque()).append((future, fn, args, time.monotonic()))
+            self._queued += 1
+            self._outstanding[user] = self._outstanding.get(user, 0) + 1
+            self._submitted += 1
+            self._lock.notify()
+        return future
+
+    def run(self, user, fn, *args):
+        """Run `fn(*args)` for `user` and return its result, raising `Busy` if rejected."""
+        return self.submit(user, fn, *args).result()
+
+    def _next(self):
+        """Pop the next command, from the user that has waited longest for a turn."""
+        user, queue = next(iter(self._queues.items()))
+        item = queue.popleft()
+        del self._queues[user]
+        if queue:
+            self._queues[user] = queue  # Back of the round-robin order
+        self._queued -= 1
+        return user, item
+
+    def _work(self):
+        while True:
+            with self._lock:
+                while not self._queued:
+                    self._lock.wait()
+                user, (future, fn, args, submitted) = self._next()
+                self._active += 1
+                self._wait_s += time.monotonic() - submitted
+
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*args))
+                except BaseException as e:
+                    future.set_exception(e)
+
+            with self._lock:
+                self._active -= 1
+                self._completed += 1
+                self._outstanding[user] -= 1
+                if not self._outstanding[user]:
+                    del self._outstanding[user]
+
+    def stats(self):
+        """Return the pool's load and counters, for sizing the deployment."""
+        with self._lock:
+            started = self._submitted - self._queued
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "max_per_user": self.max_per_user,
+                "active_workers": self._active,
+                "queue_length": self._queued,
+                "active_users": len(self._outstanding),
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "mean_queue_wait_ms": 1000 * self._wait_s / started if started else None,
+            }
@@ -0,0 +1,258 @@
+"""
+Pick the batch size and data loader workers of a run on the GPU it lands on.
+
+Before the real run, `tune` probes a few short train.py runs:
+1. increasing batch sizes with a default number of workers, until one no
+   longer fits in GPU memory (with some headroom), then
+2. the number of workers at the chosen batch size.
+
+Each phase keeps the setting with the highest samples/s. Settings within
+`tolerance` of the best are treated as ties, broken towards the larger batch
+size and towards fewer workers.
+
+Tuning comes out of the run's own timeout, so no probe is started once
+`budget_s` has passed: the search then keeps the best setting found so far.
+
+`tune` only needs a `probe(batch_size, num_workers)` function, so the search
+can be checked against a simulated memory/throughput model:
+    python batch_tuner.py --simulate
+    python batch_tuner.py --simulate --gpu-mem-gb 24 --cpus 4
+"""
+
+import argparse
+import os
+import subprocess
+import tempfile
+import time
+
+from data_parallel import set_arg
+from gpu_benchmark import GpuMemorySampler, steady_steps_per_s
+
+DEFAULT_BATCH_SIZES = [8, 16, 32, 64, 128, 256]
+DEFAULT_WORKER_COUNTS = [2, 4, 8, 16]
+DEFAULT_NUM_WORKERS = 4
+
+# Peak memory of a probe must stay below this fraction of the GPU's memory:
+# a few steps do not always reach the peak of a long run
+MEMORY_HEADROOM = 0.9
+
+# Length of a probe run
+PROBE_STEPS = 30
+PROBE_LOG_FREQ = 5
+# Loading the policy and 30 steps take well under this; a probe that does
+# not finish in time counts as failed
+PROBE_TIME_LIMIT_S = 180
+
+# Total time of the search. It can overrun by at most one probe.
+TUNE_BUDGET_S = 900
+
+
+def _fits(result, gpu_mem_gb, headroom):
+    if result.get("oom") or result.get("error") or not result.get("samples_per_s"):
+        return False
+    peak = result.get("peak_gpu_mem_gb")
+    return gpu_mem_gb is None or peak is None or peak <= headroom * gpu_mem_gb
+
+
+def _pick(trials, tolerance, key):
+    """Among the trials within `tolerance` of the best samples/s, return the one with the highest `key`."""
+    best = max(trial["samples_per_s"] for trial in trials)
+    candidates = [trial for trial in trials if trial["samples_per_s"] >= (1 - tolerance) * best]
+    return max(candidates, key=key)
+
+
+def tune(
+    probe,
+    batch_sizes=None,
+    worker_counts=None,
+    default_num_workers=DEFAULT_NUM_WORKERS,
+    gpu_mem_gb=None,
+    headroom=MEMORY_HEADROOM,
+    tolerance=0.05,
+    budget_s=TUNE_BUDGET_S,
+    clock=time.monotonic
+):
+    """
+    Search the batch size, then the number of workers, with short probe runs.
+
+    Args:
+        probe (callable): (batch_size, num_workers) -> dict with
+            "samples_per_s", "peak_gpu_mem_gb" and "oom" (True when the
+            run ran out of memory). Exceptions count as failed probes.
+        batch_sizes (list): Batch sizes to try, in increasing order
+        worker_counts (list): Data loader workers to try
+        default_num_workers (int): Workers used while searching the batch size
+        gpu_mem_gb (float): Memory of the GPU, None to only rely on "oom"
+        headroom (float): Largest fraction of `gpu_mem_gb` a probe may use
+        tolerance (float): Relative samples/s difference treated as a tie
+        budget_s (float): No probe starts after this many seconds, None for
+            no limit
+        clock (callable): Returns the current time in seconds
+
+    Returns:
+        dict: The chosen "batch_size" and "num_workers", their
+        "samples_per_s", every probe in "trials", the "elapsed_s" of the
+        search and whether it stopped early ("budget_exhausted")
+    """
+    batch_sizes = sorted(batch_sizes or DEFAULT_BATCH_SIZES)
+    worker_counts = worker_counts or DEFAULT_WORKER_COUNTS
+    trials = []
+    started = clock()
+
+    def out_of_budget():
+        return budget_s is not None and clock() - started >= budget_s
+
+    def run(batch_size, num_workers):
+        try:
+            result = probe(batch_size, num_workers)
+        except Exception as e:
+            result = {"error": repr(e)}
+        trial = {"batch_size": batch_size, "num_workers": num_workers, **result}
+        trial["fits"] = _fits(result, gpu_mem_gb, headroom)
+        trials.append(trial)
+        return trial
+
+    fitting = []
+    exhausted = False
+    for batch_size in batch_sizes:
+        if out_of_budget():
+            exhausted = True
+            break
+        trial = run(batch_size, default_num_workers)
+        if not trial["fits"]:
+            break  # Larger batches need even more memory
+        fitting.append(trial)
+    if not fitting:
+        if not trials:
+            raise RuntimeError(f"The tuning budget of {budget_s}s ran out before the first probe")
+        raise RuntimeError(f"No batch size fits, the smallest probe gave {trials[0]}")
+    batch_size = _pick(fitting, tolerance, key=lambda trial: trial["batch_size"])["batch_size"]
+
+    same_batch = [trial for trial in fitting if trial["batch_size"] == batch_size]
+    for num_workers in worker_counts:
+        if num_workers != default_num_workers:
+            if out_of_budget():
+                exhausted = True
+                break
+            trial = run(batch_size, num_workers)
+            if trial["fits"]:
+                same_batch.append(trial)
+    best = _pick(same_batch, tolerance, key=lambda trial: -trial["num_workers"])
+
+    return {
+        "batch_size": best["batch_size"],
+        "num_workers": best["num_workers"],
+        "samples_per_s": best["samples_per_s"],
+        "trials": trials,
+        "elapsed_s": clock() - started,
+        "budget_exhausted": exhausted,
+    }
+
+
+def gpu_total_memory_gb():
+    """Return the memory of the first GPU in GB, or None without nvidia-smi."""
+    try:
+        output = subprocess.run(
+            ["nvidia-smi", "--query-gpu=memory.total", "--format=csv,noheader,nounits"],
+            capture_output=True, text=True, check=True
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return float(output.split()[0]) / 1024  # MiB to GB
+
+
+def train_probe(cmd, steps=PROBE_STEPS, log_freq=PROBE_LOG_FREQ, time_limit=PROBE_TIME_LIMIT_S):
+    """
+    Return a `probe` running `cmd` (a train.py command line) for a few steps,
+    without checkpoints, evaluation or W&B, in a scratch output directory.
+    """
+    from training_logs import run_training
+
+    def probe(batch_size, num_workers):
+        output_dir = os.path.join(tempfile.mkdtemp(), "probe")
+        args = cmd[2:]
+        for name, value in [
+            ("batch_size", batch_size), ("num_workers", num_workers), ("steps", steps),
+            ("log_freq", log_freq), ("output_dir", output_dir), ("save_checkpoint", "false"),
+            ("eval_freq", 0), ("wandb.enable", "false"),
+        ]:
+            args = set_arg(args, name, value)
+
+        with GpuMemorySampler() as memory:
+            result = run_training(cmd[:2] + args, output_dir, time_limit=time_limit)
+        if result["return_code"] != 0:
+            oom = "out of memory" in result["stderr_tail"].lower()
+            return {"oom": oom, "error": None if oom else result["stderr_tail"][-300:]}
+        steps_per_s = steady_steps_per_s(result["telemetry"])
+        return {
+            "samples_per_s": steps_per_s * batch_size if steps_per_s else None,
+            "peak_gpu_mem_gb": memory.peak_gb,
+            "oom": False,
+        }
+
+    return probe
+
+
+class SimulatedProbe:
+    """
+    Memory and throughput model of a training run, standing in for `train_probe`.
+
+    Memory grows linearly with the batch size. The GPU processes
+    batch_size / (step_overhead_s + sample_s * batch_size) samples/s, and
+    the data loader min(num_workers, cpus) * worker_samples_per_s; the run
+    goes as fast as the slower of the two.
+
+    Each call advances `elapsed_s` by the time the probe would have taken
+    (`load_s` plus `steps` steps), to use as the clock of `tune`.
+    """
+
+    def __init__(self, gpu_mem_gb=48, base_gb=6.0, sample_gb=0.3, step_overhead_s=0.05, sample_s=0.004,
+                 worker_samples_per_s=150, cpus=8, load_s=40, steps=PROBE_STEPS):
+        self.gpu_mem_gb = gpu_mem_gb
+        self.base_gb = base_gb
+        self.sample_gb = sample_gb
+        self.step_overhead_s = step_overhead_s
+        self.sample_s = sample_s
+        self.worker_samples_per_s = worker_samples_per_s
+        self.cpus = cpus
+        self.load_s = load_s
+        self.steps = steps
+        self.elapsed_s = 0.0
+
+    def __call__(self, batch_size, num_workers):
+        memory_gb = self.base_gb + self.sample_gb * batch_size
+        self.elapsed_s += self.load_s
+        if memory_gb > self.gpu_mem_gb:
+            return {"oom": True}
+        gpu_samples_per_s = batch_size / (self.step_overhead_s + self.sample_s * batch_size)
+        data_samples_per_s = min(num_workers, self.cpus) * self.worker_samples_per_s
+        samples_per_s = min(gpu_samples_per_s, data_samples_per_s)
+        self.elapsed_s += self.steps * batch_size / samples_per_s
+        return {
+            "samples_per_s": samples_per_s,
+            "peak_gpu_mem_gb": memory_gb,
+            "oom": False,
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the batch size and worker search against a simulated model")
+    parser.add_argument("--simulate", action="store_true", help="Use the simulated model (required)")
+    parser.add_argument("--gpu-mem-gb", type=float, default=48)
+    parser.add_argument("--cpus", type=int, default=8)
+    parser.add_argument("--worker-samples-per-s", type=float, default=150)
+    parser.add_argument("--load-s", type=float, default=40, help="Simulated policy load time of a probe")
+    parser.add_argument("--budget-s", type=float, default=TUNE_BUDGET_S, help="Total tuning time")
+    args = parser.parse_args()
+    if not args.simulate:
+        parser.error("pass --simulate; real runs are tuned with train_policy(auto_tune=True)")
+
+    probe = SimulatedProbe(gpu_mem_gb=args.gpu_mem_gb, cpus=args.cpus, worker_samples_per_s=args.worker_samples_per_s,
+                           load_s=args.load_s)
+    result = tune(probe, gpu_mem_gb=args.gpu_mem_gb, budget_s=args.budget_s, clock=lambda: probe.elapsed_s)
+    for trial in result["trials"]:
+        samples = f"{trial['samples_per_s']:.0f} samples/s" if trial["fits"] else "does not fit"
+        print(f"batch_size={trial['batch_size']:<4} num_workers={trial['num_workers']:<3} {samples}")
+    print(f"Chosen: batch_size={result['batch_size']} num_workers={result['num_workers']} "
+          f"({result['samples_per_s']:.0f} samples/s) after {result['elapsed_s']:.0f}s of probes"
+          + (", budget exhausted" if result["budget_exhausted"] else ""))
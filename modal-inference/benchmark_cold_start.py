@@ -0,0 +1,124 @@
+"""
+Cold-start benchmark for the shared LeRobot image.
+
+Measures, for an image variant:
+- the time to build (or fetch from cache) the image and start the app,
+- the time from the remote call to the container running our code,
+- the time from container start to the first training step logged by train.py.
+
+Every run starts a fresh ephemeral app, so the container is always cold.
+The image variant is chosen with COLD_START_VARIANT because the image has
+to be defined when this module is imported.
+
+Usage:
+    python benchmark_cold_start.py
+    COLD_START_VARIANT=smolvla python benchmark_cold_start.py --runs 3
+    # Measure an uncached image build
+    MODAL_FORCE_BUILD=1 python benchmark_cold_start.py --runs 1
+"""
+
+import argparse
+import json
+import os
+import time
+
+# Recorded as soon as the module is imported, i.e. when the container starts
+CONTAINER_STARTED = time.time()
+
+import modal
+
+from lerobot_image import lerobot_image
+from training_logs import TrainingProcess, parse_step_line
+
+# A tiny train.py run of each variant that logs every step
+FIRST_STEP_COMMANDS = {
+    "pusht": [
+        "python", "lerobot/scripts/train.py",
+        "--policy.type=act",
+        "--dataset.repo_id=lerobot/pusht",
+        "--env.type=pusht",
+        "--batch_size=8",
+        "--steps=10",
+        "--log_freq=1",
+        "--save_checkpoint=false",
+        "--policy.device=cuda",
+        "--wandb.enable=false",
+        "--output_dir=/tmp/cold_start",
+    ],
+    "smolvla": [
+        "python", "lerobot/scripts/train.py",
+        "--policy.path=lerobot/smolvla_base",
+        "--dataset.repo_id=lerobot/svla_so101_pickplace",
+        "--batch_size=8",
+        "--steps=10",
+        "--log_freq=1",
+        "--save_checkpoint=false",
+        "--policy.device=cuda",
+        "--wandb.enable=false",
+        "--output_dir=/tmp/cold_start",
+    ],
+}
+
+VARIANT = os.environ.get("COLD_START_VARIANT", "pusht")
+
+app = modal.App("lerobot-cold-start", image=lerobot_image(VARIANT))
+
+
+@app.function(gpu="L40S", timeout=1800, secrets=[modal.Secret.from_name("wandb-secret")])
+def first_step(variant: str):
+    """Run train.py until its first logged step and report the timings."""
+    started = time.time()
+    hf_token = os.environ.get("HUGGINGFACE_TOKEN")
+    if hf_token:
+        os.environ["HF_TOKEN"] = hf_token
+
+    first_step_at = None
+    process = TrainingProcess(FIRST_STEP_COMMANDS[variant], cwd="/lerobot")
+    for line in process:
+        if parse_step_line(line.text):
+            first_step_at = time.time()
+            break  # Stops train.py
+
+    return {
+        "container_started": CONTAINER_STARTED,
+        "function_started": started,
+        "first_step": first_step_at,
+    }
+
+
+def benchmark(variant, runs):
+    results = []
+    for run in range(runs):
+        t0 = time.time()
+        with app.run():
+            app_ready = time.time()
+            timings = first_step.remote(variant)
+        if timings["first_step"] is None:
+            raise RuntimeError("train.py exited before logging a training step")
+
+        result = {
+            "run": run,
+            "image_build_and_app_start_s": app_ready - t0,
+            # Compares local and container clocks, so only accurate to clock skew
+            "call_to_container_start_s": timings["container_started"] - app_ready,
+            "container_start_to_first_step_s": timings["first_step"] - timings["container_started"],
+            "call_to_first_step_s": timings["first_step"] - app_ready,
+        }
+        print(json.dumps(result))
+        results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark cold starts of the shared LeRobot image")
+    parser.add_argument("--runs", type=int, default=1, help="Number of cold starts to measure")
+    parser.add_argument("--output", type=str, help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    print(f"Benchmarking cold starts of the {VARIANT!r} image")
+    with modal.enable_output():
+        results = benchmark(VARIANT, args.runs)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
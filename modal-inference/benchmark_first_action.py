@@ -0,0 +1,112 @@
+"""
+Time-to-first-action benchmark for the deployed policy server.
+
+Compares cold starts of `PolicyServer` (downloads and loads the weights in
+every new container) with `FastPolicyServer` (baked weights and a memory
+snapshot). Each run calls `predict` on a container that is not running, then
+stops that container so that the next run is cold again.
+
+Measures, for each run:
+- the time from the `predict` call to the first action chunk,
+- the time from container start to the policy being ready (from the container),
+- the time spent loading the policy (and moving it to the GPU, for the fast server).
+
+Memory snapshots are only created for deployed apps, during their first cold
+starts, so the benchmark starts with a warm-up cold start of each class.
+
+Usage:
+    modal deploy serve_policy_modal_app.py
+    python benchmark_first_action.py --runs 3
+    python benchmark_first_action.py --checkpoint lerobot/smolvla_base --output first_action.json
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import time
+
+import modal
+
+from policy_server import decode_arrays, dummy_observation, encode_arrays
+from serve_policy_modal_app import FAST_START_POLICY
+
+APP_NAME = "lerobot-policy-server"
+MODES = {"baseline": "PolicyServer", "fast": "FastPolicyServer"}
+
+
+def stop_container(task_id):
+    """Stop a container so that the next call has to cold start a new one."""
+    subprocess.run(["modal", "container", "stop", task_id], check=True, capture_output=True)
+    time.sleep(5)  # Let the scheduler notice before the next call
+
+
+def cold_start(server, payload, task):
+    """Call `predict` on a cold container, stop it, and return the timings of the run."""
+    started = time.time()
+    action = decode_arrays(server.predict.remote(payload, task))["action"]
+    first_action = time.time()
+    startup = server.startup_timings.remote()
+    stop_container(startup["task_id"])
+
+    result = {
+        "call_to_first_action_s": first_action - started,
+        "load_s": startup["load_s"],
+        "action_shape": list(action.shape),
+    }
+    if "restored" in startup:
+        # A restored container has no meaningful start time, see FastPolicyServer
+        result["restore_to_ready_s"] = startup["ready"] - startup["restored"]
+        result["to_gpu_s"] = startup["to_gpu_s"]
+    else:
+        result["container_start_to_ready_s"] = startup["ready"] - startup["container_started"]
+    return result
+
+
+def benchmark(checkpoint, task, runs):
+    results = {}
+    for mode, class_name in MODES.items():
+        server = modal.Cls.from_name(APP_NAME, class_name)(checkpoint=checkpoint)
+
+        # Warm-up cold start: builds the payload and, for the fast server,
+        # creates the memory snapshot
+        features = server.features.remote()
+        payload = encode_arrays(dummy_observation(features))
+        stop_container(server.startup_timings.remote()["task_id"])
+
+        results[mode] = []
+        for run in range(runs):
+            result = cold_start(server, payload, task)
+            print(json.dumps({"mode": mode, "run": run, **result}))
+            results[mode].append(result)
+    return results
+
+
+def summarize(results):
+    summary = {
+        mode: statistics.median(run["call_to_first_action_s"] for run in runs)
+        for mode, runs in results.items()
+    }
+    print("\nMedian time to first action:")
+    for mode, seconds in summary.items():
+        print(f"  {mode:<10} {seconds:6.1f}s")
+    if summary.get("fast"):
+        print(f"  speedup    {summary['baseline'] / summary['fast']:6.1f}x")
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the time to first action of cold policy servers")
+    parser.add_argument("--checkpoint", type=str, default=FAST_START_POLICY,
+                        help="Policy loaded by both servers; baked weights only cover FAST_START_POLICY")
+    parser.add_argument("--task", type=str, default="Pick up the cube.")
+    parser.add_argument("--runs", type=int, default=3, help="Number of cold starts of each server")
+    parser.add_argument("--output", type=str, help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = benchmark(args.checkpoint, args.task, args.runs)
+    summary = summarize(results)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"runs": results, "median_call_to_first_action_s": summary}, f, indent=2)
@@ -0,0 +1,91 @@
+"""
+Cost/throughput benchmark of the training apps across Modal GPU types.
+
+Runs a short, fixed-step train.py run for every (policy, GPU type, batch
+size) cell in parallel, then ranks the GPU types of each policy and batch
+size by cost per 1000 steps (see gpu_benchmark.py).
+
+Usage:
+    modal run benchmark_gpu_types.py
+    modal run benchmark_gpu_types.py --policies act,smolvla --gpus L4,L40S,A100,H100 --batch-sizes 32,64
+    modal run benchmark_gpu_types.py --prices '{"L40S": 1.95, "H100": 3.95}' --output report.csv
+"""
+
+import json
+import os
+import tempfile
+
+import modal
+
+from dataset_cache import cached_lerobot_home
+from gpu_benchmark import (
+    GPU_PRICES_PER_HOUR, GpuMemorySampler, POLICIES, benchmark_cells, benchmark_command, format_report,
+    rank_rows, run_benchmark, steady_steps_per_s, write_report
+)
+from lerobot_image import lerobot_image
+from training_logs import run_training
+
+# The smolvla image also trains ACT and diffusion on pusht
+image = lerobot_image("smolvla")
+
+app = modal.App("lerobot-gpu-benchmark", image=image)
+
+# Datasets prefetched once and shared by every run (see dataset_cache.py)
+dataset_volume = modal.Volume.from_name("lerobot-datasets", create_if_missing=True)
+DATASETS_DIR = "/datasets"
+
+
+@app.cls(
+    gpu="L40S",  # Overridden for each cell
+    timeout=3600,
+    volumes={DATASETS_DIR: dataset_volume},
+    secrets=[modal.Secret.from_name("wandb-secret")]  # For HUGGINGFACE_TOKEN
+)
+class CellTrainer:
+    @modal.method()
+    def train(self, policy: str, batch_size: int, steps: int) -> dict:
+        """Train `policy` for `steps` steps and return its throughput and peak GPU memory."""
+        os.environ["PYTHONUNBUFFERED"] = "1"
+        lerobot_home = cached_lerobot_home(DATASETS_DIR, POLICIES[policy]["dataset_repo_id"])
+        if lerobot_home:
+            os.environ["HF_LEROBOT_HOME"] = lerobot_home
+        hf_token = os.environ.get("HUGGINGFACE_TOKEN")
+        if hf_token:
+            os.environ["HF_TOKEN"] = hf_token
+
+        # train.py refuses to start in an existing output_dir, and containers are reused
+        output_dir = os.path.join(tempfile.mkdtemp(), "run")
+        with GpuMemorySampler() as memory:
+            result = run_training(benchmark_command(policy, batch_size, steps, output_dir), output_dir)
+
+        if result["return_code"] != 0:
+            return {"error": result["stderr_tail"][-300:] or f"train.py exited with {result['return_code']}"}
+        return {
+            "steps_per_s": steady_steps_per_s(result["telemetry"]),
+            "peak_gpu_mem_gb": memory.peak_gb,
+            "steps": steps,
+            "wall_time_s": result["wall_time_s"],
+        }
+
+
+@app.local_entrypoint()
+def main(
+    policies: str = "act,diffusion,smolvla",
+    gpus: str = "L4,A10G,L40S,A100,H100",
+    batch_sizes: str = "8,32,64",
+    steps: int = 200,
+    max_parallel: int = 10,
+    prices: str = None,
+    output: str = "gpu_benchmark.json"
+):
+    cells = benchmark_cells(policies.split(","), gpus.split(","), [int(size) for size in batch_sizes.split(",")])
+    print(f"Benchmarking {len(cells)} cells of {steps} steps...")
+
+    def train_cell(cell):
+        trainer = CellTrainer.with_options(gpu=cell["gpu"])()
+        return trainer.train.remote(policy=cell["policy"], batch_size=cell["batch_size"], steps=steps)
+
+    gpu_prices = {**GPU_PRICES_PER_HOUR, **(json.loads(prices) if prices else {})}
+    rows = rank_rows(run_benchmark(cells, train_cell, max_parallel, gpu_prices))
+    print(format_report(rows))
+    print(f"Report written to {write_report(rows, output)}")
@@ -0,0 +1,462 @@
+"""
+Content-addressed, deduplicated storage of train.py checkpoints.
+
+Fine-tunes of the same base policy (e.g. lerobot/smolvla_base) share most of
+their weights, and so do successive checkpoints of a run whose backbone is
+frozen. Instead of keeping every `checkpoints/NNNNNN/` directory in full,
+the store splits checkpoint files into chunks named by their SHA-256, so
+identical chunks are stored once:
+
+    <store>/chunks/ab/ab12...            chunk contents
+    <store>/manifests/<run>/NNNNNN.json  files of a checkpoint and their chunks
+
+`.safetensors` files are split along tensor boundaries (plus the header),
+so an unchanged tensor is an unchanged chunk wherever it sits in the file.
+Other files are split into fixed-size chunks. A volume commit then only
+uploads the chunks that are new, and `download` only fetches chunks that
+are not in a local cache yet.
+
+Chunks are written before the manifest that references them, and
+`collect_garbage` only removes unreferenced chunks older than a grace
+period, so it can run while checkpoints are being added.
+
+Usage (on a local copy of a store):
+    python checkpoint_store.py stats /path/to/store
+    python checkpoint_store.py restore /path/to/store <run> <step> /path/to/checkpoint
+    python checkpoint_store.py prune /path/to/store <run> --keep-last 3
+    python checkpoint_store.py download <volume> outputs/<run> <step> ./checkpoint --cache ~/.cache/lerobot-chunks
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import struct
+import time
+
+from checkpoint_sync import PRETRAINED_MODEL_DIR, TRAIN_CONFIG_NAME, last_checkpoint_step, list_checkpoints
+
+CHUNK_SIZE = 16 * 1024 * 1024
+CHUNKS_DIR = "chunks"
+MANIFESTS_DIR = "manifests"
+
+# Unreferenced chunks younger than this may belong to a checkpoint whose
+# manifest is not written yet
+GC_GRACE_PERIOD_S = 3600
+
+
+def _fixed_pieces(start, end, chunk_size):
+    return [(offset, min(chunk_size, end - offset)) for offset in range(start, end, chunk_size)]
+
+
+def file_pieces(path, chunk_size=CHUNK_SIZE):
+    """
+    Return the (offset, length) pieces a file is split into.
+
+    A safetensors file is split into its header, then each tensor (and any
+    bytes between tensors), with tensors larger than `chunk_size` split
+    further. Other files are split every `chunk_size` bytes.
+    """
+    size = os.path.getsize(path)
+    if not path.endswith(".safetensors") or size < 8:
+        return _fixed_pieces(0, size, chunk_size)
+
+    with open(path, "rb") as f:
+        (header_size,) = struct.unpack("<Q", f.read(8))
+        try:
+            header = json.loads(f.read(header_size))
+        except ValueError:
+            return _fixed_pieces(0, size, chunk_size)
+
+    data_start = 8 + header_size
+    ranges = sorted(
+        (data_start + tensor["data_offsets"][0], data_start + tensor["data_offsets"][1])
+        for name, tensor in header.items() if name != "__metadata__"
+    )
+    pieces = [(0, data_start)]
+    position = data_start
+    for begin, end in ranges:
+        if begin > position:
+            pieces.extend(_fixed_pieces(position, begin, chunk_size))  # Padding between tensors
+        pieces.extend(_fixed_pieces(begin, end, chunk_size))
+        position = max(position, end)
+    pieces.extend(_fixed_pieces(position, size, chunk_size))
+    return [(offset, length) for offset, length in pieces if length > 0]
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class CheckpointStore:
+    """
+    A chunk store and its checkpoint manifests under `root`.
+
+    Args:
+        root (str): Store directory, e.g. on the training volume
+        chunk_size (int): Largest chunk, in bytes
+    """
+
+    def __init__(self, root, chunk_size=CHUNK_SIZE):
+        self.root = root
+        self.chunk_size = chunk_size
+        # (run, step, path) of the checkpoints `ingest_run` keeps in full,
+        # so that later calls do not hash them again
+        self._kept = set()
+
+    def chunk_path(self, digest):
+        return os.path.join(self.root, CHUNKS_DIR, digest[:2], digest)
+
+    def has_chunk(self, digest):
+        return os.path.exists(self.chunk_path(digest))
+
+    def put_chunk(self, data, digest=None):
+        """Store a chunk unless it is already there; return (digest, whether it was new)."""
+        digest = digest or hashlib.sha256(data).hexdigest()
+        if self.has_chunk(digest):
+            return digest, False
+        _write_atomic(self.chunk_path(digest), data)
+        return digest, True
+
+    def get_chunk(self, digest, verify=False):
+        with open(self.chunk_path(digest), "rb") as f:
+            data = f.read()
+        if verify and hashlib.sha256(data).hexdigest() != digest:
+            raise ValueError(f"Chunk {digest} is corrupted")
+        return data
+
+    def manifest_path(self, run, step):
+        return os.path.join(self.root, MANIFESTS_DIR, run, f"{step:06d}.json")
+
+    def has_manifest(self, run, step):
+        return os.path.exists(self.manifest_path(run, step))
+
+    def load_manifest(self, run, step):
+        with open(self.manifest_path(run, step)) as f:
+            return json.load(f)
+
+    def list_manifests(self, run=None):
+        """Return the (run, step) of every stored checkpoint, oldest step first within a run."""
+        manifests_dir = os.path.join(self.root, MANIFESTS_DIR)
+        top = os.path.join(manifests_dir, run) if run is not None else manifests_dir
+        found = []
+        # Run names are paths, so a run's manifests may sit several levels down
+        for run_dir, _, files in os.walk(top):
+            name = os.path.relpath(run_dir, manifests_dir)
+            if run is not None and name != os.path.normpath(run):
+                continue  # Another run nested under this one
+            steps = sorted(int(file[:-5]) for file in files if file.endswith(".json") and file[:-5].isdigit())
+            found.extend((name, step) for step in steps)
+        return sorted(found)
+
+    def _file_chunks(self, checkpoint_dir, store):
+        """
+        Split the files of a checkpoint directory into chunks, storing them
+        if `store`. Return the manifest's file entries and the new bytes.
+        """
+        files = []
+        stored_bytes = 0
+        for root, _, names in os.walk(checkpoint_dir):
+            for name in sorted(names):
+                path = os.path.join(root, name)
+                chunks = []
+                with open(path, "rb") as f:
+                    for offset, length in file_pieces(path, self.chunk_size):
+                        f.seek(offset)
+                        data = f.read(length)
+                        if store:
+                            digest, new = self.put_chunk(data)
+                            stored_bytes += length if new else 0
+                        else:
+                            digest = hashlib.sha256(data).hexdigest()
+                        chunks.append([digest, length])
+                size = os.path.getsize(path)
+                files.append({"path": os.path.relpath(path, checkpoint_dir), "size": size, "chunks": chunks})
+        return sorted(files, key=lambda file: file["path"]), stored_bytes
+
+    def ingest(self, checkpoint_dir, run, step):
+        """
+        Add a checkpoint directory to the store.
+
+        Returns:
+            dict: The manifest, whose "stored_bytes" is the size of the
+            chunks that were new to the store
+        """
+        files, stored_bytes = self._file_chunks(checkpoint_dir, store=True)
+        total_bytes = sum(file["size"] for file in files)
+        manifest = {
+            "run": run,
+            "step": step,
+            "source": os.path.abspath(checkpoint_dir),
+            "created": time.time(),
+            "total_bytes": total_bytes,
+            "stored_bytes": stored_bytes,
+            "files": files,
+        }
+        _write_atomic(self.manifest_path(run, step), json.dumps(manifest, indent=1).encode())
+        return manifest
+
+    def restore(self, run, step, dest_dir, verify=True):
+        """Rebuild the checkpoint files of `run` at `step` in `dest_dir`."""
+        return restore_manifest(self.load_manifest(run, step), self, dest_dir, verify)
+
+    def matches(self, run, step, checkpoint_dir):
+        """
+        Return True if the stored checkpoint of `run` at `step` was ingested
+        from `checkpoint_dir` and its files still have the same contents.
+        Files are only hashed if their paths and sizes match.
+        """
+        manifest = self.load_manifest(run, step)
+        if manifest.get("source") != os.path.abspath(checkpoint_dir):
+            return False
+        sizes = {
+            os.path.relpath(os.path.join(root, name), checkpoint_dir): os.path.getsize(os.path.join(root, name))
+            for root, _, names in os.walk(checkpoint_dir) for name in names
+        }
+        if sizes != {file["path"]: file["size"] for file in manifest["files"]}:
+            return False
+        files, _ = self._file_chunks(checkpoint_dir, store=False)
+        return files == manifest["files"]
+
+    def ingest_run(self, output_dir, run=None, keep_full=1):
+        """
+        Add the complete checkpoints of a train.py output directory that are
+        not in the store yet, then delete the full copies of all but the
+        `keep_full` newest ones (train.py resumes from full checkpoints).
+
+        Only checkpoints that `checkpoints/last` has reached are complete;
+        newer ones may still be being written.
+
+        A full copy is only deleted if this call stored it, or if its stored
+        manifest came from the same directory with the same contents. A
+        checkpoint whose step is already stored from elsewhere (e.g. an
+        earlier run in a reused output_dir) is left alone, in full, and not
+        checked again by later calls.
+
+        Args:
+            output_dir (str): The train.py output directory
+            run (str): Name of the run in the store, defaults to
+                `run_name(output_dir)`
+            keep_full (int): Newest complete checkpoints kept in full
+
+        Returns:
+            list: The steps added to the store
+        """
+        run = run or run_name(output_dir)
+        last_step = last_checkpoint_step(output_dir)
+        if last_step is None:
+            return []
+        complete = [
+            (step, path) for step, path in list_checkpoints(output_dir)
+            if step <= last_step and os.path.isfile(os.path.join(path, PRETRAINED_MODEL_DIR, TRAIN_CONFIG_NAME))
+        ]
+
+        added = []
+        for step, path in complete:
+            if not self.has_manifest(run, step):
+                manifest = self.ingest(path, run, step)
+                added.append(step)
+                print(f"Stored checkpoint {step} of {run}: {manifest['stored_bytes'] / 1e6:.0f} MB new "
+                      f"out of {manifest['total_bytes'] / 1e6:.0f} MB")
+        for step, path in complete[:-keep_full] if keep_full else complete:
+            if (run, step, path) in self._kept:
+                continue
+            if step in added or self.matches(run, step, path):
+                shutil.rmtree(path)
+            else:
+                self._kept.add((run, step, path))
+                print(f"Keeping {path} in full: step {step} of {run} is stored from another checkpoint")
+        return added
+
+    def prune(self, run, keep_last=3, keep_steps=()):
+        """
+        Delete the manifests of `run` except the `keep_last` newest and
+        `keep_steps`. Their chunks are freed by `collect_garbage`.
+
+        Returns:
+            list: The steps whose manifests were deleted
+        """
+        steps = [step for _, step in self.list_manifests(run)]
+        keep = set(steps[-keep_last:] if keep_last else []) | set(keep_steps)
+        removed = [step for step in steps if step not in keep]
+        for step in removed:
+            os.remove(self.manifest_path(run, step))
+        return removed
+
+    def referenced_chunks(self):
+        """Return the digests referenced by any manifest."""
+        digests = set()
+        for run, step in self.list_manifests():
+            for file in self.load_manifest(run, step)["files"]:
+                digests.update(digest for digest, _ in file["chunks"])
+        return digests
+
+    def collect_garbage(self, grace_period_s=GC_GRACE_PERIOD_S, now=None):
+        """
+        Delete the chunks no manifest references, except recent ones.
+
+        Returns:
+            dict: Number of chunks removed and bytes freed
+        """
+        now = time.time() if now is None else now
+        referenced = self.referenced_chunks()
+        removed = freed = 0
+        chunks_dir = os.path.join(self.root, CHUNKS_DIR)
+        for root, _, names in os.walk(chunks_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                if name in referenced or ".tmp" in name:
+                    continue
+                stat = os.stat(path)
+                if now - stat.st_mtime < grace_period_s:
+                    continue
+                os.remove(path)
+                removed += 1
+                freed += stat.st_size
+        return {"removed_chunks": removed, "freed_bytes": freed}
+
+    def stats(self):
+        """Return the stored size and the size of the checkpoints it holds."""
+        chunk_count = stored_bytes = 0
+        for root, _, names in os.walk(os.path.join(self.root, CHUNKS_DIR)):
+            for name in names:
+                chunk_count += 1
+                stored_bytes += os.path.getsize(os.path.join(root, name))
+        manifests = self.list_manifests()
+        logical_bytes = sum(self.load_manifest(run, step)["total_bytes"] for run, step in manifests)
+        return {
+            "checkpoints": len(manifests),
+            "chunks": chunk_count,
+            "stored_bytes": stored_bytes,
+            "checkpoint_bytes": logical_bytes,
+            "dedup_ratio": logical_bytes / stored_bytes if stored_bytes else None,
+        }
+
+
+def run_name(output_dir):
+    """
+    Name of a run in the store: its output_dir without the leading "/",
+    e.g. "outputs/sweeps/A/000-batch_size=16", so runs whose directories
+    only share a basename never share manifests.
+    """
+    return os.path.normpath(os.path.abspath(output_dir)).lstrip(os.sep)
+
+
+def deduplicating_commit(store, output_dir, commit, keep_full=1):
+    """
+    Wrap a volume `commit` so that it first moves the complete checkpoints
+    of `output_dir` into `store` (see `CheckpointStore.ingest_run`).
+
+    Use it in place of `volume.commit` with a `CheckpointCommitter` and for
+    the final commit after training.
+    """
+    def commit_checkpoints():
+        store.ingest_run(output_dir, keep_full=keep_full)
+        commit()
+
+    return commit_checkpoints
+
+
+def restore_manifest(manifest, store, dest_dir, verify=True):
+    """Write the files of `manifest` to `dest_dir`, reading chunks from `store`."""
+    for file in manifest["files"]:
+        path = os.path.join(dest_dir, file["path"])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            for digest, _ in file["chunks"]:
+                f.write(store.get_chunk(digest, verify=verify))
+    return dest_dir
+
+
+def download(volume_name, run, step, dest_dir, cache_dir, store_dir="checkpoint_store"):
+    """
+    Download a checkpoint from the store on a Modal volume.
+
+    Chunks already in the local cache (a `CheckpointStore` at `cache_dir`)
+    are not downloaded again, so fetching another checkpoint of the same
+    base model only transfers the chunks that changed.
+
+    Args:
+        volume_name (str): The Modal volume, e.g. "lerobot-smolvla-training-volume"
+        run (str): Run name, i.e. the train.py output_dir without its
+            leading "/" (see `run_name`)
+        step (int): Checkpoint step
+        dest_dir (str): Local directory receiving the checkpoint files
+        cache_dir (str): Local chunk cache
+        store_dir (str): Path of the store inside the volume
+
+    Returns:
+        dict: Bytes downloaded and bytes served from the cache
+    """
+    import modal
+
+    volume = modal.Volume.from_name(volume_name)
+    cache = CheckpointStore(cache_dir)
+    manifest_path = os.path.relpath(CheckpointStore(store_dir).manifest_path(run, step))
+    manifest = json.loads(b"".join(volume.read_file(manifest_path)))
+
+    downloaded = cached = 0
+    for file in manifest["files"]:
+        for digest, length in file["chunks"]:
+            if cache.has_chunk(digest):
+                cached += length
+                continue
+            data = b"".join(volume.read_file(os.path.relpath(CheckpointStore(store_dir).chunk_path(digest))))
+            if hashlib.sha256(data).hexdigest() != digest:
+                raise ValueError(f"Chunk {digest} is corrupted")
+            cache.put_chunk(data, digest)
+            downloaded += length
+    restore_manifest(manifest, cache, dest_dir, verify=False)
+    return {"downloaded_bytes": downloaded, "cached_bytes": cached}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage a deduplicated checkpoint store")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    stats_parser = subparsers.add_parser("stats", help="Show the stored size and deduplication ratio")
+    stats_parser.add_argument("store")
+
+    ingest_parser = subparsers.add_parser("ingest", help="Add the complete checkpoints of a train.py output_dir")
+    ingest_parser.add_argument("store")
+    ingest_parser.add_argument("output_dir")
+    ingest_parser.add_argument("--keep-full", type=int, default=1, help="Newest checkpoints to keep in full")
+
+    restore_parser = subparsers.add_parser("restore", help="Rebuild a checkpoint directory")
+    restore_parser.add_argument("store")
+    restore_parser.add_argument("run")
+    restore_parser.add_argument("step", type=int)
+    restore_parser.add_argument("dest_dir")
+
+    prune_parser = subparsers.add_parser("prune", help="Keep the newest checkpoints of a run, then collect garbage")
+    prune_parser.add_argument("store")
+    prune_parser.add_argument("run")
+    prune_parser.add_argument("--keep-last", type=int, default=3)
+    prune_parser.add_argument("--grace-period-s", type=float, default=GC_GRACE_PERIOD_S)
+
+    download_parser = subparsers.add_parser("download", help="Download a checkpoint from a Modal volume")
+    download_parser.add_argument("volume")
+    download_parser.add_argument("run")
+    download_parser.add_argument("step", type=int)
+    download_parser.add_argument("dest_dir")
+    download_parser.add_argument("--cache", default=os.path.expanduser("~/.cache/lerobot-chunks"))
+    download_parser.add_argument("--store-dir", default="checkpoint_store")
+    args = parser.parse_args()
+
+    if args.command == "stats":
+        print(json.dumps(CheckpointStore(args.store).stats(), indent=2))
+    elif args.command == "ingest":
+        print(f"Added steps {CheckpointStore(args.store).ingest_run(args.output_dir, keep_full=args.keep_full)}")
+    elif args.command == "restore":
+        print(f"Restored to {CheckpointStore(args.store).restore(args.run, args.step, args.dest_dir)}")
+    elif args.command == "prune":
+        store = CheckpointStore(args.store)
+        print(f"Removed steps {store.prune(args.run, args.keep_last)}")
+        print(json.dumps(store.collect_garbage(args.grace_period_s), indent=2))
+    else:
+        print(json.dumps(download(args.volume, args.run, args.step, args.dest_dir, args.cache, args.store_dir), indent=2))
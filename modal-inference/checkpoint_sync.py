@@ -0,0 +1,188 @@
+"""
+Helpers for the checkpoints that LeRobot's train.py writes to a Modal volume.
+
+train.py saves a checkpoint every `save_freq` steps under
+`<output_dir>/checkpoints/NNNNNN/` and then points the `checkpoints/last`
+symlink at it. Nothing is persisted on a Modal volume until it is
+committed, so these helpers commit checkpoints while training is still
+running instead of once at the very end.
+"""
+
+import os
+import threading
+import time
+from collections import namedtuple
+
+CHECKPOINTS_DIR = "checkpoints"
+LAST_CHECKPOINT_LINK = "last"
+PRETRAINED_MODEL_DIR = "pretrained_model"
+TRAIN_CONFIG_NAME = "train_config.json"
+
+# A checkpoint that train.py can resume from
+Checkpoint = namedtuple("Checkpoint", ["step", "path", "config_path"])
+
+
+def list_checkpoints(output_dir):
+    """Return the (step, path) of every checkpoint in `output_dir`, oldest first."""
+    checkpoints_dir = os.path.join(output_dir, CHECKPOINTS_DIR)
+    if not os.path.isdir(checkpoints_dir):
+        return []
+
+    checkpoints = []
+    for name in os.listdir(checkpoints_dir):
+        path = os.path.join(checkpoints_dir, name)
+        if name.isdigit() and os.path.isdir(path) and not os.path.islink(path):
+            checkpoints.append((int(name), path))
+    return sorted(checkpoints)
+
+
+def last_checkpoint_step(output_dir):
+    """Return the step the `checkpoints/last` symlink points to, or None."""
+    link = os.path.join(output_dir, CHECKPOINTS_DIR, LAST_CHECKPOINT_LINK)
+    target = os.path.basename(os.path.realpath(link)) if os.path.islink(link) else ""
+    return int(target) if target.isdigit() else None
+
+
+def latest_checkpoint(output_dir):
+    """
+    Return the newest resumable `Checkpoint` in `output_dir`, or None.
+
+    Checkpoints newer than `checkpoints/last` or without
+    `pretrained_model/train_config.json` were cut off while being written
+    and are skipped.
+    """
+    last_step = last_checkpoint_step(output_dir)
+    for step, path in reversed(list_checkpoints(output_dir)):
+        if last_step is not None and step > last_step:
+            continue
+        config_path = os.path.join(path, PRETRAINED_MODEL_DIR, TRAIN_CONFIG_NAME)
+        if os.path.isfile(config_path):
+            return Checkpoint(step, path, config_path)
+    return None
+
+
+def resume_train_command(checkpoint, steps):
+    """
+    Build the train.py command line that resumes from `checkpoint`.
+
+    The rest of the configuration, including `output_dir`, is read from the
+    checkpoint's train_config.json. `steps` is the total to reach, not the
+    number of additional steps.
+    """
+    return [
+        "python", "lerobot/scripts/train.py",
+        f"--config_path={checkpoint.config_path}",
+        "--resume=true",
+        f"--steps={steps}",
+    ]
+
+
+def _snapshot(path):
+    """Return the (relative path, size, mtime) of every file under `path`."""
+    files = []
+    for root, _, names in os.walk(path):
+        for name in names:
+            full_path = os.path.join(root, name)
+            try:
+                stat = os.stat(full_path)
+            except FileNotFoundError:
+                continue  # Removed while walking, e.g. a temporary file
+            files.append((os.path.relpath(full_path, path), stat.st_size, stat.st_mtime))
+    return sorted(files)
+
+
+class CheckpointCommitter:
+    """
+    Commit each checkpoint to the volume as soon as it is fully written.
+
+    A background thread polls `<output_dir>/checkpoints/` every
+    `poll_interval` seconds. A checkpoint counts as complete once
+    `checkpoints/last` points at it (or at a newer one), or when none of
+    its files changed for `settle_time` seconds. All checkpoints that
+    completed since the last commit are persisted by a single `commit()`
+    call, at most once every `min_commit_interval` seconds.
+
+    `commit()` persists every pending write under the mount, not just the
+    completed checkpoints: the log archive, but also a newer checkpoint
+    that is still half written or that `last` does not point at yet. That
+    is safe because resuming goes through `latest_checkpoint()`, which
+    skips such incomplete checkpoints.
+
+    Args:
+        output_dir (str): The train.py output directory on the volume
+        commit (callable): Persists the volume, e.g. `volume.commit`
+    """
+
+    def __init__(self, output_dir, commit, poll_interval=30, settle_time=60, min_commit_interval=60):
+        self.output_dir = output_dir
+        self.commit = commit
+        self.poll_interval = poll_interval
+        self.settle_time = settle_time
+        self.min_commit_interval = min_commit_interval
+        self.committed = []  # Steps of the checkpoints committed so far
+        self._pending = []
+        self._snapshots = {}  # step -> (snapshot, time it was first seen)
+        self._last_commit = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def completed_checkpoints(self, now=None):
+        """Return the steps of the checkpoints that are fully written but not yet committed."""
+        now = time.monotonic() if now is None else now
+        last_step = last_checkpoint_step(self.output_dir)
+        completed = []
+        for step, path in list_checkpoints(self.output_dir):
+            if step in self.committed or step in self._pending:
+                continue
+            if last_step is not None and step <= last_step:
+                completed.append(step)
+                continue
+
+            snapshot = _snapshot(path)
+            previous, since = self._snapshots.get(step, (None, now))
+            if snapshot != previous:
+                self._snapshots[step] = (snapshot, now)
+            elif snapshot and now - since >= self.settle_time:
+                completed.append(step)
+        return completed
+
+    def poll(self, now=None):
+        """Check for completed checkpoints and commit them if it is time to."""
+        now = time.monotonic() if now is None else now
+        self._pending.extend(self.completed_checkpoints(now))
+        if not self._pending:
+            return
+        if self._last_commit is not None and now - self._last_commit < self.min_commit_interval:
+            return
+
+        self.commit()
+        self._last_commit = now
+        self.committed.extend(self._pending)
+        for step in self._pending:
+            self._snapshots.pop(step, None)
+        print(f"Committed checkpoint(s) {self._pending} to the volume")
+        self._pending = []
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.poll()
+            except Exception as e:
+                # A failed commit is retried on the next poll and the final
+                # commit after training still persists everything
+                print(f"Checkpoint commit failed: {e}")
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop watching. The caller still commits once training has exited."""
+        self._stop.set()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
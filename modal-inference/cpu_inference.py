@@ -0,0 +1,269 @@
+"""
+CPU inference with dynamic int8 quantization, for edge boxes next to the robots.
+
+`export_int8` loads a `pretrained_model` directory written by train_policy
+(e.g. ACT or diffusion from lerobot-pusht-test.py), replaces its linear
+layers with dynamically quantized int8 ones and saves the result.
+`Int8PolicyRunner` loads such an export and serves it through the same
+interface as `policy_server.PolicyRunner`. That includes using it as the
+`predict_fn` of `remote_policy.ChunkPrefetcher`.
+
+With dynamic quantization, weights are stored as int8 and activations are
+quantized on the fly at each call. The policies are left as plain PyTorch
+modules, so their Python-side logic (action queues, diffusion sampling
+loops) keeps working unchanged.
+
+Usage:
+    python cpu_inference.py export /path/to/pretrained_model /path/to/int8_model
+    python cpu_inference.py benchmark /path/to/pretrained_model --dataset-repo-id lerobot/pusht
+    python cpu_inference.py benchmark --tiny-act /tmp/tiny_act  # no checkpoint or dataset needed
+"""
+
+import argparse
+import io
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+from policy_server import PolicyRunner, dummy_observation, make_tiny_act_checkpoint, resolve_checkpoint
+
+INT8_WEIGHTS_NAME = "model_int8.pt"
+QUANTIZATION_CONFIG_NAME = "quantization.json"
+CONFIG_NAME = "config.json"
+
+
+def quantize_policy(policy):
+    """Return a copy of `policy` with its nn.Linear layers dynamically quantized to int8."""
+    import torch
+
+    return torch.ao.quantization.quantize_dynamic(policy.cpu().eval(), {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def export_int8(pretrained_path, output_dir):
+    """
+    Quantize a checkpoint and save it to `output_dir`.
+
+    Args:
+        pretrained_path (str): A pretrained_model directory, checkpoint
+            directory or train.py output_dir (see `resolve_checkpoint`)
+        output_dir (str): Receives the policy's config.json, the quantized
+            weights and a description of the quantization
+
+    Returns:
+        str: `output_dir`
+    """
+    import torch
+
+    runner = PolicyRunner(pretrained_path, device="cpu")
+    quantized = quantize_policy(runner.policy)
+
+    os.makedirs(output_dir, exist_ok=True)
+    shutil.copy(os.path.join(runner.pretrained_path, CONFIG_NAME), os.path.join(output_dir, CONFIG_NAME))
+    torch.save(quantized.state_dict(), os.path.join(output_dir, INT8_WEIGHTS_NAME))
+    with open(os.path.join(output_dir, QUANTIZATION_CONFIG_NAME), "w") as f:
+        json.dump({
+            "method": "dynamic",
+            "dtype": "qint8",
+            "modules": ["Linear"],
+            "source": os.path.abspath(runner.pretrained_path),
+            "policy_type": runner.config.type,
+        }, f, indent=2)
+    return output_dir
+
+
+class Int8PolicyRunner(PolicyRunner):
+    """
+    A `PolicyRunner` for the int8 exports written by `export_int8`, on CPU.
+
+    Args:
+        export_dir (str): Directory written by `export_int8`
+        num_threads (int): Torch CPU threads, None to keep torch's default
+    """
+
+    def __init__(self, export_dir, num_threads=None):
+        import torch
+        from lerobot.common.policies.factory import get_policy_class
+        from lerobot.configs.policies import PreTrainedConfig
+
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        self.pretrained_path = export_dir
+        self.device = torch.device("cpu")
+
+        config = PreTrainedConfig.from_pretrained(export_dir)
+        config.device = "cpu"
+        if hasattr(config, "pretrained_backbone_weights"):
+            config.pretrained_backbone_weights = None  # Overwritten by the export's weights anyway
+
+        # Build the float policy, quantize its structure, then load the int8 weights
+        # (the normalization statistics are buffers, so they are in the state dict)
+        policy = get_policy_class(config.type)(config)
+        self.policy = quantize_policy(policy)
+        state_dict = torch.load(os.path.join(export_dir, INT8_WEIGHTS_NAME), map_location="cpu", weights_only=False)
+        self.policy.load_state_dict(state_dict)
+        self.policy.eval()
+        self.config = config
+
+
+def state_dict_bytes(policy):
+    """Return the serialized size of a policy's weights."""
+    import torch
+
+    buffer = io.BytesIO()
+    torch.save(policy.state_dict(), buffer)
+    return buffer.tell()
+
+
+def rss_bytes():
+    """Return the resident memory of this process, or None outside Linux."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def recorded_observations(repo_id, input_features, num_observations=50, root=None):
+    """
+    Return observations of a LeRobot dataset, evenly spaced over its frames.
+
+    Only the keys of `input_features` are kept, as numpy arrays without
+    batch dimension.
+    """
+    from lerobot.common.datasets.lerobot_dataset import LeRobotDataset
+
+    dataset = LeRobotDataset(repo_id, root=root)
+    indices = np.linspace(0, len(dataset) - 1, min(num_observations, len(dataset))).astype(int)
+    observations = []
+    for index in indices:
+        item = dataset[int(index)]
+        observations.append({key: item[key].numpy() for key in input_features})
+    return observations
+
+
+def time_predictions(runner, observations, task=None, warmup=3, seed=0):
+    """
+    Predict every observation once, after `warmup` untimed predictions.
+
+    The random seed is reset before each prediction, so that stochastic
+    policies (e.g. diffusion) sample the same noise for every runner.
+
+    Returns:
+        tuple: (actions, latencies in ms)
+    """
+    import torch
+
+    for observation in observations[:warmup]:
+        runner.predict(observation, task)
+
+    actions, latencies = [], []
+    for observation in observations:
+        torch.manual_seed(seed)
+        started = time.perf_counter()
+        actions.append(runner.predict(observation, task))
+        latencies.append((time.perf_counter() - started) * 1000)
+    return np.stack(actions), np.array(latencies)
+
+
+def benchmark(pretrained_path, observations=None, export_dir=None, task=None, num_threads=None):
+    """
+    Compare the fp32 policy and its int8 export on CPU.
+
+    Args:
+        pretrained_path (str): The fp32 checkpoint
+        observations (list): Observations to predict, None for a zero observation
+        export_dir (str): Where to write the int8 export, defaults to
+            `<pretrained_model>_int8` next to the checkpoint
+        task (str): Language instruction, for policies that need one
+        num_threads (int): Torch CPU threads
+
+    Returns:
+        dict: Per model, latency percentiles, weight size and memory growth
+        when loading, plus the action error of the int8 model
+    """
+    import torch
+
+    if num_threads:
+        torch.set_num_threads(num_threads)
+
+    rss_before = rss_bytes()
+    fp32 = PolicyRunner(pretrained_path, device="cpu")
+    rss_fp32 = rss_bytes()
+    if observations is None:
+        observations = [dummy_observation(fp32.features())]
+
+    export_dir = export_dir or resolve_checkpoint(pretrained_path).rstrip("/") + "_int8"
+    export_int8(pretrained_path, export_dir)
+    rss_before_int8 = rss_bytes()
+    int8 = Int8PolicyRunner(export_dir)
+    rss_int8 = rss_bytes()
+
+    results = {"num_observations": len(observations), "num_threads": torch.get_num_threads()}
+    actions = {}
+    for name, runner, rss_delta in [
+        ("fp32", fp32, rss_fp32 - rss_before if rss_before else None),
+        ("int8", int8, rss_int8 - rss_before_int8 if rss_before_int8 else None),
+    ]:
+        actions[name], latencies = time_predictions(runner, observations, task)
+        results[name] = {
+            "latency_ms_p50": float(np.percentile(latencies, 50)),
+            "latency_ms_p95": float(np.percentile(latencies, 95)),
+            "weights_mb": state_dict_bytes(runner.policy) / 1e6,
+            "load_rss_mb": rss_delta / 1e6 if rss_delta is not None else None,
+        }
+
+    error = np.abs(actions["int8"] - actions["fp32"])
+    scale = np.abs(actions["fp32"]).mean() or 1.0
+    results["action_error"] = {
+        "mean_abs": float(error.mean()),
+        "max_abs": float(error.max()),
+        "mean_abs_relative": float(error.mean() / scale),
+    }
+    results["speedup_p50"] = results["fp32"]["latency_ms_p50"] / results["int8"]["latency_ms_p50"]
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export policies to int8 and benchmark them on CPU")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Quantize a checkpoint to int8")
+    export_parser.add_argument("checkpoint", help="pretrained_model, checkpoint or output directory")
+    export_parser.add_argument("output_dir")
+
+    benchmark_parser = subparsers.add_parser("benchmark", help="Compare the fp32 and int8 models")
+    benchmark_parser.add_argument("checkpoint", nargs="?", help="pretrained_model, checkpoint or output directory")
+    benchmark_parser.add_argument("--tiny-act", type=str, help="Create a tiny ACT checkpoint in this directory and use it")
+    benchmark_parser.add_argument("--export-dir", type=str)
+    benchmark_parser.add_argument("--dataset-repo-id", type=str, help="Predict recorded observations of this dataset")
+    benchmark_parser.add_argument("--dataset-root", type=str)
+    benchmark_parser.add_argument("--num-observations", type=int, default=50)
+    benchmark_parser.add_argument("--task", type=str)
+    benchmark_parser.add_argument("--num-threads", type=int)
+    benchmark_parser.add_argument("--output", type=str, help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        print(f"Wrote {export_int8(args.checkpoint, args.output_dir)}")
+    else:
+        checkpoint = make_tiny_act_checkpoint(args.tiny_act) if args.tiny_act else args.checkpoint
+        if checkpoint is None:
+            parser.error("one of checkpoint or --tiny-act is required")
+
+        observations = None
+        if args.dataset_repo_id:
+            from lerobot.configs.policies import PreTrainedConfig
+
+            config = PreTrainedConfig.from_pretrained(resolve_checkpoint(checkpoint))
+            observations = recorded_observations(
+                args.dataset_repo_id, config.input_features, args.num_observations, args.dataset_root
+            )
+
+        results = benchmark(checkpoint, observations, args.export_dir, args.task, args.num_threads)
+        print(json.dumps(results, indent=2))
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(results, f, indent=2)
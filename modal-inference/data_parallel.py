@@ -0,0 +1,435 @@
+"""
+Data-parallel training of LeRobot's train.py on several GPUs.
+
+train.py trains on a single device. `launch_command` wraps its command line
+with torchrun, which starts one process per GPU running this file. Each
+process joins the process group (NCCL on GPUs, gloo on CPU) and runs
+train.py in-process, with a few of the functions it imports replaced
+(`patch_lerobot`):
+- `make_policy` wraps the policy in `DistributedDataParallel`, which starts
+  every rank from rank 0's weights and all-reduces the gradients in buckets
+  while the backward pass is still running,
+- the data loader draws from a `DistributedSampler`, so each rank trains on
+  its own `batch_size / num_gpus` samples of a shuffle shared by all ranks
+  (the indices of LeRobot's `EpisodeAwareSampler` are sharded the same way),
+- `save_checkpoint` and `eval_policy` only run on rank 0. All ranks then
+  meet at a barrier of a CPU (gloo) group, so the other ranks wait there,
+  for up to `RANK0_WORK_TIMEOUT_S`, rather than inside the next gradient
+  all-reduce.
+
+Only rank 0 logs to W&B, evaluates, saves and pushes to the hub; the output
+of the other ranks goes to torchrun's log_dir.
+
+The global batch size and the number of steps stay those of the command, so
+a run on N GPUs sees as many samples as on one GPU and ideally takes 1/N of
+the time. As with any DistributedDataParallel model, every trainable
+parameter must receive a gradient at every step (set
+DDP_FIND_UNUSED_PARAMETERS=1 for policies where some do not).
+
+To check the launch, sharding and gradient averaging on CPU with gloo workers:
+    python data_parallel.py --self-test 2
+"""
+
+import argparse
+import inspect
+import os
+import runpy
+import subprocess
+import sys
+import tempfile
+from datetime import timedelta
+
+# Output directory of the ranks that do not save anything
+WORKER_OUTPUT_DIR = "/tmp/data_parallel"
+
+# Longest time the other ranks wait for a checkpoint or evaluation of rank 0
+RANK0_WORK_TIMEOUT_S = 3 * 3600
+
+FIND_UNUSED_PARAMETERS = os.environ.get("DDP_FIND_UNUSED_PARAMETERS", "0") == "1"
+
+
+def per_device_batch_size(batch_size, num_gpus):
+    """Split the global batch size evenly across `num_gpus` devices."""
+    if batch_size % num_gpus:
+        raise ValueError(f"batch_size {batch_size} is not divisible by num_gpus {num_gpus}")
+    return batch_size // num_gpus
+
+
+def set_arg(args, name, value):
+    """Return `args` with `--name=value`, replacing any previous value of `--name`."""
+    prefix = f"--{name}="
+    return [arg for arg in args if not arg.startswith(prefix)] + [f"{prefix}{value}"]
+
+
+def get_arg(args, name):
+    """Return the value of `--name=value` in `args`, or None."""
+    prefix = f"--{name}="
+    values = [arg[len(prefix):] for arg in args if arg.startswith(prefix)]
+    return values[-1] if values else None
+
+
+def launch_command(cmd, num_gpus, log_dir="/tmp/torchrun"):
+    """
+    Wrap a train.py command line to run on `num_gpus` GPUs.
+
+    Args:
+        cmd (list): ["python", "lerobot/scripts/train.py", *args], which
+            must set `--batch_size` (the global batch size)
+        num_gpus (int): Number of processes, one per GPU
+        log_dir (str): Where torchrun writes the output of ranks other than 0
+
+    Returns:
+        list: `cmd` itself for a single GPU, else the torchrun command line
+    """
+    if num_gpus == 1:
+        return list(cmd)
+    script, args = cmd[1], cmd[2:]
+    batch_size = get_arg(args, "batch_size")
+    if batch_size is None:
+        raise ValueError("Data-parallel training needs an explicit --batch_size")
+    args = set_arg(args, "batch_size", per_device_batch_size(int(batch_size), num_gpus))
+
+    return [
+        "torchrun", "--standalone", f"--nproc_per_node={num_gpus}",
+        # Rank 0 is printed and parsed as usual, the others only go to log files
+        "--redirects", ",".join(f"{rank}:3" for rank in range(1, num_gpus)),
+        "--log_dir", log_dir,
+        os.path.abspath(__file__), script, *args,
+    ]
+
+
+def worker_args(args, rank):
+    """
+    Arguments of ranks other than 0, which write to a scratch output
+    directory and do not log to W&B. Checkpoint and evaluation settings are
+    kept, so that every rank reaches the same barriers.
+    """
+    args = set_arg(args, "output_dir", os.path.join(WORKER_OUTPUT_DIR, f"rank{rank}"))
+    return set_arg(args, "wandb.enable", "false")
+
+
+def distributed_policy(policy, rank):
+    """
+    Wrap a policy in DistributedDataParallel.
+
+    train.py calls `policy.forward(batch)` for the training loss, which goes
+    through DDP. Other attributes (`config`, `get_optim_params`, `reset`...)
+    are those of the policy, and only rank 0 pushes it to the hub.
+    """
+    import torch
+    from torch.nn.parallel import DistributedDataParallel
+
+    class DistributedPolicy(DistributedDataParallel):
+        def __getattr__(self, name):
+            try:
+                return super().__getattr__(name)
+            except AttributeError:
+                if name == "module":
+                    raise  # Not wrapped yet
+                return getattr(self.module, name)
+
+        def push_model_to_hub(self, *args, **kwargs):
+            if rank == 0:
+                return self.module.push_model_to_hub(*args, **kwargs)
+
+    device_ids = [torch.cuda.current_device()] if torch.cuda.is_available() else None
+    return DistributedPolicy(
+        policy,
+        device_ids=device_ids,
+        find_unused_parameters=FIND_UNUSED_PARAMETERS,
+        gradient_as_bucket_view=True,
+    )
+
+
+def unwrap(policy):
+    """Return the policy inside a DistributedDataParallel wrapper."""
+    return getattr(policy, "module", policy)
+
+
+def distributed_index_sampler(indices, rank, world_size, shuffle, seed):
+    """
+    Return a DistributedSampler over `indices`, the dataset indices a
+    single-process run would draw. Every rank gets a disjoint shard of the
+    same shuffle, which changes every time the sampler is iterated, i.e.
+    every epoch of train.py's `cycle`.
+    """
+    from torch.utils.data import DistributedSampler
+
+    class DistributedIndexSampler(DistributedSampler):
+        def __iter__(self):
+            positions = list(super().__iter__())
+            self.set_epoch(self.epoch + 1)
+            return iter([self.dataset[position] for position in positions])
+
+    return DistributedIndexSampler(indices, num_replicas=world_size, rank=rank, shuffle=shuffle, seed=seed)
+
+
+def sharded_data_loader_class(rank, world_size, get_seed):
+    """
+    Return a DataLoader subclass that replaces the sampler train.py asks for
+    (shuffle=True, or LeRobot's EpisodeAwareSampler) by its shard on this rank.
+    """
+    from torch.utils.data import DataLoader
+
+    class ShardedDataLoader(DataLoader):
+        def __init__(self, *args, **kwargs):
+            params = inspect.signature(DataLoader).bind(*args, **kwargs).arguments
+            if params.get("batch_sampler") is None:
+                sampler = params.get("sampler")
+                if sampler is None:
+                    indices, shuffle = range(len(params["dataset"])), bool(params.get("shuffle"))
+                else:
+                    indices = list(getattr(sampler, "indices", None) or sampler)
+                    shuffle = getattr(sampler, "shuffle", True)
+                params["sampler"] = distributed_index_sampler(indices, rank, world_size, shuffle, get_seed())
+                params["shuffle"] = None
+            super().__init__(**params)
+
+    return ShardedDataLoader
+
+
+def patch_lerobot(rank, world_size, barrier_group):
+    """
+    Make the functions train.py imports rank-aware; it imports them when it
+    runs, after this.
+    """
+    import torch.distributed as dist
+    import torch.utils.data
+    from lerobot.common.envs import factory as env_factory
+    from lerobot.common.policies import factory
+    from lerobot.common.utils import random_utils, train_utils
+    from lerobot.scripts import eval as eval_script
+
+    make_policy = factory.make_policy
+    set_seed = random_utils.set_seed
+    save_checkpoint = train_utils.save_checkpoint
+    eval_policy = eval_script.eval_policy
+    seed = {"value": 0}
+
+    def make_distributed_policy(*args, **kwargs):
+        return distributed_policy(make_policy(*args, **kwargs), rank)
+
+    def set_rank_seed(value):
+        # The data order comes from the samplers' shared seed; the rank
+        # offset gives each rank its own augmentations and noise
+        seed["value"] = value
+        set_seed(value + rank)
+
+    def wait_for_rank0():
+        dist.barrier(group=barrier_group)
+
+    def save_on_rank0(checkpoint_dir, step, cfg, policy, *args, **kwargs):
+        if rank == 0:
+            save_checkpoint(checkpoint_dir, step, cfg, unwrap(policy), *args, **kwargs)
+        wait_for_rank0()
+
+    def eval_on_rank0(env, policy, *args, **kwargs):
+        if rank == 0:
+            info = eval_policy(env, unwrap(policy), *args, **kwargs)
+        else:
+            info = {
+                "aggregated": {"eval_s": 0.0, "avg_sum_reward": float("nan"), "pc_success": float("nan")},
+                "per_episode": [],
+                "video_paths": [],
+            }
+        wait_for_rank0()
+        return info
+
+    factory.make_policy = make_distributed_policy
+    random_utils.set_seed = set_rank_seed
+    train_utils.save_checkpoint = save_on_rank0
+    eval_script.eval_policy = eval_on_rank0
+    torch.utils.data.DataLoader = sharded_data_loader_class(rank, world_size, lambda: seed["value"])
+    if rank > 0:
+        env_factory.make_env = lambda *args, **kwargs: None  # No evaluation env, see eval_on_rank0
+        train_utils.update_last_checkpoint = lambda checkpoint_dir: None
+
+
+def init_process_group():
+    """Join the torchrun process group, returning (rank, world size)."""
+    import torch
+    import torch.distributed as dist
+
+    rank = int(os.environ["RANK"])
+    if torch.cuda.is_available():
+        torch.cuda.set_device(int(os.environ["LOCAL_RANK"]))
+        dist.init_process_group("nccl")
+    else:
+        dist.init_process_group("gloo")
+    return rank, dist.get_world_size()
+
+
+def rank0_barrier_group():
+    """A gloo group whose barriers may wait for rank 0's checkpoints and evaluations."""
+    import torch.distributed as dist
+
+    return dist.new_group(backend="gloo", timeout=timedelta(seconds=RANK0_WORK_TIMEOUT_S))
+
+
+def run_train_script(script, args):
+    """Run train.py in this torchrun process."""
+    import torch.distributed as dist
+
+    rank, world_size = init_process_group()
+    barrier_group = rank0_barrier_group()
+    patch_lerobot(rank, world_size, barrier_group)
+    if rank > 0:
+        args = worker_args(args, rank)
+
+    sys.argv = [script, *args]
+    try:
+        runpy.run_path(script, run_name="__main__")
+        dist.barrier(group=barrier_group)  # Rank 0 may still be pushing to the hub
+    finally:
+        dist.destroy_process_group()
+
+
+def scaling_efficiency(results, batch_size):
+    """
+    Compare the throughput of runs on different numbers of GPUs.
+
+    Args:
+        results (dict): Steps per second keyed by number of GPUs
+        batch_size (int): The global batch size of every run
+
+    Returns:
+        list: One row per GPU count with steps/s, samples/s, samples/s per
+        GPU and the efficiency relative to the smallest GPU count (1.0 is
+        perfect linear scaling)
+    """
+    base_gpus = min(results)
+    base_per_gpu = results[base_gpus] * batch_size / base_gpus
+    rows = []
+    for num_gpus in sorted(results):
+        samples_per_s = results[num_gpus] * batch_size
+        rows.append({
+            "num_gpus": num_gpus,
+            "steps_per_s": results[num_gpus],
+            "samples_per_s": samples_per_s,
+            "samples_per_s_per_gpu": samples_per_s / num_gpus,
+            "efficiency": samples_per_s / num_gpus / base_per_gpu,
+        })
+    return rows
+
+
+def _self_test_policy():
+    """A small model shaped like a LeRobot policy: forward(batch) returns (loss, output_dict)."""
+    import torch
+
+    class Policy(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.net = torch.nn.Sequential(torch.nn.Linear(4, 16), torch.nn.Tanh(), torch.nn.Linear(16, 2))
+
+        def forward(self, batch):
+            return torch.nn.functional.mse_loss(self.net(batch["x"]), batch["y"]), {}
+
+        def get_optim_params(self):
+            return self.parameters()
+
+    return Policy()
+
+
+def self_test_worker(steps=12, batch_size=8, dataset_size=40):
+    """
+    One rank of the self-test: train a small policy through `distributed_policy`
+    and the sharded data loader of `patch_lerobot`, then compare with a
+    single-process run on the union of the ranks' batches.
+    """
+    import torch
+    import torch.distributed as dist
+
+    class Dataset(torch.utils.data.Dataset):
+        def __init__(self, size):
+            generator = torch.Generator().manual_seed(0)
+            self.x = torch.randn(size, 4, generator=generator)
+            self.y = torch.randn(size, 2, generator=generator)
+
+        def __len__(self):
+            return len(self.x)
+
+        def __getitem__(self, index):
+            return {"index": index, "x": self.x[index], "y": self.y[index]}
+
+    rank, world_size = init_process_group()
+    barrier_group = rank0_barrier_group()
+    torch.manual_seed(rank)  # Different initial weights, which DDP must overwrite
+    policy = distributed_policy(_self_test_policy(), rank)
+    optimizer = torch.optim.SGD(policy.get_optim_params(), lr=0.1)
+    initial = {key: value.clone() for key, value in unwrap(policy).state_dict().items()}
+
+    dataset = Dataset(dataset_size)
+    loader_class = sharded_data_loader_class(rank, world_size, lambda: 0)
+    loader = loader_class(dataset, batch_size=batch_size // world_size, shuffle=True, drop_last=False)
+
+    indices = []
+    batches = iter(loader)
+    for _ in range(steps):
+        try:
+            batch = next(batches)
+        except StopIteration:  # A new epoch, as in train.py's `cycle`
+            batches = iter(loader)
+            batch = next(batches)
+        indices.append(batch["index"])
+        optimizer.zero_grad()
+        loss, _ = policy.forward(batch)
+        loss.backward()
+        optimizer.step()
+    dist.barrier(group=barrier_group)
+
+    weights = torch.cat([param.detach().flatten() for param in policy.parameters()])
+    gathered = [torch.zeros_like(weights) for _ in range(world_size)]
+    dist.all_gather(gathered, weights)
+    indices = torch.stack(indices)
+    gathered_indices = [torch.zeros_like(indices) for _ in range(world_size)]
+    dist.all_gather(gathered_indices, indices)
+    dist.destroy_process_group()
+    if rank > 0:
+        return
+
+    reference = _self_test_policy()
+    reference.load_state_dict(initial)
+    optimizer = torch.optim.SGD(reference.get_optim_params(), lr=0.1)
+    for step in range(steps):
+        step_indices = torch.cat([rank_indices[step] for rank_indices in gathered_indices])
+        optimizer.zero_grad()
+        loss, _ = reference.forward({"x": dataset.x[step_indices], "y": dataset.y[step_indices]})
+        loss.backward()
+        optimizer.step()
+    expected = torch.cat([param.detach().flatten() for param in reference.parameters()])
+
+    steps_per_epoch = dataset_size // batch_size
+    first_epoch = torch.cat([rank_indices[:steps_per_epoch].flatten() for rank_indices in gathered_indices])
+    shards_ok = sorted(first_epoch.tolist()) == list(range(dataset_size))
+    rank_spread = max((other - gathered[0]).abs().max().item() for other in gathered)
+    error = (gathered[0] - expected).abs().max().item()
+    print(f"First epoch covers every sample exactly once across ranks: {shards_ok}")
+    print(f"Max weight difference between ranks: {rank_spread:.2e}")
+    print(f"Max difference from single-process training: {error:.2e}")
+    if not shards_ok or rank_spread > 0 or error > 1e-5:
+        raise SystemExit("Self-test failed")
+    print(f"Self-test passed with {world_size} workers")
+
+
+def self_test(num_workers):
+    """Launch the self-test under torchrun with `num_workers` CPU workers."""
+    with tempfile.TemporaryDirectory() as log_dir:
+        cmd = [
+            "torchrun", "--standalone", f"--nproc_per_node={num_workers}", "--log_dir", log_dir,
+            os.path.abspath(__file__), "--self-test-worker",
+        ]
+        return subprocess.run(cmd, env={**os.environ, "CUDA_VISIBLE_DEVICES": ""}).returncode
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--self-test-worker":
+        self_test_worker()
+    elif len(sys.argv) > 1 and sys.argv[1].startswith("--self-test"):
+        parser = argparse.ArgumentParser(description="Check data-parallel training with CPU gloo workers")
+        parser.add_argument("--self-test", type=int, nargs="?", const=2, metavar="NUM_WORKERS")
+        sys.exit(self_test(parser.parse_args().self_test))
+    elif len(sys.argv) > 1:
+        # Launched by torchrun: data_parallel.py lerobot/scripts/train.py [args...]
+        run_train_script(sys.argv[1], sys.argv[2:])
+    else:
+        print(__doc__)
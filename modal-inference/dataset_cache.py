@@ -0,0 +1,86 @@
+"""
+Persistent cache of LeRobot datasets on a Modal volume.
+
+Datasets are downloaded once into the dataset volume, keyed by repo id and
+the commit the requested revision resolves to:
+
+    <base_dir>/<commit>/<repo_id>/          LeRobot dataset (HF_LEROBOT_HOME=<base_dir>/<commit>)
+    <base_dir>/refs/<repo_id>/<revision>.json   revision -> commit
+
+Training runs point HF_LEROBOT_HOME at the cached copy so that LeRobot finds
+the dataset locally instead of downloading it again. Only the download is
+skipped: videos are still decoded by LeRobot while training.
+"""
+
+import json
+import os
+
+DEFAULT_REVISION = "default"
+
+
+def ref_path(base_dir, repo_id, revision=None):
+    """Return the path of the file recording what `revision` of `repo_id` resolved to."""
+    return os.path.join(base_dir, "refs", repo_id, f"{revision or DEFAULT_REVISION}.json")
+
+
+def lerobot_home(base_dir, commit):
+    """Return the HF_LEROBOT_HOME of the datasets cached at `commit`."""
+    return os.path.join(base_dir, commit)
+
+
+def cached_lerobot_home(base_dir, repo_id, revision=None):
+    """
+    Return the HF_LEROBOT_HOME holding a prefetched copy of `repo_id`, or None.
+
+    Args:
+        base_dir (str): Where the dataset volume is mounted
+        repo_id (str): Dataset repo id, e.g. "lerobot/pusht"
+        revision (str): The revision that was prefetched, None for LeRobot's default
+    """
+    path = ref_path(base_dir, repo_id, revision)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        ref = json.load(f)
+    home = lerobot_home(base_dir, ref["commit"])
+    return home if os.path.isdir(os.path.join(home, repo_id)) else None
+
+
+def resolve_revision(repo_id, revision=None):
+    """
+    Resolve a dataset revision to its commit on the Hub.
+
+    None resolves LeRobot's default revision, i.e. the codebase version tag.
+    """
+    from huggingface_hub import HfApi
+    from lerobot.common.datasets.lerobot_dataset import CODEBASE_VERSION
+
+    return HfApi().dataset_info(repo_id, revision=revision or CODEBASE_VERSION).sha
+
+
+def prefetch(base_dir, repo_id, revision=None):
+    """
+    Download `repo_id` into the cache.
+
+    Args:
+        base_dir (str): Where the dataset volume is mounted
+        repo_id (str): Dataset repo id, e.g. "lerobot/pusht"
+        revision (str): Branch, tag or commit, None for LeRobot's default
+
+    Returns:
+        dict: The commit and the dataset root
+    """
+    commit = resolve_revision(repo_id, revision)
+    home = lerobot_home(base_dir, commit)
+    root = os.path.join(home, repo_id)
+
+    from lerobot.common.datasets.lerobot_dataset import LeRobotDataset
+
+    LeRobotDataset(repo_id, root=root, revision=commit)  # Downloads it into `root`
+
+    path = ref_path(base_dir, repo_id, revision)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"repo_id": repo_id, "revision": revision, "commit": commit}, f)
+    return {"commit": commit, "root": root}
+
@@ -1,51 +1,23 @@
 import modal
-import subprocess
 import os
+import shutil
 
-# Define the image with all necessary dependencies for SmolVLA
-image = (
-    modal.Image.debian_slim(python_version="3.10")
-    .apt_install([
-        "git", "curl", "cmake", "build-essential", "python3-dev", 
-        "pkg-config", "libavformat-dev", "libavcodec-dev", 
-        "libavdevice-dev", "libavutil-dev", "libswscale-dev", 
-        "libswresample-dev", "libavfilter-dev", "ffmpeg"
-    ])
-    .pip_install([
-        "torch==2.2.2",
-        "torchvision>=0.15.0",
-        "torchaudio",
-        "numpy>=1.24.0",
-        "opencv-python>=4.8.0",
-        "pillow>=9.0.0",
-        "gymnasium>=0.28.0",
-        "wandb",
-        "tensorboard",
-        "matplotlib",
-        "seaborn",
-        "pandas",
-        "scipy",
-        "scikit-learn",
-        "h5py",
-        "pyyaml",
-        "omegaconf",
-        "hydra-core",
-        "ffmpeg-python",
-        "gym-pusht",
-        "lerobot[smolvla]",  # Specific dependency for SmolVLA
-        "transformers",
-        "accelerate",
-        "num2words",
-        "datasets",
-        "torch-optimizer",
-        "draccus"
-    ])
-    .run_commands([
-        "git clone https://github.com/huggingface/lerobot.git /lerobot",
-        "cd /lerobot && pip install -e ."
-    ])
-    .workdir("/lerobot")
+from batch_tuner import gpu_total_memory_gb, train_probe, tune
+from checkpoint_store import CheckpointStore, deduplicating_commit
+from checkpoint_sync import CheckpointCommitter, latest_checkpoint, resume_train_command
+from data_parallel import launch_command, scaling_efficiency
+from dataset_cache import cached_lerobot_home, prefetch
+from lerobot_image import lerobot_image
+from sweeps import (
+    format_results, halving_summary, load_spec, modal_batch_trainer, plan_sweep, run_sweep,
+    successive_halving, write_results_table
 )
+from training_logs import LogArchiveReader, TrainingLog, TrainingProcess, log_dir_for, run_training, stream_events
+from training_telemetry import write_telemetry
+
+# Define the image with all necessary dependencies for SmolVLA
+# (shared LeRobot image, see lerobot_image.py)
+image = lerobot_image("smolvla")
 
 # Define the Modal App
 app = modal.App("lerobot-smolvla-training-app", image=image)
@@ -53,29 +25,35 @@ app = modal.App("lerobot-smolvla-training-app", image=image)
 # Create a volume for persistent data storage
 volume = modal.Volume.from_name("lerobot-smolvla-training-volume", create_if_missing=True)
 
-@app.function(
-    gpu="L40S",  # Specify GPU type
-    timeout=7200,  # Increased timeout to 2 hours for longer training runs
-    volumes={"/outputs": volume},  # Mount the volume for outputs
-    secrets=[modal.Secret.from_name("wandb-secret")],  # Optional: for W&B logging
-    container_idle_timeout=600  # Idle timeout for the container
-)
-def train_policy(
-    dataset_repo_id: str = "lerobot/svla_so101_pickplace",  # Default dataset for SmolVLA
-    policy_path: str = "lerobot/smolvla_base",  # Default policy config for SmolVLA
-    output_dir: str = "/outputs/train_smolvla_run", # Default output directory
-    batch_size: int = 64,
-    steps: int = 20000
-):
-    import os
+# Datasets prefetched once and shared by every run (see dataset_cache.py)
+dataset_volume = modal.Volume.from_name("lerobot-datasets", create_if_missing=True)
+DATASETS_DIR = "/datasets"
+
+# GPU type of the training functions, also used for multi-GPU containers
+TRAIN_GPU = "L40S"
+
+# Deduplicated checkpoints of every run (see checkpoint_store.py)
+CHECKPOINT_STORE_DIR = "/outputs/checkpoint_store"
+
+def setup_environment(dataset_repo_id):
+    """Prepare the container environment expected by train.py."""
     os.environ["PYTHONUNBUFFERED"] = "1"
     
+    # Use the prefetched copy of the dataset if there is one
+    lerobot_home = cached_lerobot_home(DATASETS_DIR, dataset_repo_id)
+    if lerobot_home:
+        print(f"Using prefetched dataset in {lerobot_home}")
+        os.environ["HF_LEROBOT_HOME"] = lerobot_home
+    
     # Ensure Hugging Face token is available
     hf_token = os.environ.get("HUGGINGFACE_TOKEN")
     if not hf_token:
         raise EnvironmentError("HUGGINGFACE_TOKEN environment variable is not set. Please set it in your Modal environment secrets.")
     os.environ["HF_TOKEN"] = hf_token
-    
+
+
+def build_train_command(dataset_repo_id, policy_path, output_dir, batch_size, steps, save_freq=None, num_workers=None):
+    """Build the train.py command line for a SmolVLA fine-tune."""
     cmd = [
         "python", "lerobot/scripts/train.py",
         f"--dataset.repo_id={dataset_repo_id}",
@@ -86,27 +64,512 @@ def train_policy(
         "--policy.device=cuda",  # Ensure training on GPU
         "--wandb.enable=true"    # Enable W&B logging (requires wandb-secret)
     ]
+    if save_freq is not None:
+        cmd.append(f"--save_freq={save_freq}")
+    if num_workers is not None:
+        cmd.append(f"--num_workers={num_workers}")
+    return cmd
+
+
+def checkpoint_commit(output_dir, dedup_checkpoints):
+    """
+    Return the function committing the volume during and after training.
+
+    With `dedup_checkpoints`, complete checkpoints are first moved into the
+    shared checkpoint store, keeping only the newest one in full for resuming.
+    """
+    if not dedup_checkpoints:
+        return volume.commit
+    return deduplicating_commit(CheckpointStore(CHECKPOINT_STORE_DIR), output_dir, volume.commit)
+
+
+@app.function(
+    gpu=TRAIN_GPU,  # Specify GPU type
+    timeout=7200,  # Increased timeout to 2 hours for longer training runs
+    volumes={"/outputs": volume, DATASETS_DIR: dataset_volume},  # Mount the output and dataset volumes
+    secrets=[modal.Secret.from_name("wandb-secret")],  # Optional: for W&B logging
+    container_idle_timeout=600  # Idle timeout for the container
+)
+def train_policy(
+    dataset_repo_id: str = "lerobot/svla_so101_pickplace",  # Default dataset for SmolVLA
+    policy_path: str = "lerobot/smolvla_base",  # Default policy config for SmolVLA
+    output_dir: str = "/outputs/train_smolvla_run", # Default output directory
+    batch_size: int = 64,
+    steps: int = 20000,
+    num_gpus: int = 1,
+    num_workers: int = None,
+    auto_tune: bool = False,
+    dedup_checkpoints: bool = False
+):
+    # With num_gpus > 1, train.py runs data-parallel (see data_parallel.py):
+    # `batch_size` stays the global batch size, split across the GPUs. This
+    # function only has one GPU; call it through `gpu_trainer(num_gpus)`.
+    setup_environment(dataset_repo_id)
+    
+    # With auto_tune, short probe runs on one GPU pick the batch size and
+    # data loader workers first (see batch_tuner.py)
+    tuning = None
+    if auto_tune:
+        probe_cmd = build_train_command(dataset_repo_id, policy_path, output_dir, batch_size, steps)
+        tuning = tune(train_probe(probe_cmd), gpu_mem_gb=gpu_total_memory_gb())
+        batch_size = tuning["batch_size"] * num_gpus
+        num_workers = tuning["num_workers"]
+        print(f"Tuned batch_size={batch_size} num_workers={num_workers}")
+    
+    cmd = build_train_command(dataset_repo_id, policy_path, output_dir, batch_size, steps, num_workers=num_workers)
+    cmd = launch_command(cmd, num_gpus)
     
     print(f"Running command: {' '.join(cmd)}")
     
-    # Execute the training script
-    result = subprocess.run(cmd, capture_output=True, text=True, cwd="/lerobot")
-   
-    print("STDOUT:", result.stdout)
-    if result.stderr:
-        print("STDERR:", result.stderr)
+    # Execute the training script, printing its output live and spooling
+    # the full log to a compressed archive on the volume
+    # Checkpoints are committed in the background as soon as they are written
+    commit = checkpoint_commit(output_dir, dedup_checkpoints)
+    with CheckpointCommitter(output_dir, commit) as committer:
+        result = run_training(cmd, output_dir)
         
     # Commit volume changes to persist the output
-    volume.commit()
+    commit()
     
     return {
-        "return_code": result.returncode,
+        "return_code": result["return_code"],
+        "output_dir": output_dir,
+        "success": result["return_code"] == 0,
+        "wall_time_s": result["wall_time_s"],
+        "final_loss": result["final_loss"],
+        "num_gpus": num_gpus,
+        "batch_size": batch_size,
+        "num_workers": num_workers, # None: train.py's default
+        "tuning": tuning, # Probe runs of auto_tune
+        "steps_per_s": result["steps_per_s"], # Recent training throughput
+        "stdout_tail": result["stdout_tail"], # Last 1000 chars of stdout
+        "stderr_tail": result["stderr_tail"], # Last 1000 chars of stderr
+        "log_path": result["log_path"], # Full compressed log on the volume
+        "telemetry": result["telemetry"], # Throughput summary and time series
+        "committed_checkpoints": committer.committed, # Steps committed during training
+    }
+
+
+@app.cls(
+    gpu=TRAIN_GPU,  # Overridden with the number of GPUs by gpu_trainer
+    timeout=7200,
+    volumes={"/outputs": volume, DATASETS_DIR: dataset_volume},
+    secrets=[modal.Secret.from_name("wandb-secret")],
+    container_idle_timeout=600
+)
+class MultiGPUTrainer:
+    @modal.method()
+    def train(self, **kwargs) -> dict:
+        """Run `train_policy` in this container, which has `num_gpus` GPUs."""
+        return train_policy.local(**kwargs)
+
+
+def gpu_trainer(num_gpus):
+    """Return the remote function running `train_policy` on a container with `num_gpus` GPUs."""
+    if num_gpus == 1:
+        return train_policy
+    return MultiGPUTrainer.with_options(gpu=f"{TRAIN_GPU}:{num_gpus}")().train
+
+
+# Container timeout of a resumable call, and the time left at its end to
+# commit the volume and spawn the next call
+RESUMABLE_TIMEOUT_S = 7200
+RESUME_MARGIN_S = 600
+
+
+@app.function(
+    gpu=TRAIN_GPU,
+    timeout=RESUMABLE_TIMEOUT_S,
+    volumes={"/outputs": volume, DATASETS_DIR: dataset_volume},
+    secrets=[modal.Secret.from_name("wandb-secret")],
+    container_idle_timeout=600
+)
+def train_policy_resumable(
+    dataset_repo_id: str = "lerobot/svla_so101_pickplace",
+    policy_path: str = "lerobot/smolvla_base",
+    output_dir: str = "/outputs/train_smolvla_run",
+    batch_size: int = 64,
+    steps: int = 20000,
+    save_freq: int = 1000,
+    max_calls: int = 10,
+    call_index: int = 0,
+    dedup_checkpoints: bool = False
+):
+    """
+    Train for `steps` steps across as many calls as needed.
+
+    Each call resumes train.py from the newest checkpoint in `output_dir`
+    (or starts from scratch if there is none), stops it shortly before the
+    container timeout and then spawns the next call. Only the steps since
+    the last checkpoint are trained again, so `save_freq` bounds the work
+    lost per call. The chain stops once `steps` is reached, train.py fails,
+    or after `max_calls` calls.
+
+    Returns:
+        dict: Same keys as `train_policy`, plus the checkpoint `step`
+        reached and `next_call_id` if a follow-up call was spawned.
+    """
+    setup_environment(dataset_repo_id)
+    volume.reload()
+    
+    checkpoint = latest_checkpoint(output_dir)
+    if checkpoint is not None and checkpoint.step >= steps:
+        return {"return_code": 0, "output_dir": output_dir, "success": True, "step": checkpoint.step}
+    
+    if checkpoint is not None:
+        print(f"Resuming from checkpoint {checkpoint.path}")
+        cmd = resume_train_command(checkpoint, steps)
+    else:
+        if call_index > 0 and os.path.exists(output_dir):
+            # The previous call stopped before its first checkpoint: nothing to
+            # resume, and train.py refuses to start in an existing output_dir
+            shutil.rmtree(output_dir)
+        cmd = build_train_command(dataset_repo_id, policy_path, output_dir, batch_size, steps, save_freq)
+    
+    print(f"Running command: {' '.join(cmd)}")
+    
+    commit = checkpoint_commit(output_dir, dedup_checkpoints)
+    with CheckpointCommitter(output_dir, commit) as committer:
+        result = run_training(cmd, output_dir, time_limit=RESUMABLE_TIMEOUT_S - RESUME_MARGIN_S)
+    commit()
+    
+    checkpoint = latest_checkpoint(output_dir)
+    step = checkpoint.step if checkpoint is not None else 0
+    response = {
+        "return_code": result["return_code"],
+        "output_dir": output_dir,
+        "success": result["return_code"] == 0 and step >= steps,
+        "step": step,
+        "wall_time_s": result["wall_time_s"],
+        "final_loss": result["final_loss"],
+        "recent_loss": result["recent_loss"],
+        "stdout_tail": result["stdout_tail"],
+        "stderr_tail": result["stderr_tail"],
+        "log_path": result["log_path"],
+        "telemetry": result["telemetry"],
+        "committed_checkpoints": committer.committed,
+    }
+    
+    if result["timed_out"] and step < steps and call_index + 1 < max_calls:
+        next_call = train_policy_resumable.spawn(
+            dataset_repo_id=dataset_repo_id,
+            policy_path=policy_path,
+            output_dir=output_dir,
+            batch_size=batch_size,
+            steps=steps,
+            save_freq=save_freq,
+            max_calls=max_calls,
+            call_index=call_index + 1,
+            dedup_checkpoints=dedup_checkpoints
+        )
+        response["next_call_id"] = next_call.object_id
+    
+    return response
+
+
+@app.function(
+    gpu=TRAIN_GPU,
+    timeout=7200,
+    volumes={"/outputs": volume, DATASETS_DIR: dataset_volume},
+    secrets=[modal.Secret.from_name("wandb-secret")],
+    container_idle_timeout=600
+)
+def train_policy_stream(
+    dataset_repo_id: str = "lerobot/svla_so101_pickplace",
+    policy_path: str = "lerobot/smolvla_base",
+    output_dir: str = "/outputs/train_smolvla_run",
+    batch_size: int = 64,
+    steps: int = 20000
+):
+    """
+    Same as `train_policy`, but yields train.py output as it is written.
+
+    Call it with `train_policy_stream.remote_gen(...)`. Each event is a dict
+    with the output line and its parsed step metrics; the last event holds
+    the return code. Nothing is buffered, so memory stays flat.
+    """
+    setup_environment(dataset_repo_id)
+    cmd = build_train_command(dataset_repo_id, policy_path, output_dir, batch_size, steps)
+    
+    process = TrainingProcess(cmd, cwd="/lerobot")
+    with CheckpointCommitter(output_dir, volume.commit), TrainingLog(log_dir_for(output_dir)) as log:
+        yield from stream_events(process, log)
+    write_telemetry(log.telemetry, output_dir)
+    
+    # Commit volume changes to persist the output
+    volume.commit()
+    
+    yield {
+        "return_code": process.returncode,
         "output_dir": output_dir,
-        "success": result.returncode == 0,
-        "stdout_tail": result.stdout[-1000:], # Last 1000 chars of stdout
-        "stderr_tail": result.stderr[-1000:], # Last 1000 chars of stderr
+        "success": process.returncode == 0,
+        "telemetry": log.telemetry.to_dict()
     }
 
+
+@app.local_entrypoint()
+def stream(
+    dataset_repo_id: str = "lerobot/svla_so101_pickplace",
+    output_dir: str = "/outputs/train_smolvla_run",
+    steps: int = 20000
+):
+    # Print train.py output live: `modal run deploy_smolvla_modal_app.py::stream`
+    for event in train_policy_stream.remote_gen(
+        dataset_repo_id=dataset_repo_id,
+        output_dir=output_dir,
+        steps=steps
+    ):
+        if "return_code" in event:
+            print(f"Training finished with return code {event['return_code']}")
+        else:
+            print(event["line"])
+
+
+@app.local_entrypoint()
+def resume(
+    dataset_repo_id: str = "lerobot/svla_so101_pickplace",
+    output_dir: str = "/outputs/train_smolvla_run",
+    steps: int = 20000,
+    dedup_checkpoints: bool = False
+):
+    # Train across chained calls, following the chain until it ends:
+    # `modal run deploy_smolvla_modal_app.py::resume --steps 50000`
+    result = train_policy_resumable.remote(
+        dataset_repo_id=dataset_repo_id,
+        output_dir=output_dir,
+        steps=steps,
+        dedup_checkpoints=dedup_checkpoints
+    )
+    while "next_call_id" in result:
+        print(f"Reached step {result['step']}, continuing in call {result['next_call_id']}")
+        result = modal.FunctionCall.from_id(result["next_call_id"]).get()
+    print(f"Training finished at step {result['step']}. Success: {result['success']}")
+
+
+@app.local_entrypoint()
+def multi_gpu(
+    dataset_repo_id: str = "lerobot/svla_so101_pickplace",
+    output_dir: str = "/outputs/train_smolvla_run",
+    batch_size: int = 64,
+    steps: int = 20000,
+    num_gpus: int = 4
+):
+    # Data-parallel training on one container with `num_gpus` GPUs:
+    # `modal run deploy_smolvla_modal_app.py::multi_gpu --num-gpus 4`
+    result = gpu_trainer(num_gpus).remote(
+        dataset_repo_id=dataset_repo_id,
+        output_dir=output_dir,
+        batch_size=batch_size,
+        steps=steps,
+        num_gpus=num_gpus
+    )
+    print(f"Training finished. Success: {result['success']}, {result['steps_per_s']} steps/s on {num_gpus} GPUs")
+
+
+@app.local_entrypoint()
+def scaling(
+    dataset_repo_id: str = "lerobot/svla_so101_pickplace",
+    batch_size: int = 64,
+    steps: int = 500,
+    gpu_counts: str = "1,2,4",
+    name: str = "smolvla_scaling"
+):
+    # Train the same short run on each number of GPUs in parallel and report
+    # the scaling efficiency: `modal run deploy_smolvla_modal_app.py::scaling`
+    calls = {}
+    for num_gpus in [int(count) for count in gpu_counts.split(",")]:
+        calls[num_gpus] = gpu_trainer(num_gpus).spawn(
+            dataset_repo_id=dataset_repo_id,
+            output_dir=f"/outputs/scaling/{name}/gpus_{num_gpus}",
+            batch_size=batch_size,
+            steps=steps,
+            num_gpus=num_gpus
+        )
+    results = {num_gpus: call.get()["steps_per_s"] for num_gpus, call in calls.items()}
+    failed = [num_gpus for num_gpus, steps_per_s in results.items() if steps_per_s is None]
+    if failed:
+        raise RuntimeError(f"No throughput logged by the runs on {failed} GPUs")
+
+    print(f"{'GPUs':>4} {'steps/s':>8} {'samples/s':>10} {'per GPU':>8} {'efficiency':>10}")
+    for row in scaling_efficiency(results, batch_size):
+        print(f"{row['num_gpus']:>4} {row['steps_per_s']:>8.2f} {row['samples_per_s']:>10.1f} "
+              f"{row['samples_per_s_per_gpu']:>8.1f} {row['efficiency']:>10.0%}")
+
+
+@app.function(volumes={"/outputs": volume})
+def read_training_log(
+    output_dir: str = "/outputs/train_smolvla_run",
+    last: int = 100,
+    pattern: str = None,
+    around_step: int = None,
+    context: int = 20
+):
+    """
+    Fetch part of a run's compressed log without downloading all of it.
+
+    Returns the lines around `around_step` if given, else the lines matching
+    the regex `pattern` (at most 1000) if given, else the last `last` lines.
+    """
+    volume.reload()
+    reader = LogArchiveReader(log_dir_for(output_dir))
+    if around_step is not None:
+        return reader.around_step(around_step, context=context)
+    if pattern:
+        return [line for _, line in reader.grep(pattern, max_matches=1000)]
+    return reader.tail(last)
+
+
+@app.local_entrypoint()
+def logs(
+    output_dir: str = "/outputs/train_smolvla_run",
+    last: int = 100,
+    pattern: str = None,
+    around_step: int = None
+):
+    # e.g. `modal run deploy_smolvla_modal_app.py::logs --pattern loss`
+    for line in read_training_log.remote(output_dir, last, pattern, around_step):
+        print(line)
+
+
+@app.function(volumes={"/outputs": volume}, timeout=3600)
+def manage_checkpoint_store(
+    run: str = None,
+    keep_last: int = None,
+    restore_step: int = None,
+    restore_dir: str = None
+):
+    """
+    Prune, garbage-collect or restore checkpoints of the checkpoint store.
+
+    With `keep_last`, only the `keep_last` newest checkpoints of `run` are
+    kept and the chunks no checkpoint references any more are deleted. With
+    `restore_step`, that checkpoint of `run` is rebuilt in full in
+    `restore_dir` (default `/outputs/restored/<run>/<step>`), e.g. to serve
+    it. Returns the store statistics.
+    """
+    volume.reload()
+    store = CheckpointStore(CHECKPOINT_STORE_DIR)
+    result = {}
+    if keep_last is not None:
+        result["pruned_steps"] = store.prune(run, keep_last)
+        result["gc"] = store.collect_garbage()
+    if restore_step is not None:
+        restore_dir = restore_dir or f"/outputs/restored/{run}/{restore_step:06d}"
+        result["restored_to"] = store.restore(run, restore_step, restore_dir)
+    volume.commit()
+    result["stats"] = store.stats()
+    return result
+
+
+@app.local_entrypoint()
+def checkpoints(
+    run: str = "outputs/train_smolvla_run",
+    keep_last: int = None,
+    restore_step: int = None
+):
+    # e.g. `modal run deploy_smolvla_modal_app.py::checkpoints --keep-last 3`
+    # Download a checkpoint, fetching only chunks not cached locally yet:
+    # `python checkpoint_store.py download lerobot-smolvla-training-volume outputs/train_smolvla_run 20000 ./checkpoint`
+    result = manage_checkpoint_store.remote(run=run, keep_last=keep_last, restore_step=restore_step)
+    for key, value in result.items():
+        print(f"{key}: {value}")
+
+
+@app.function(volumes={"/outputs": volume})
+def save_sweep_results(sweep_dir: str, rows: list):
+    """Write a sweep's results table to the volume."""
+    paths = write_results_table(rows, sweep_dir)
+    volume.commit()
+    return paths
+
+
+@app.local_entrypoint()
+def sweep(
+    spec: str = '{"batch_size": [32, 64], "steps": 2000}',
+    mode: str = "grid",
+    num_samples: int = 8,
+    seed: int = 0,
+    name: str = "smolvla_sweep"
+):
+    # Run every configuration of a grid or random search in parallel, e.g.
+    # `modal run deploy_smolvla_modal_app.py::sweep --spec '{"batch_size": [32, 64], "steps": [2000, 5000]}'`
+    # `spec` is a JSON object (or file) mapping train_policy arguments to values
+    sweep_dir = f"/outputs/sweeps/{name}"
+    configs = plan_sweep(load_spec(spec), sweep_dir, mode, num_samples, seed)
+    print(f"Launching {len(configs)} training runs in parallel...")
+    
+    rows = run_sweep(train_policy, configs)
+    paths = save_sweep_results.remote(sweep_dir, rows)
+    
+    print(format_results(rows))
+    print(f"Results written to {', '.join(paths)}")
+
+
+@app.local_entrypoint()
+def halving(
+    spec: str = '{"batch_size": [16, 32, 48, 64, 96, 128]}',
+    mode: str = "grid",
+    num_samples: int = 9,
+    seed: int = 0,
+    min_steps: int = 1000,
+    max_steps: int = 20000,
+    eta: int = 3,
+    name: str = "smolvla_halving"
+):
+    # Successive halving: train every configuration for `min_steps`, keep the
+    # best 1/eta by recent loss and resume them with eta times more steps,
+    # until the survivors reach `max_steps`
+    # `modal run deploy_smolvla_modal_app.py::halving --spec '{"batch_size": [16, 32, 64]}'`
+    sweep_dir = f"/outputs/sweeps/{name}"
+    configs = plan_sweep(load_spec(spec), sweep_dir, mode, num_samples, seed)
+    for config in configs:
+        config.setdefault("save_freq", min_steps)
+    print(f"Starting successive halving over {len(configs)} configurations...")
+    
+    rows = successive_halving(configs, modal_batch_trainer(train_policy_resumable), min_steps, max_steps, eta)
+    paths = save_sweep_results.remote(sweep_dir, rows)
+    
+    summary = halving_summary(rows, max_steps)
+    print(f"Best run: {summary['best_run']} (loss {summary['best_metric']})")
+    print(f"Trained {summary['total_steps']} steps instead of {summary['full_sweep_steps']} "
+          f"({summary['saved_fraction']:.0%} saved)")
+    print(f"Results written to {', '.join(paths)}")
+
+
+@app.function(
+    cpu=2,
+    timeout=3600,
+    volumes={DATASETS_DIR: dataset_volume},
+    secrets=[modal.Secret.from_name("wandb-secret")]
+)
+def prefetch_dataset(
+    dataset_repo_id: str = "lerobot/svla_so101_pickplace",
+    revision: str = None
+):
+    """
+    Download a dataset once into the dataset volume, keyed by repo id and
+    the commit `revision` resolves to. Later train_policy runs use it
+    through HF_LEROBOT_HOME instead of downloading it again.
+    """
+    hf_token = os.environ.get("HUGGINGFACE_TOKEN")
+    if hf_token:
+        os.environ["HF_TOKEN"] = hf_token
+    
+    result = prefetch(DATASETS_DIR, dataset_repo_id, revision)
+    dataset_volume.commit()
+    return result
+
+
+@app.local_entrypoint()
+def cache_dataset(
+    dataset_repo_id: str = "lerobot/svla_so101_pickplace",
+    revision: str = None
+):
+    # `modal run deploy_smolvla_modal_app.py::cache_dataset --dataset-repo-id lerobot/svla_so101_pickplace`
+    result = prefetch_dataset.remote(dataset_repo_id, revision)
+    print(f"Dataset cached at {result['root']} (commit {result['commit']})")
+
+
 # @app.local_entrypoint()
 # def main():
 #     # Example: Launch training for SmolVLA on a specific dataset
@@ -132,4 +595,4 @@ def train_policy(
 # 3. Ensure WANDB_API_KEY is set as a Modal secret named "wandb-secret" (e.g., modal secret create wandb-secret WANDB_API_KEY=your_wandb_key).
 # 4. Run `modal deploy deploy_smolvla_modal_app.py`.
 # To run the training after deployment (or locally for testing):
-# `modal run deploy_smolvla_modal_app.py`
+# `modal run deploy_smolvla_modal_app.py::stream`
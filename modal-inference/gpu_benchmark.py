@@ -0,0 +1,302 @@
+"""
+Cost and throughput of training each policy on each Modal GPU type.
+
+A benchmark cell is a (policy, GPU type, batch size) combination. Each cell
+runs a short train.py run with a fixed number of steps; its throughput
+comes from the run's telemetry and its peak GPU memory from nvidia-smi. The
+report ranks the GPU types of each (policy, batch size) by cost per 1000
+steps, using the hourly GPU prices in `GPU_PRICES_PER_HOUR`.
+
+The orchestration and the report do not depend on Modal. To try them with
+a simulated trainer:
+    python gpu_benchmark.py --stub
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import math
+import os
+import statistics
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Modal list prices in USD per GPU-hour when this was written; pass
+# `prices` to use current ones
+GPU_PRICES_PER_HOUR = {
+    "T4": 0.59,
+    "L4": 0.80,
+    "A10G": 1.10,
+    "L40S": 1.95,
+    "A100": 2.10,
+    "A100-80GB": 2.50,
+    "H100": 3.95,
+}
+
+# Memory of each GPU type, in GB
+GPU_MEMORY_GB = {
+    "T4": 16,
+    "L4": 24,
+    "A10G": 24,
+    "L40S": 48,
+    "A100": 40,
+    "A100-80GB": 80,
+    "H100": 80,
+}
+
+# train.py arguments of each benchmarked policy
+POLICIES = {
+    "act": {
+        "dataset_repo_id": "lerobot/pusht",
+        "args": ["--policy.type=act", "--env.type=pusht"],
+    },
+    "diffusion": {
+        "dataset_repo_id": "lerobot/pusht",
+        "args": ["--policy.type=diffusion", "--env.type=pusht"],
+    },
+    "smolvla": {
+        "dataset_repo_id": "lerobot/svla_so101_pickplace",
+        "args": ["--policy.path=lerobot/smolvla_base"],
+    },
+}
+
+REPORT_COLUMNS = [
+    "rank", "policy", "batch_size", "gpu", "steps_per_s", "samples_per_s", "peak_gpu_mem_gb",
+    "cost_per_1k_steps", "cost_per_1m_samples", "price_per_hour", "steps", "wall_time_s", "error",
+]
+
+
+def benchmark_cells(policies, gpus, batch_sizes):
+    """Return every (policy, GPU type, batch size) cell."""
+    return [
+        {"policy": policy, "gpu": gpu, "batch_size": batch_size}
+        for policy, gpu, batch_size in itertools.product(policies, gpus, batch_sizes)
+    ]
+
+
+def benchmark_command(policy, batch_size, steps, output_dir, log_freq=10):
+    """Build the train.py command line of a benchmark run, without checkpoints, evaluation or W&B."""
+    return [
+        "python", "lerobot/scripts/train.py",
+        f"--dataset.repo_id={POLICIES[policy]['dataset_repo_id']}",
+        *POLICIES[policy]["args"],
+        f"--batch_size={batch_size}",
+        f"--steps={steps}",
+        f"--log_freq={log_freq}",
+        f"--output_dir={output_dir}",
+        "--save_checkpoint=false",
+        "--eval_freq=0",
+        "--policy.device=cuda",
+        "--wandb.enable=false",
+    ]
+
+
+class GpuMemorySampler:
+    """
+    Sample the memory used on the GPUs with nvidia-smi in a background thread.
+
+    Use as a context manager; `peak_gb` then holds the highest total seen.
+    """
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self.peak_gb = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def sample(self):
+        """Return the memory currently used on all GPUs, in GB, or None without nvidia-smi."""
+        try:
+            output = subprocess.run(
+                ["nvidia-smi", "--query-gpu=memory.used", "--format=csv,noheader,nounits"],
+                capture_output=True, text=True, check=True
+            ).stdout
+        except (OSError, subprocess.CalledProcessError):
+            return None
+        return sum(float(value) for value in output.split()) / 1024  # MiB to GB
+
+    def _run(self):
+        while not self._stop.is_set():
+            used = self.sample()
+            if used is not None:
+                self.peak_gb = max(used, self.peak_gb or 0.0)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def steady_steps_per_s(telemetry):
+    """
+    Return the median steps/s of a run's telemetry, leaving out the first
+    logged interval, which includes warm-up.
+    """
+    values = [point["steps_per_s"] for point in telemetry["series"][1:] if point["steps_per_s"]]
+    if not values:
+        return telemetry["summary"]["mean_steps_per_s"]
+    return statistics.median(values)
+
+
+def cell_result(cell, result, prices=None):
+    """
+    Build the report row of a cell from its trainer result or exception.
+
+    The trainer result holds `steps_per_s`, `peak_gpu_mem_gb`, `steps` and
+    `wall_time_s`; failed cells (e.g. out of memory) keep their error.
+    """
+    prices = prices or GPU_PRICES_PER_HOUR
+    price = prices.get(cell["gpu"])
+    row = {**cell, "price_per_hour": price}
+    if isinstance(result, BaseException) or result.get("error") or not result.get("steps_per_s"):
+        error = repr(result) if isinstance(result, BaseException) else result.get("error") or "no steps logged"
+        return {**row, "error": error}
+
+    steps_per_s = result["steps_per_s"]
+    row.update(
+        steps_per_s=steps_per_s,
+        samples_per_s=steps_per_s * cell["batch_size"],
+        peak_gpu_mem_gb=result.get("peak_gpu_mem_gb"),
+        steps=result.get("steps"),
+        wall_time_s=result.get("wall_time_s"),
+        error=None,
+    )
+    if price is not None:
+        cost_per_s = price / 3600
+        row["cost_per_1k_steps"] = cost_per_s / steps_per_s * 1000
+        row["cost_per_1m_samples"] = cost_per_s / row["samples_per_s"] * 1e6
+    return row
+
+
+def run_benchmark(cells, train_cell, max_parallel=None, prices=None):
+    """
+    Run every cell in parallel and return their report rows.
+
+    Args:
+        cells (list): Cells from `benchmark_cells`
+        train_cell (callable): Runs one cell and returns its trainer
+            result (see `cell_result`), e.g. a remote Modal call. Called
+            from worker threads; exceptions are recorded, not raised.
+        max_parallel (int): Cells running at once, all of them by default
+        prices (dict): GPU prices per hour, defaults to `GPU_PRICES_PER_HOUR`
+    """
+    def run(cell):
+        try:
+            return train_cell(cell)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=max_parallel or len(cells)) as executor:
+        results = list(executor.map(run, cells))
+    return [cell_result(cell, result, prices) for cell, result in zip(cells, results)]
+
+
+def rank_rows(rows):
+    """
+    Rank the GPU types of each (policy, batch size) by cost per 1000 steps.
+
+    Failed cells and cells without a price come last, without a rank.
+    """
+    ranked = []
+    groups = sorted({(row["policy"], row["batch_size"]) for row in rows})
+    for policy, batch_size in groups:
+        group = [row for row in rows if row["policy"] == policy and row["batch_size"] == batch_size]
+        group.sort(key=lambda row: row.get("cost_per_1k_steps") or math.inf)
+        rank = 0
+        for row in group:
+            if row.get("cost_per_1k_steps") is not None:
+                rank += 1
+                ranked.append({**row, "rank": rank})
+            else:
+                ranked.append({**row, "rank": None})
+    return ranked
+
+
+def format_report(rows):
+    """Format ranked rows as a table, one block per (policy, batch size)."""
+    lines = []
+    previous = None
+    for row in rows:
+        if (row["policy"], row["batch_size"]) != previous:
+            previous = (row["policy"], row["batch_size"])
+            lines.append(f"\n{row['policy']}, batch size {row['batch_size']}")
+            lines.append(f"{'rank':>4} {'gpu':<10} {'steps/s':>8} {'samples/s':>10} {'mem GB':>7} {'$/1k steps':>11}")
+        if row.get("error"):
+            lines.append(f"{'-':>4} {row['gpu']:<10} failed: {row['error'][:80]}")
+            continue
+        memory = f"{row['peak_gpu_mem_gb']:.1f}" if row.get("peak_gpu_mem_gb") is not None else "-"
+        cost = f"{row['cost_per_1k_steps']:.4f}" if row.get("cost_per_1k_steps") is not None else "-"
+        rank = row["rank"] if row["rank"] is not None else "-"
+        lines.append(
+            f"{rank:>4} {row['gpu']:<10} {row['steps_per_s']:>8.2f} {row['samples_per_s']:>10.1f} "
+            f"{memory:>7} {cost:>11}"
+        )
+    return "\n".join(lines).lstrip("\n")
+
+
+def write_report(rows, output):
+    """
+    Write ranked rows to `output` (.json or .csv).
+
+    Returns:
+        str: `output`
+    """
+    if output.endswith(".csv"):
+        with open(output, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=REPORT_COLUMNS, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        with open(output, "w") as f:
+            json.dump(rows, f, indent=2)
+    return output
+
+
+# Relative speed of each GPU type and memory per sample of each policy,
+# rough figures for the stub trainer only
+STUB_GPU_SPEED = {"T4": 1.0, "L4": 1.6, "A10G": 1.9, "L40S": 4.0, "A100": 4.5, "A100-80GB": 4.7, "H100": 8.0}
+STUB_POLICY_COST = {
+    "act": {"step_s": 0.004, "base_gb": 1.5, "sample_gb": 0.05},
+    "diffusion": {"step_s": 0.006, "base_gb": 2.0, "sample_gb": 0.08},
+    "smolvla": {"step_s": 0.03, "base_gb": 8.0, "sample_gb": 0.35},
+}
+
+
+def stub_trainer(cell, steps=200):
+    """
+    Simulated cell run: throughput scales with the GPU's speed and the
+    batch size, and cells that do not fit in GPU memory fail.
+    """
+    cost = STUB_POLICY_COST[cell["policy"]]
+    memory_gb = cost["base_gb"] + cost["sample_gb"] * cell["batch_size"]
+    if memory_gb > GPU_MEMORY_GB[cell["gpu"]]:
+        raise RuntimeError(f"CUDA out of memory ({memory_gb:.1f} GB needed)")
+    # Fixed overhead per step plus a cost per sample
+    step_s = (0.02 + cost["step_s"] * cell["batch_size"]) / STUB_GPU_SPEED[cell["gpu"]]
+    return {"steps_per_s": 1 / step_s, "peak_gpu_mem_gb": memory_gb, "steps": steps, "wall_time_s": steps * step_s}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rank GPU types by training cost with a simulated trainer")
+    parser.add_argument("--stub", action="store_true", help="Use the simulated trainer (required)")
+    parser.add_argument("--policies", type=str, default="act,diffusion,smolvla")
+    parser.add_argument("--gpus", type=str, default=",".join(GPU_PRICES_PER_HOUR))
+    parser.add_argument("--batch-sizes", type=str, default="8,64")
+    parser.add_argument("--output", type=str, help="Write the report to this .json or .csv file")
+    args = parser.parse_args()
+    if not args.stub:
+        parser.error("run the real benchmark with `modal run benchmark_gpu_types.py`, or pass --stub")
+
+    cells = benchmark_cells(
+        args.policies.split(","), args.gpus.split(","), [int(size) for size in args.batch_sizes.split(",")]
+    )
+    rows = rank_rows(run_benchmark(cells, stub_trainer))
+    print(format_report(rows))
+    if args.output:
+        print(f"Report written to {write_report(rows, args.output)}")
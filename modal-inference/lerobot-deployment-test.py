@@ -1,73 +1,47 @@
 import modal
-import subprocess
 import os
 
-# Define the image with all necessary dependencies
+from batch_tuner import gpu_total_memory_gb, train_probe, tune
+from checkpoint_sync import CheckpointCommitter
+from dataset_cache import cached_lerobot_home
+from lerobot_image import lerobot_image
+from training_logs import TrainingLog, TrainingProcess, log_dir_for, run_training, stream_events
+from training_telemetry import write_telemetry
 
-# Complete LeRobot image with all dependencies
-image = (
-    modal.Image.debian_slim(python_version="3.10")
-    .apt_install([
-        "git", "curl", "cmake", "build-essential", "python3-dev", 
-        "pkg-config", "libavformat-dev", "libavcodec-dev", 
-        "libavdevice-dev", "libavutil-dev", "libswscale-dev", 
-        "libswresample-dev", "libavfilter-dev", "ffmpeg"
-    ])
-    .pip_install([
-        "torch>=2.0.0,<2.4.0",
-        "torchvision>=0.15.0",
-        "torchaudio",
-        "numpy>=1.24.0",
-        "opencv-python>=4.8.0",
-        "pillow>=9.0.0",
-        "gymnasium>=0.28.0",
-        "wandb",
-        "tensorboard",
-        "matplotlib",
-        "seaborn",
-        "pandas",
-        "scipy",
-        "scikit-learn",
-        "h5py",
-        "pyyaml",
-        "omegaconf",
-        "hydra-core",
-        "ffmpeg-python",
-        "gym-pusht",
-        "lerobot[pusht]"  
-    ])
-    .run_commands([
-        "git clone https://github.com/huggingface/lerobot.git /lerobot",
-        "cd /lerobot && pip install -e ."
-    ])
-    .workdir("/lerobot")
-)
+# Define the image with all necessary dependencies
+# (shared LeRobot image, see lerobot_image.py)
+image = lerobot_image("pusht")
 
 
 app = modal.App("lerobot-training", image=image)
 
+# The app has several functions, so name the one to run:
+# `modal run lerobot-deployment-test.py::train_policy --auto-tune`
+# `modal run lerobot-deployment-test.py::train_policy_stream`
+
 # Create a volume for persistent data storage
 volume = modal.Volume.from_name("lerobot-outputs", create_if_missing=True)
 
-@app.function(
-    gpu="A100",
-    timeout=7200,  # 2 hours
-    volumes={"/outputs": volume},
-    secrets=[modal.Secret.from_name("wandb-secret")],  # Optional: for W&B logging
-    container_idle_timeout=600
-)
-def train_policy(
-    dataset_repo_id: str = "lerobot/pusht",
-    policy_type: str = "act",
-    env_type: str = "pusht",
-    output_dir: str = "/outputs/train_run"
-):
-    import os
+# Datasets prefetched once and shared by every run (see dataset_cache.py)
+dataset_volume = modal.Volume.from_name("lerobot-datasets", create_if_missing=True)
+DATASETS_DIR = "/datasets"
+
+def setup_environment(dataset_repo_id):
+    """Prepare the container environment expected by train.py."""
     os.environ["PYTHONUNBUFFERED"] = "1"
+    
+    # Use the prefetched copy of the dataset if there is one
+    lerobot_home = cached_lerobot_home(DATASETS_DIR, dataset_repo_id)
+    if lerobot_home:
+        print(f"Using prefetched dataset in {lerobot_home}")
+        os.environ["HF_LEROBOT_HOME"] = lerobot_home
     hf_token = os.environ.get("HUGGINGFACE_TOKEN")
     if hf_token:
         os.environ["HF_TOKEN"] = hf_token
-    
+
+
+def build_train_command(dataset_repo_id, policy_type, env_type, output_dir, batch_size=None, num_workers=None):
+    """Build the train.py command line for a policy trained from scratch."""
     cmd = [
         "python", "lerobot/scripts/train.py",
         f"--dataset.repo_id={dataset_repo_id}",
@@ -77,17 +51,90 @@ def train_policy(
         "--policy.device=cuda",
         "--wandb.enable=true"
     ]
+    # Leave train.py's defaults unless overridden, e.g. by auto_tune
+    if batch_size is not None:
+        cmd.append(f"--batch_size={batch_size}")
+    if num_workers is not None:
+        cmd.append(f"--num_workers={num_workers}")
+    return cmd
+
+@app.function(
+    gpu="A100",
+    timeout=7200,  # 2 hours
+    volumes={"/outputs": volume, DATASETS_DIR: dataset_volume},
+    secrets=[modal.Secret.from_name("wandb-secret")],  # Optional: for W&B logging
+    container_idle_timeout=600
+)
+def train_policy(
+    dataset_repo_id: str = "lerobot/pusht",
+    policy_type: str = "act",
+    env_type: str = "pusht",
+    output_dir: str = "/outputs/train_run",
+    batch_size: int = None,
+    num_workers: int = None,
+    auto_tune: bool = False
+):
+    setup_environment(dataset_repo_id)
     
-    result = subprocess.run(cmd, capture_output=True, text=True, cwd="/lerobot")
-   
-    print("STDOUT:", result.stdout)
-    if result.stderr:
-        print("STDERR:", result.stderr)
+    # Probe a few batch sizes and worker counts on this GPU first (see batch_tuner.py)
+    tuning = None
+    if auto_tune:
+        probe_cmd = build_train_command(dataset_repo_id, policy_type, env_type, output_dir)
+        tuning = tune(train_probe(probe_cmd), gpu_mem_gb=gpu_total_memory_gb())
+        batch_size, num_workers = tuning["batch_size"], tuning["num_workers"]
+        print(f"Tuned batch_size={batch_size} num_workers={num_workers}")
+    cmd = build_train_command(dataset_repo_id, policy_type, env_type, output_dir, batch_size, num_workers)
+    
+    # Output is printed live and spooled to a compressed log on the volume
+    # Checkpoints are committed in the background as soon as they are written
+    with CheckpointCommitter(output_dir, volume.commit) as committer:
+        result = run_training(cmd, output_dir)
     # Commit volume changes
     volume.commit()
     
     return {
-        "return_code": result.returncode,
+        "return_code": result["return_code"],
+        "output_dir": output_dir,
+        "success": result["return_code"] == 0,
+        "wall_time_s": result["wall_time_s"],
+        "final_loss": result["final_loss"],
+        "batch_size": batch_size, # None: train.py's default
+        "num_workers": num_workers,
+        "tuning": tuning, # Probe runs of auto_tune
+        "stdout_tail": result["stdout_tail"],
+        "stderr_tail": result["stderr_tail"],
+        "log_path": result["log_path"],
+        "telemetry": result["telemetry"],
+        "committed_checkpoints": committer.committed
+    }
+
+@app.function(
+    gpu="A100",
+    timeout=7200,  # 2 hours
+    volumes={"/outputs": volume, DATASETS_DIR: dataset_volume},
+    secrets=[modal.Secret.from_name("wandb-secret")],  # Optional: for W&B logging
+    container_idle_timeout=600
+)
+def train_policy_stream(
+    dataset_repo_id: str = "lerobot/pusht",
+    policy_type: str = "act",
+    env_type: str = "pusht",
+    output_dir: str = "/outputs/train_run"
+):
+    # Same as train_policy, but yields train.py output lines as they are written
+    setup_environment(dataset_repo_id)
+    cmd = build_train_command(dataset_repo_id, policy_type, env_type, output_dir)
+    
+    process = TrainingProcess(cmd, cwd="/lerobot")
+    with CheckpointCommitter(output_dir, volume.commit), TrainingLog(log_dir_for(output_dir)) as log:
+        yield from stream_events(process, log)
+    write_telemetry(log.telemetry, output_dir)
+    # Commit volume changes
+    volume.commit()
+    
+    yield {
+        "return_code": process.returncode,
         "output_dir": output_dir,
-        "success": result.returncode == 0
-    }
\ No newline at end of file
+        "success": process.returncode == 0,
+        "telemetry": log.telemetry.to_dict()
+    }
@@ -1,47 +1,16 @@
 import modal
-import subprocess
 import os
 
-# Define the image with all necessary dependencies
+from checkpoint_sync import CheckpointCommitter
+from dataset_cache import cached_lerobot_home, prefetch
+from lerobot_image import lerobot_image
+from sweeps import format_results, load_spec, plan_sweep, run_sweep, write_results_table
+from training_logs import LogArchiveReader, TrainingLog, TrainingProcess, log_dir_for, run_training, stream_events
+from training_telemetry import write_telemetry
 
-# Complete LeRobot image with all dependencies
-image = (
-    modal.Image.debian_slim(python_version="3.10")
-    .apt_install([
-        "git", "curl", "cmake", "build-essential", "python3-dev", 
-        "pkg-config", "libavformat-dev", "libavcodec-dev", 
-        "libavdevice-dev", "libavutil-dev", "libswscale-dev", 
-        "libswresample-dev", "libavfilter-dev", "ffmpeg"
-    ])
-    .pip_install([
-        "torch>=2.0.0,<2.4.0",
-        "torchvision>=0.15.0",
-        "torchaudio",
-        "numpy>=1.24.0",
-        "opencv-python>=4.8.0",
-        "pillow>=9.0.0",
-        "gymnasium>=0.28.0",
-        "wandb",
-        "tensorboard",
-        "matplotlib",
-        "seaborn",
-        "pandas",
-        "scipy",
-        "scikit-learn",
-        "h5py",
-        "pyyaml",
-        "omegaconf",
-        "hydra-core",
-        "ffmpeg-python",
-        "gym-pusht",
-        "lerobot[pusht]"  
-    ])
-    .run_commands([
-        "git clone https://github.com/huggingface/lerobot.git /lerobot",
-        "cd /lerobot && pip install -e ."
-    ])
-    .workdir("/lerobot")
-)
+# Define the image with all necessary dependencies
+# (shared LeRobot image, see lerobot_image.py)
+image = lerobot_image("pusht")
 
 
 app = modal.App("lerobot-training", image=image)
@@ -49,25 +18,26 @@ app = modal.App("lerobot-training", image=image)
 # Create a volume for persistent data storage
 volume = modal.Volume.from_name("lerobot-outputs", create_if_missing=True)
 
-@app.function(
-    gpu="A100",
-    timeout=7200,  # 2 hours
-    volumes={"/outputs": volume},
-    secrets=[modal.Secret.from_name("wandb-secret")],  # Optional: for W&B logging
-    container_idle_timeout=600
-)
-def train_policy(
-    dataset_repo_id: str = "lerobot/pusht",
-    policy_type: str = "act",
-    env_type: str = "pusht",
-    output_dir: str = "/outputs/train_run"
-):
-    import os
+# Datasets prefetched once and shared by every run (see dataset_cache.py)
+dataset_volume = modal.Volume.from_name("lerobot-datasets", create_if_missing=True)
+DATASETS_DIR = "/datasets"
+
+def setup_environment(dataset_repo_id):
+    """Prepare the container environment expected by train.py."""
     os.environ["PYTHONUNBUFFERED"] = "1"
+    
+    # Use the prefetched copy of the dataset if there is one
+    lerobot_home = cached_lerobot_home(DATASETS_DIR, dataset_repo_id)
+    if lerobot_home:
+        print(f"Using prefetched dataset in {lerobot_home}")
+        os.environ["HF_LEROBOT_HOME"] = lerobot_home
     hf_token = os.environ.get("HUGGINGFACE_TOKEN")
     if hf_token:
         os.environ["HF_TOKEN"] = hf_token
-    
+
+
+def build_train_command(dataset_repo_id, policy_type, env_type, output_dir, batch_size=None, steps=None):
+    """Build the train.py command line for a policy trained from scratch."""
     cmd = [
         "python", "lerobot/scripts/train.py",
         f"--dataset.repo_id={dataset_repo_id}",
@@ -77,27 +47,203 @@ def train_policy(
         "--policy.device=cuda",
         "--wandb.enable=true"
     ]
+    # Leave train.py's defaults unless overridden, e.g. by a sweep
+    if batch_size is not None:
+        cmd.append(f"--batch_size={batch_size}")
+    if steps is not None:
+        cmd.append(f"--steps={steps}")
+    return cmd
+
+@app.function(
+    gpu="A100",
+    timeout=7200,  # 2 hours
+    volumes={"/outputs": volume, DATASETS_DIR: dataset_volume},
+    secrets=[modal.Secret.from_name("wandb-secret")],  # Optional: for W&B logging
+    container_idle_timeout=600
+)
+def train_policy(
+    dataset_repo_id: str = "lerobot/pusht",
+    policy_type: str = "act",
+    env_type: str = "pusht",
+    output_dir: str = "/outputs/train_run",
+    batch_size: int = None,
+    steps: int = None
+):
+    setup_environment(dataset_repo_id)
+    cmd = build_train_command(dataset_repo_id, policy_type, env_type, output_dir, batch_size, steps)
     
-    result = subprocess.run(cmd, capture_output=True, text=True, cwd="/lerobot")
-   
-    print("STDOUT:", result.stdout)
-    if result.stderr:
-        print("STDERR:", result.stderr)
+    # Output is printed live and spooled to a compressed log on the volume
+    # Checkpoints are committed in the background as soon as they are written
+    with CheckpointCommitter(output_dir, volume.commit) as committer:
+        result = run_training(cmd, output_dir)
     # Commit volume changes
     volume.commit()
     
     return {
-        "return_code": result.returncode,
+        "return_code": result["return_code"],
+        "output_dir": output_dir,
+        "success": result["return_code"] == 0,
+        "wall_time_s": result["wall_time_s"],
+        "final_loss": result["final_loss"],
+        "stdout_tail": result["stdout_tail"],
+        "stderr_tail": result["stderr_tail"],
+        "log_path": result["log_path"],
+        "telemetry": result["telemetry"],
+        "committed_checkpoints": committer.committed
+    }
+
+@app.function(
+    gpu="A100",
+    timeout=7200,  # 2 hours
+    volumes={"/outputs": volume, DATASETS_DIR: dataset_volume},
+    secrets=[modal.Secret.from_name("wandb-secret")],  # Optional: for W&B logging
+    container_idle_timeout=600
+)
+def train_policy_stream(
+    dataset_repo_id: str = "lerobot/pusht",
+    policy_type: str = "act",
+    env_type: str = "pusht",
+    output_dir: str = "/outputs/train_run"
+):
+    # Same as train_policy, but yields train.py output lines as they are written
+    setup_environment(dataset_repo_id)
+    cmd = build_train_command(dataset_repo_id, policy_type, env_type, output_dir)
+    
+    process = TrainingProcess(cmd, cwd="/lerobot")
+    with CheckpointCommitter(output_dir, volume.commit), TrainingLog(log_dir_for(output_dir)) as log:
+        yield from stream_events(process, log)
+    write_telemetry(log.telemetry, output_dir)
+    # Commit volume changes
+    volume.commit()
+    
+    yield {
+        "return_code": process.returncode,
         "output_dir": output_dir,
-        "success": result.returncode == 0
+        "success": process.returncode == 0,
+        "telemetry": log.telemetry.to_dict()
     }
 
+
 @app.local_entrypoint()
 def main():
-    # Launch training
+    # Launch training: `modal run lerobot-pusht-test.py::main`
+    # (the app has several entrypoints, so a bare `modal run lerobot-pusht-test.py` is ambiguous)
     result = train_policy.remote(
         dataset_repo_id="lerobot/pusht",
         policy_type="diffusion",
         env_type="pusht"
     )
     print(f"Training completed with result: {result}")
+
+@app.local_entrypoint()
+def stream():
+    # Launch training and print train.py output live:
+    # `modal run lerobot-pusht-test.py::stream`
+    for event in train_policy_stream.remote_gen(
+        dataset_repo_id="lerobot/pusht",
+        policy_type="diffusion",
+        env_type="pusht"
+    ):
+        if "return_code" in event:
+            print(f"Training completed with result: {event}")
+        else:
+            print(event["line"])
+
+
+@app.function(volumes={"/outputs": volume})
+def read_training_log(
+    output_dir: str = "/outputs/train_run",
+    last: int = 100,
+    pattern: str = None,
+    around_step: int = None,
+    context: int = 20
+):
+    """
+    Fetch part of a run's compressed log without downloading all of it.
+
+    Returns the lines around `around_step` if given, else the lines matching
+    the regex `pattern` (at most 1000) if given, else the last `last` lines.
+    """
+    volume.reload()
+    reader = LogArchiveReader(log_dir_for(output_dir))
+    if around_step is not None:
+        return reader.around_step(around_step, context=context)
+    if pattern:
+        return [line for _, line in reader.grep(pattern, max_matches=1000)]
+    return reader.tail(last)
+
+
+@app.local_entrypoint()
+def logs(
+    output_dir: str = "/outputs/train_run",
+    last: int = 100,
+    pattern: str = None,
+    around_step: int = None
+):
+    # e.g. `modal run lerobot-pusht-test.py::logs --pattern loss`
+    for line in read_training_log.remote(output_dir, last, pattern, around_step):
+        print(line)
+
+
+@app.function(volumes={"/outputs": volume})
+def save_sweep_results(sweep_dir: str, rows: list):
+    """Write a sweep's results table to the volume."""
+    paths = write_results_table(rows, sweep_dir)
+    volume.commit()
+    return paths
+
+
+@app.local_entrypoint()
+def sweep(
+    spec: str = '{"policy_type": ["act", "diffusion"]}',
+    mode: str = "grid",
+    num_samples: int = 8,
+    seed: int = 0,
+    name: str = "pusht_sweep"
+):
+    # Run every configuration of a grid or random search in parallel, e.g.
+    # `modal run lerobot-pusht-test.py::sweep --spec '{"policy_type": ["act", "diffusion"], "batch_size": [32, 64]}'`
+    # `spec` is a JSON object (or file) mapping train_policy arguments to values
+    sweep_dir = f"/outputs/sweeps/{name}"
+    configs = plan_sweep(load_spec(spec), sweep_dir, mode, num_samples, seed)
+    print(f"Launching {len(configs)} training runs in parallel...")
+    
+    rows = run_sweep(train_policy, configs)
+    paths = save_sweep_results.remote(sweep_dir, rows)
+    
+    print(format_results(rows))
+    print(f"Results written to {', '.join(paths)}")
+
+
+@app.function(
+    cpu=2,
+    timeout=3600,
+    volumes={DATASETS_DIR: dataset_volume},
+    secrets=[modal.Secret.from_name("wandb-secret")]
+)
+def prefetch_dataset(
+    dataset_repo_id: str = "lerobot/pusht",
+    revision: str = None
+):
+    """
+    Download a dataset once into the dataset volume, keyed by repo id and
+    the commit `revision` resolves to. Later train_policy runs use it
+    through HF_LEROBOT_HOME instead of downloading it again.
+    """
+    hf_token = os.environ.get("HUGGINGFACE_TOKEN")
+    if hf_token:
+        os.environ["HF_TOKEN"] = hf_token
+    
+    result = prefetch(DATASETS_DIR, dataset_repo_id, revision)
+    dataset_volume.commit()
+    return result
+
+
+@app.local_entrypoint()
+def cache_dataset(
+    dataset_repo_id: str = "lerobot/pusht",
+    revision: str = None
+):
+    # `modal run lerobot-pusht-test.py::cache_dataset --dataset-repo-id lerobot/pusht`
+    result = prefetch_dataset.remote(dataset_repo_id, revision)
+    print(f"Dataset cached at {result['root']} (commit {result['commit']})")
@@ -1,53 +1,15 @@
 import modal
-import subprocess
 import os
 
-# Define the image with all necessary dependencies
+from checkpoint_sync import CheckpointCommitter
+from dataset_cache import cached_lerobot_home
+from lerobot_image import lerobot_image
+from training_logs import TrainingLog, TrainingProcess, log_dir_for, run_training, stream_events
+from training_telemetry import write_telemetry
 
-# Complete LeRobot image with all dependencies
-image = (
-    modal.Image.debian_slim(python_version="3.10")
-    .apt_install([
-        "git", "curl", "cmake", "build-essential", "python3-dev", 
-        "pkg-config", "libavformat-dev", "libavcodec-dev", 
-        "libavdevice-dev", "libavutil-dev", "libswscale-dev", 
-        "libswresample-dev", "libavfilter-dev", "ffmpeg"
-    ])
-    .pip_install([
-        "torch==2.2.2",
-        "torchvision>=0.15.0",
-        "torchaudio",
-        "numpy>=1.24.0",
-        "opencv-python>=4.8.0",
-        "pillow>=9.0.0",
-        "gymnasium>=0.28.0",
-        "wandb",
-        "tensorboard",
-        "matplotlib",
-        "seaborn",
-        "pandas",
-        "scipy",
-        "scikit-learn",
-        "h5py",
-        "pyyaml",
-        "omegaconf",
-        "hydra-core",
-        "ffmpeg-python",
-        "gym-pusht",
-        "lerobot[smolvla]",
-        "transformers",
-        "accelerate",
-        "num2words",
-        "datasets",
-        "torch-optimizer",
-        "draccus"
-    ])
-    .run_commands([
-        "git clone https://github.com/huggingface/lerobot.git /lerobot",
-        "cd /lerobot && pip install -e ."
-    ])
-    .workdir("/lerobot")
-)
+# Define the image with all necessary dependencies
+# (shared LeRobot image, see lerobot_image.py)
+image = lerobot_image("smolvla")
 
 
 app = modal.App("lerobot-smolvla", image=image)
@@ -56,26 +18,28 @@ app = modal.App("lerobot-smolvla", image=image)
 # Create a volume for persistent data storage
 volume = modal.Volume.from_name("lerobot-outputs", create_if_missing=True)
 
-@app.function(
-    gpu="L40S",
-    timeout=3600, 
-    volumes={"/outputs": volume},
-    secrets=[modal.Secret.from_name("wandb-secret")],  # Optional: for W&B logging
-    container_idle_timeout=600
-)
-def train_policy(
-    dataset_repo_id: str = "lerobot/pusht",
-    policy_path: str = "act",
-    output_dir: str = "/outputs/train_run"
-):
-    import os
+# Datasets prefetched once and shared by every run (see dataset_cache.py)
+dataset_volume = modal.Volume.from_name("lerobot-datasets", create_if_missing=True)
+DATASETS_DIR = "/datasets"
+
+def setup_environment(dataset_repo_id):
+    """Prepare the container environment expected by train.py."""
     os.environ["PYTHONUNBUFFERED"] = "1"
+    
+    # Use the prefetched copy of the dataset if there is one
+    lerobot_home = cached_lerobot_home(DATASETS_DIR, dataset_repo_id)
+    if lerobot_home:
+        print(f"Using prefetched dataset in {lerobot_home}")
+        os.environ["HF_LEROBOT_HOME"] = lerobot_home
     hf_token = os.environ.get("HUGGINGFACE_TOKEN")
     if not hf_token:
         raise EnvironmentError("HUGGINGFACE_TOKEN environment variable is not set. Please set it before running the training.")
     os.environ["HF_TOKEN"] = hf_token
-    
-    cmd = [
+
+
+def build_train_command(dataset_repo_id, policy_path, output_dir):
+    """Build the train.py command line for a SmolVLA fine-tune."""
+    return [
         "python", "lerobot/scripts/train.py",
         f"--dataset.repo_id={dataset_repo_id}",
         f"--policy.path={policy_path}",
@@ -85,27 +49,94 @@ def train_policy(
         "--policy.device=cuda",
         "--wandb.enable=true"
     ]
+
+@app.function(
+    gpu="L40S",
+    timeout=3600, 
+    volumes={"/outputs": volume, DATASETS_DIR: dataset_volume},
+    secrets=[modal.Secret.from_name("wandb-secret")],  # Optional: for W&B logging
+    container_idle_timeout=600
+)
+def train_policy(
+    dataset_repo_id: str = "lerobot/pusht",
+    policy_path: str = "act",
+    output_dir: str = "/outputs/train_run"
+):
+    setup_environment(dataset_repo_id)
+    cmd = build_train_command(dataset_repo_id, policy_path, output_dir)
     
-    result = subprocess.run(cmd, capture_output=True, text=True, cwd="/lerobot")
-   
-    print("STDOUT:", result.stdout)
-    if result.stderr:
-        print("STDERR:", result.stderr)
+    # Output is printed live and spooled to a compressed log on the volume
+    # Checkpoints are committed in the background as soon as they are written
+    with CheckpointCommitter(output_dir, volume.commit) as committer:
+        result = run_training(cmd, output_dir)
     # Commit volume changes
     volume.commit()
     
     return {
-        "return_code": result.returncode,
+        "return_code": result["return_code"],
         "output_dir": output_dir,
-        "success": result.returncode == 0
+        "success": result["return_code"] == 0,
+        "wall_time_s": result["wall_time_s"],
+        "final_loss": result["final_loss"],
+        "stdout_tail": result["stdout_tail"],
+        "stderr_tail": result["stderr_tail"],
+        "log_path": result["log_path"],
+        "telemetry": result["telemetry"],
+        "committed_checkpoints": committer.committed
     }
 
+@app.function(
+    gpu="L40S",
+    timeout=3600, 
+    volumes={"/outputs": volume, DATASETS_DIR: dataset_volume},
+    secrets=[modal.Secret.from_name("wandb-secret")],  # Optional: for W&B logging
+    container_idle_timeout=600
+)
+def train_policy_stream(
+    dataset_repo_id: str = "lerobot/pusht",
+    policy_path: str = "act",
+    output_dir: str = "/outputs/train_run"
+):
+    # Same as train_policy, but yields train.py output lines as they are written
+    setup_environment(dataset_repo_id)
+    cmd = build_train_command(dataset_repo_id, policy_path, output_dir)
+    
+    process = TrainingProcess(cmd, cwd="/lerobot")
+    with CheckpointCommitter(output_dir, volume.commit), TrainingLog(log_dir_for(output_dir)) as log:
+        yield from stream_events(process, log)
+    write_telemetry(log.telemetry, output_dir)
+    # Commit volume changes
+    volume.commit()
+    
+    yield {
+        "return_code": process.returncode,
+        "output_dir": output_dir,
+        "success": process.returncode == 0,
+        "telemetry": log.telemetry.to_dict()
+    }
+
+
 @app.local_entrypoint()
 def main():
-    # Launch training
+    # Launch training: `modal run lerobot-smalvla-test.py::main`
+    # (the app has several entrypoints, so a bare `modal run lerobot-smalvla-test.py` is ambiguous)
     result = train_policy.remote(
         dataset_repo_id="lerobot/svla_so101_pickplace",
         policy_path="lerobot/smolvla_base",
         output_dir = "/outputs/train_smolvla"
     )
     print(f"Training completed with result: {result}")
+
+@app.local_entrypoint()
+def stream():
+    # Launch training and print train.py output live:
+    # `modal run lerobot-smalvla-test.py::stream`
+    for event in train_policy_stream.remote_gen(
+        dataset_repo_id="lerobot/svla_so101_pickplace",
+        policy_path="lerobot/smolvla_base",
+        output_dir = "/outputs/train_smolvla"
+    ):
+        if "return_code" in event:
+            print(f"Training completed with result: {event}")
+        else:
+            print(event["line"])
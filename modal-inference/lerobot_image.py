@@ -0,0 +1,212 @@
+"""
+Shared Modal image for the LeRobot apps in this directory.
+
+The layers are ordered from the most stable to the most frequently changed,
+so that changing one of them only rebuilds the layers after it and every
+app reuses the same cached base:
+
+1. System packages (build tools, ffmpeg libraries)
+2. PyTorch, pinned
+3. Common Python dependencies
+4. LeRobot, cloned at a pinned commit
+5. Per-variant extras (e.g. `lerobot[smolvla]`)
+6. Model weights baked into the image (optional)
+7. The local helper modules
+
+Usage:
+    from lerobot_image import lerobot_image
+    app = modal.App("lerobot-training", image=lerobot_image("pusht"))
+
+The LeRobot commit is read from `lerobot.lock` next to this file (or the
+LEROBOT_COMMIT environment variable). Without either, the first build pins
+the current HEAD (what the unpinned image cloned) into `lerobot.lock`, and
+every later build reuses it. To pin or bump it, run the following and
+commit `lerobot.lock`:
+    python lerobot_image.py pin [ref]
+"""
+
+import os
+import re
+import subprocess
+import sys
+
+import modal
+
+PYTHON_VERSION = "3.10"
+LEROBOT_REPO = "https://github.com/huggingface/lerobot.git"
+LOCK_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "lerobot.lock")
+COMMIT_RE = re.compile(r"[0-9a-f]{40}")
+
+APT_PACKAGES = [
+    "git", "curl", "cmake", "build-essential", "python3-dev",
+    "pkg-config", "libavformat-dev", "libavcodec-dev",
+    "libavdevice-dev", "libavutil-dev", "libswscale-dev",
+    "libswresample-dev", "libavfilter-dev", "ffmpeg"
+]
+
+TORCH_PACKAGES = [
+    "torch==2.2.2",
+    "torchvision==0.17.2",
+    "torchaudio==2.2.2",
+]
+
+COMMON_PACKAGES = [
+    "numpy>=1.24.0",
+    "opencv-python>=4.8.0",
+    "pillow>=9.0.0",
+    "gymnasium>=0.28.0",
+    "wandb",
+    "tensorboard",
+    "matplotlib",
+    "seaborn",
+    "pandas",
+    "scipy",
+    "scikit-learn",
+    "h5py",
+    "pyyaml",
+    "omegaconf",
+    "hydra-core",
+    "ffmpeg-python",
+    "gym-pusht",
+]
+
+# LeRobot extras and additional packages of each image variant
+VARIANTS = {
+    "pusht": {
+        "extras": ["pusht"],
+        "packages": [],
+    },
+    "smolvla": {
+        "extras": ["smolvla"],
+        "packages": [
+            "transformers",
+            "accelerate",
+            "num2words",
+            "datasets",
+            "torch-optimizer",
+            "draccus",
+        ],
+    },
+}
+
+# Hugging Face cache of the images with baked weights
+WEIGHTS_HOME = "/weights/hf"
+
+# Hub repositories that loading a policy downloads, to bake with `weights=`.
+# SmolVLA also downloads its vision-language backbone.
+POLICY_WEIGHTS = {
+    "lerobot/smolvla_base": ["lerobot/smolvla_base", "HuggingFaceTB/SmolVLM2-500M-Video-Instruct"],
+}
+
+# Helper modules imported by the apps, added as the last layer
+LOCAL_MODULES = [
+    "lerobot_image", "training_logs", "checkpoint_sync", "sweeps", "dataset_cache", "policy_server",
+    "data_parallel", "training_telemetry", "gpu_benchmark", "batch_tuner", "checkpoint_store"
+]
+
+
+def lerobot_commit():
+    """
+    Return the pinned LeRobot commit, pinning HEAD if nothing pins it yet.
+
+    Raises:
+        ValueError: If the pin is not a full commit hash
+    """
+    commit = os.environ.get("LEROBOT_COMMIT")
+    if not commit:
+        if not os.path.exists(LOCK_FILE):
+            pin()
+        with open(LOCK_FILE) as f:
+            commit = f.read().strip()
+    if not COMMIT_RE.fullmatch(commit):
+        raise ValueError(f"LeRobot pin {commit!r} is not a commit hash. Run `python lerobot_image.py pin [ref]`.")
+    return commit
+
+
+def lerobot_image(variant, weights=None):
+    """
+    Build the image of an image variant ("pusht" or "smolvla").
+
+    Args:
+        variant (str): A key of `VARIANTS`
+        weights (list): Hub repositories to download into the image's
+            Hugging Face cache (`WEIGHTS_HOME`), so that loading them at
+            runtime does not download anything
+
+    Returns:
+        modal.Image: The image, with /lerobot as working directory
+    """
+    if variant not in VARIANTS:
+        raise ValueError(f"Unknown image variant {variant!r}, expected one of {sorted(VARIANTS)}")
+    extras = VARIANTS[variant]["extras"]
+    packages = VARIANTS[variant]["packages"]
+    commit = lerobot_commit()
+
+    image = (
+        modal.Image.debian_slim(python_version=PYTHON_VERSION)
+        .apt_install(APT_PACKAGES)
+        .pip_install(TORCH_PACKAGES)
+        .pip_install(COMMON_PACKAGES)
+        .run_commands([
+            f"git clone {LEROBOT_REPO} /lerobot && cd /lerobot && git checkout {commit}",
+            "cd /lerobot && pip install -e .",
+        ])
+        .env({"LEROBOT_COMMIT": commit})  # The lock file is not in the container
+    )
+    if extras:
+        image = image.run_commands(f"cd /lerobot && pip install -e '.[{','.join(extras)}]'")
+    if packages:
+        image = image.pip_install(packages)
+    if weights:
+        image = image.env({"HF_HOME": WEIGHTS_HOME}).run_commands(
+            [
+                'if [ -n "$HUGGINGFACE_TOKEN" ]; then export HF_TOKEN=$HUGGINGFACE_TOKEN; fi; '
+                f"huggingface-cli download {repo_id}"
+                for repo_id in weights
+            ],
+            secrets=[modal.Secret.from_name("wandb-secret")],  # For HUGGINGFACE_TOKEN
+        )
+
+    return image.workdir("/lerobot").add_local_python_source(*LOCAL_MODULES)
+
+
+def resolve_ref(ref="HEAD"):
+    """
+    Return the commit `ref` (HEAD, a tag, a branch or a full ref name) of the
+    LeRobot repository points to.
+
+    `git ls-remote` matches patterns against the end of ref names, so only
+    an exact match is used, tags first as `git rev-parse` does. Annotated
+    tags are peeled (`<tag>^{}`) to their commit.
+    """
+    if COMMIT_RE.fullmatch(ref):
+        return ref
+    output = subprocess.run(
+        ["git", "ls-remote", LEROBOT_REPO, ref, f"{ref}^{{}}"],
+        capture_output=True, text=True, check=True
+    ).stdout
+    refs = dict(reversed(line.split("\t", 1)) for line in output.splitlines() if "\t" in line)
+    if ref == "HEAD" or ref.startswith("refs/"):
+        names = [ref]
+    else:
+        names = [f"refs/tags/{ref}", f"refs/heads/{ref}"]
+    for name in names:
+        commit = refs.get(f"{name}^{{}}") or refs.get(name)
+        if commit:
+            return commit
+    raise ValueError(f"Could not resolve {ref!r} in {LEROBOT_REPO}")
+
+
+def pin(ref="HEAD"):
+    """Resolve `ref` of the LeRobot repository to a commit and write it to the lock file."""
+    commit = resolve_ref(ref)
+    with open(LOCK_FILE, "w") as f:
+        f.write(commit + "\n")
+    print(f"Pinned LeRobot {ref} to {commit} in {LOCK_FILE}. Commit it so every image builds the same LeRobot.")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "pin":
+        print("Usage: python lerobot_image.py pin [ref]")
+        sys.exit(1)
+    pin(*sys.argv[2:3])
@@ -0,0 +1,365 @@
+"""
+Inference helpers for the policies trained by train_policy.
+
+`PolicyRunner` loads a `pretrained_model` directory once and predicts action
+chunks from observations. `MicroBatcher` groups concurrent requests into a
+single forward pass. Observations and actions travel as compact binary
+(numpy arrays in an .npz payload) instead of JSON lists, so camera frames
+are sent as raw uint8 bytes.
+
+These helpers do not depend on Modal. To check a checkpoint on CPU:
+    python policy_server.py --checkpoint /path/to/pretrained_model
+    python policy_server.py --tiny-act /tmp/tiny_act  # creates a tiny ACT checkpoint first
+"""
+
+import argparse
+import bisect
+import io
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from checkpoint_sync import PRETRAINED_MODEL_DIR, latest_checkpoint
+
+
+def encode_arrays(arrays):
+    """Serialize a dict of numpy arrays to bytes."""
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def decode_arrays(data):
+    """Deserialize bytes produced by `encode_arrays` back to a dict of numpy arrays."""
+    with np.load(io.BytesIO(data), allow_pickle=False) as arrays:
+        return {key: arrays[key] for key in arrays.files}
+
+
+def resolve_checkpoint(path):
+    """
+    Return the `pretrained_model` directory to load for `path`.
+
+    `path` may be a pretrained_model directory, a checkpoint directory
+    (checkpoints/NNNNNN) or a train.py output_dir, in which case its newest
+    checkpoint is used.
+    """
+    checkpoint = latest_checkpoint(path)
+    if checkpoint is not None:
+        return os.path.join(checkpoint.path, PRETRAINED_MODEL_DIR)
+    if os.path.isdir(os.path.join(path, PRETRAINED_MODEL_DIR)):
+        return os.path.join(path, PRETRAINED_MODEL_DIR)
+    return path
+
+
+class PolicyRunner:
+    """
+    A LeRobot policy loaded once and kept on its device.
+
+    Args:
+        pretrained_path (str): A pretrained_model directory, checkpoint
+            directory or train.py output_dir (see `resolve_checkpoint`)
+        device (str): "cuda" or "cpu"
+    """
+
+    def __init__(self, pretrained_path, device="cuda"):
+        import torch
+        from lerobot.common.policies.factory import get_policy_class
+        from lerobot.configs.policies import PreTrainedConfig
+
+        self.pretrained_path = resolve_checkpoint(pretrained_path)
+        self.device = torch.device(device)
+
+        config = PreTrainedConfig.from_pretrained(self.pretrained_path)
+        config.device = device
+        policy_class = get_policy_class(config.type)
+        self.policy = policy_class.from_pretrained(self.pretrained_path, config=config)
+        self.policy.to(self.device)
+        self.policy.eval()
+        self.config = config
+
+    def to(self, device):
+        """Move the policy to `device`, e.g. after loading it on CPU for a memory snapshot."""
+        import torch
+
+        self.device = torch.device(device)
+        self.config.device = device
+        self.policy.to(self.device)
+        return self
+
+    def features(self):
+        """Return the expected observation keys and shapes, and the action shape."""
+        return {
+            "policy_type": self.config.type,
+            "inputs": {key: list(feature.shape) for key, feature in self.config.input_features.items()},
+            "action": list(self.config.output_features["action"].shape),
+        }
+
+    def to_batch(self, observations, tasks=None):
+        """
+        Stack observations into a batch of tensors on the policy's device.
+
+        Images may be sent as uint8 (height, width, channels) frames; they are
+        converted to float (channels, height, width) in [0, 1].
+        """
+        import torch
+
+        batch = {}
+        for key in observations[0]:
+            arrays = np.stack([observation[key] for observation in observations])
+            tensor = torch.from_numpy(arrays).to(self.device, non_blocking=True)
+            if tensor.dtype == torch.uint8:
+                tensor = tensor.permute(0, 3, 1, 2) if tensor.shape[-1] in (1, 3) else tensor
+                tensor = tensor.float() / 255
+            batch[key] = tensor.float()
+        if tasks is not None:
+            batch["task"] = list(tasks)
+        return batch
+
+    def predict_batch(self, observations, tasks=None):
+        """
+        Predict an action chunk for each observation.
+
+        Args:
+            observations (list): Dicts of numpy arrays keyed like the
+                policy's input features, without batch dimension
+            tasks (list): Language instructions, for policies that need one
+
+        Returns:
+            np.ndarray: Actions of shape (batch, chunk size, action dim)
+        """
+        import torch
+
+        batch = self.to_batch(observations, tasks)
+        with torch.inference_mode():
+            if hasattr(self.policy, "predict_action_chunk"):
+                actions = self.policy.predict_action_chunk(batch)
+            else:
+                # Older policies only expose select_action, which pops one
+                # action at a time from the chunk it predicted
+                self.policy.reset()
+                actions = torch.stack(
+                    [self.policy.select_action(batch) for _ in range(self.config.n_action_steps)], dim=1
+                )
+        return actions.float().cpu().numpy()
+
+    def predict(self, observation, task=None):
+        """Predict the action chunk of a single observation, shape (chunk size, action dim)."""
+        return self.predict_batch([observation], None if task is None else [task])[0]
+
+    def predict_bytes(self, data, task=None):
+        """Same as `predict`, with the observation and action chunk encoded with `encode_arrays`."""
+        return encode_arrays({"action": self.predict(decode_arrays(data), task)})
+
+
+class Histogram:
+    """Counts of values falling into fixed buckets, each bucket being `<= bound`."""
+
+    def __init__(self, bounds):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # Last bucket: above every bound
+        self.total = 0
+        self.sum = 0.0
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += 1
+        self.sum += value
+
+    def to_dict(self):
+        labels = [f"<={bound:g}" for bound in self.bounds] + [f">{self.bounds[-1]:g}"]
+        return {
+            "buckets": dict(zip(labels, self.counts)),
+            "count": self.total,
+            "mean": self.sum / self.total if self.total else None,
+        }
+
+
+class MicroBatcher:
+    """
+    Dynamic batching of concurrent requests.
+
+    Requests submitted from any thread are queued. A worker thread takes the
+    oldest request, then waits for more until `max_batch_size` requests are
+    collected or the oldest one has waited `max_wait_ms`. It runs
+    `batch_fn` once on the whole batch and hands each caller its result.
+
+    Args:
+        batch_fn (callable): Takes a list of requests and returns the list
+            of their results, in the same order
+        max_batch_size (int): Largest batch passed to `batch_fn`
+        max_wait_ms (float): Longest time a request waits for others
+    """
+
+    BATCH_SIZE_BOUNDS = [1, 2, 4, 8, 16, 32, 64]
+    WAIT_MS_BOUNDS = [0.5, 1, 2, 5, 10, 20, 50, 100]
+
+    def __init__(self, batch_fn, max_batch_size=8, max_wait_ms=5.0):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max_wait_ms / 1000
+        self.batch_sizes = Histogram(self.BATCH_SIZE_BOUNDS)
+        self.queue_wait_ms = Histogram(self.WAIT_MS_BOUNDS)
+        self._requests = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def submit(self, request):
+        """Queue a request and return a Future of its result."""
+        future = Future()
+        self._requests.put((request, future, time.perf_counter()))
+        return future
+
+    def __call__(self, request):
+        """Queue a request and wait for its result."""
+        return self.submit(request).result()
+
+    def close(self):
+        self._requests.put(None)
+        self._worker.join()
+
+    def _collect(self):
+        """Block for the next batch of requests, or return None once closed."""
+        first = self._requests.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = first[2] + self.max_wait_s
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                # Past the deadline, still take the requests that are already queued
+                item = self._requests.get(timeout=remaining) if remaining > 0 else self._requests.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._requests.put(None)  # Finish this batch, then stop
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+
+            started = time.perf_counter()
+            with self._lock:
+                self.batch_sizes.add(len(batch))
+                for _, _, queued_at in batch:
+                    self.queue_wait_ms.add((started - queued_at) * 1000)
+
+            try:
+                results = self.batch_fn([request for request, _, _ in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+
+    def stats(self):
+        """Return the batch size and queue wait (ms) histograms."""
+        with self._lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait_s * 1000,
+                "batch_size": self.batch_sizes.to_dict(),
+                "queue_wait_ms": self.queue_wait_ms.to_dict(),
+                "pending": self._requests.qsize(),
+            }
+
+
+def batched_predictor(runner, max_batch_size=8, max_wait_ms=5.0):
+    """
+    Return a `MicroBatcher` over `runner.predict_batch`.
+
+    Requests are (observation, task) tuples and results are action chunks.
+    """
+    def predict_batch(requests):
+        observations = [observation for observation, _ in requests]
+        tasks = [task for _, task in requests]
+        return list(runner.predict_batch(observations, None if all(task is None for task in tasks) else tasks))
+
+    return MicroBatcher(predict_batch, max_batch_size, max_wait_ms)
+
+
+def dummy_observation(features):
+    """Return a zero observation matching `PolicyRunner.features()`, with uint8 frames for images."""
+    observation = {}
+    for key, shape in features["inputs"].items():
+        if key.startswith("observation.image"):
+            channels, height, width = shape
+            observation[key] = np.zeros((height, width, channels), dtype=np.uint8)
+        else:
+            observation[key] = np.zeros(shape, dtype=np.float32)
+    return observation
+
+
+def make_tiny_act_checkpoint(path, state_dim=6, action_dim=6, image_size=64):
+    """
+    Save a tiny, randomly initialized ACT policy to `path` for local CPU tests.
+
+    Returns:
+        str: The pretrained_model directory
+    """
+    import torch
+    from lerobot.common.policies.act.configuration_act import ACTConfig
+    from lerobot.common.policies.act.modeling_act import ACTPolicy
+    from lerobot.configs.types import FeatureType, PolicyFeature
+
+    image_key = "observation.images.front"
+    config = ACTConfig(
+        input_features={
+            "observation.state": PolicyFeature(type=FeatureType.STATE, shape=(state_dim,)),
+            image_key: PolicyFeature(type=FeatureType.VISUAL, shape=(3, image_size, image_size)),
+        },
+        output_features={"action": PolicyFeature(type=FeatureType.ACTION, shape=(action_dim,))},
+        chunk_size=10,
+        n_action_steps=10,
+        dim_model=32,
+        dim_feedforward=64,
+        n_heads=2,
+        n_encoder_layers=1,
+        n_decoder_layers=1,
+        pretrained_backbone_weights=None,
+        device="cpu",
+    )
+    stats = {
+        "observation.state": {"mean": torch.zeros(state_dim), "std": torch.ones(state_dim)},
+        image_key: {"mean": torch.zeros(3, 1, 1), "std": torch.ones(3, 1, 1)},
+        "action": {"mean": torch.zeros(action_dim), "std": torch.ones(action_dim)},
+    }
+    pretrained_path = os.path.join(path, PRETRAINED_MODEL_DIR)
+    ACTPolicy(config, dataset_stats=stats).save_pretrained(pretrained_path)
+    return pretrained_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load a policy checkpoint and run a few predictions")
+    parser.add_argument("--checkpoint", type=str, help="pretrained_model, checkpoint or output directory")
+    parser.add_argument("--tiny-act", type=str, help="Create a tiny ACT checkpoint in this directory and use it")
+    parser.add_argument("--device", type=str, default="cpu")
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    checkpoint = make_tiny_act_checkpoint(args.tiny_act) if args.tiny_act else args.checkpoint
+    if checkpoint is None:
+        parser.error("one of --checkpoint or --tiny-act is required")
+
+    started = time.perf_counter()
+    runner = PolicyRunner(checkpoint, device=args.device)
+    print(f"Loaded {runner.pretrained_path} in {time.perf_counter() - started:.2f}s")
+    features = runner.features()
+    payload = encode_arrays(dummy_observation(features))
+    print(f"Observation payload: {len(payload)} bytes")
+
+    for run in range(args.runs):
+        started = time.perf_counter()
+        action = decode_arrays(runner.predict_bytes(payload))["action"]
+        print(f"Run {run}: action chunk {action.shape} in {(time.perf_counter() - started) * 1000:.1f} ms")
@@ -0,0 +1,268 @@
+"""
+Client side of a remote policy, for control loops that run next to the robot.
+
+A policy served by `serve_policy_modal_app.py` returns a whole action chunk
+per call, but each call costs a network round trip. `ChunkPrefetcher` keeps
+the current chunk and requests the next one in the background once only
+`refill_threshold` actions are left, so the control loop keeps its fps while
+the request is in flight.
+
+A chunk is predicted from the observation at the tick it was requested, and
+its first action is meant for that tick. When it arrives k ticks later, its
+first k actions are skipped. A chunk that arrives after all of its actions
+are out of date is discarded.
+
+To try it against a local stand-in server with artificial latency:
+    python remote_policy.py --latency-ms 150 --fps 30
+    python remote_policy.py --latency-ms 150 --refill-threshold 0  # no prefetching
+"""
+
+import argparse
+import collections
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+class ChunkPrefetcher:
+    """
+    Serve one action per control tick from action chunks fetched asynchronously.
+
+    Args:
+        predict_fn (callable): (observation, task) -> action chunk of shape
+            (chunk size, action dim). Called from a background thread.
+        refill_threshold (int): Request the next chunk once this many
+            actions or fewer are left. Set it to at least the round trip
+            time in ticks; 0 only requests a chunk once the current one is
+            used up.
+        wait_when_empty (bool): When the chunk runs out before the next one
+            arrives, block until it does instead of repeating the last action
+        latency_window (int): Latencies kept for the percentiles of
+            `summary`, the most recent ones
+    """
+
+    def __init__(self, predict_fn, refill_threshold=10, wait_when_empty=False, latency_window=1000):
+        self.predict_fn = predict_fn
+        self.refill_threshold = refill_threshold
+        self.wait_when_empty = wait_when_empty
+        self.latency_window = latency_window
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self.reset()
+
+    def reset(self):
+        """Forget the current chunk and any chunk in flight, e.g. between episodes."""
+        self.step = 0
+        self.actions = collections.deque()
+        self.last_action = None
+        self.pending = None  # (future, step the request was made at)
+        self.stats = {
+            "requests": 0,
+            "chunks_used": 0,
+            "stale_chunks": 0,
+            "skipped_actions": 0,
+            "repeated_actions": 0,
+            "blocked_s": 0.0,
+            "errors": 0,
+            "latency_ms": collections.deque(maxlen=self.latency_window),
+        }
+
+    def _request(self, observation, task):
+        started = time.perf_counter()
+        chunk = np.asarray(self.predict_fn(observation, task))
+        return chunk, (time.perf_counter() - started) * 1000
+
+    def _adopt(self, block=False):
+        """Switch to the chunk in flight if it arrived (or wait for it if `block`)."""
+        future, requested_at = self.pending
+        if not block and not future.done():
+            return
+        self.pending = None
+
+        started = time.perf_counter()
+        try:
+            chunk, latency_ms = future.result()
+        except Exception:
+            self.stats["errors"] += 1
+            if not self.actions and self.last_action is None:
+                raise  # Nothing to execute at all
+            return
+        finally:
+            if block:
+                self.stats["blocked_s"] += time.perf_counter() - started
+        self.stats["latency_ms"].append(latency_ms)
+
+        # The chunk's first action is for the tick it was requested at
+        skip = self.step - requested_at
+        if skip >= len(chunk):
+            self.stats["stale_chunks"] += 1
+            return
+        self.actions = collections.deque(chunk[skip:])
+        self.stats["skipped_actions"] += skip
+        self.stats["chunks_used"] += 1
+
+    def select_action(self, observation, task=None):
+        """
+        Return the action to execute at this tick.
+
+        Args:
+            observation (dict): The latest observation, as numpy arrays
+            task (str): Language instruction, for policies that need one
+        """
+        if self.pending is not None:
+            self._adopt()
+        if self.pending is None and len(self.actions) <= self.refill_threshold:
+            self.pending = (self._executor.submit(self._request, observation, task), self.step)
+            self.stats["requests"] += 1
+        if not self.actions and self.pending is not None and (self.wait_when_empty or self.last_action is None):
+            self._adopt(block=True)
+
+        if self.actions:
+            self.last_action = self.actions.popleft()
+        else:
+            self.stats["repeated_actions"] += 1
+        self.step += 1
+        return self.last_action
+
+    def summary(self):
+        """Return the counters, with percentiles of the last `latency_window` latencies instead of the latencies."""
+        latencies = self.stats["latency_ms"]
+        summary = {key: value for key, value in self.stats.items() if key != "latency_ms"}
+        if latencies:
+            summary["latency_ms_p50"] = float(np.percentile(latencies, 50))
+            summary["latency_ms_p95"] = float(np.percentile(latencies, 95))
+        return summary
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class RemotePolicy:
+    """
+    Policy-like wrapper of a `ChunkPrefetcher` for LeRobot control loops.
+
+    Exposes `select_action(batch)` and `reset()` like LeRobot policies:
+    the batch holds tensors with a batch dimension of 1 and images as float
+    (channels, height, width) in [0, 1]. Images are sent as uint8
+    (height, width, channels) to keep the requests small.
+    """
+
+    def __init__(self, predict_fn, refill_threshold=10, wait_when_empty=False):
+        self.prefetcher = ChunkPrefetcher(predict_fn, refill_threshold, wait_when_empty)
+
+    def reset(self):
+        self.prefetcher.reset()
+
+    def select_action(self, batch):
+        import torch
+
+        observation = {}
+        for key, value in batch.items():
+            if not isinstance(value, torch.Tensor):
+                continue
+            array = value[0].detach().cpu().numpy()
+            if key.startswith("observation.image"):
+                array = (np.clip(array, 0, 1) * 255).round().astype(np.uint8).transpose(1, 2, 0)
+            observation[key] = array
+        task = batch.get("task")
+        if isinstance(task, (list, tuple)):
+            task = task[0]
+
+        action = self.prefetcher.select_action(observation, task)
+        return torch.from_numpy(np.asarray(action, dtype=np.float32)).unsqueeze(0)
+
+
+def modal_predict_fn(checkpoint, app_name="lerobot-policy-server", class_name="PolicyServer"):
+    """Return a `predict_fn` calling the deployed policy server on `checkpoint`."""
+    import modal
+    from policy_server import decode_arrays, encode_arrays
+
+    server = modal.Cls.from_name(app_name, class_name)(checkpoint=checkpoint)
+
+    def predict(observation, task=None):
+        return decode_arrays(server.predict.remote(encode_arrays(observation), task))["action"]
+
+    return predict
+
+
+class LatencyServer:
+    """
+    Local stand-in for the policy server: calls `predict_fn` after an
+    artificial delay of `latency_ms` plus up to `jitter_ms`.
+    """
+
+    def __init__(self, predict_fn, latency_ms=100, jitter_ms=0, seed=0):
+        self.predict_fn = predict_fn
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self._random = random.Random(seed)
+
+    def __call__(self, observation, task=None):
+        time.sleep((self.latency_ms + self._random.uniform(0, self.jitter_ms)) / 1000)
+        return self.predict_fn(observation, task)
+
+
+def counting_policy(chunk_size=50, action_dim=6):
+    """
+    A fake policy whose action for tick t is t, given `observation["step"]`.
+
+    Executed actions that differ from their tick reveal misaligned chunks.
+    """
+    def predict(observation, task=None):
+        steps = int(observation["step"]) + np.arange(chunk_size, dtype=np.float32)
+        return np.repeat(steps[:, None], action_dim, axis=1)
+
+    return predict
+
+
+def run_control_loop(prefetcher, steps, fps):
+    """
+    Run a fixed-rate control loop of `steps` ticks against `prefetcher`.
+
+    Returns:
+        dict: The prefetcher's summary, the achieved fps, the number of
+        overrun ticks and how far executed actions were from their tick
+    """
+    period = 1 / fps
+    overruns = 0
+    misalignment = []
+    started = time.perf_counter()
+    next_tick = started
+    for step in range(steps):
+        action = prefetcher.select_action({"step": np.array(step)})
+        misalignment.append(abs(float(action[0]) - step))
+        next_tick += period
+        delay = next_tick - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            overruns += 1
+            next_tick = time.perf_counter()
+
+    return {
+        **prefetcher.summary(),
+        "fps": steps / (time.perf_counter() - started),
+        "overrun_ticks": overruns,
+        "mean_misalignment": float(np.mean(misalignment)),
+        "max_misalignment": float(np.max(misalignment)),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate a control loop against a remote policy with latency")
+    parser.add_argument("--latency-ms", type=float, default=150)
+    parser.add_argument("--jitter-ms", type=float, default=50)
+    parser.add_argument("--fps", type=float, default=30)
+    parser.add_argument("--steps", type=int, default=300)
+    parser.add_argument("--chunk-size", type=int, default=50)
+    parser.add_argument("--refill-threshold", type=int, default=10)
+    parser.add_argument("--wait-when-empty", action="store_true")
+    args = parser.parse_args()
+
+    server = LatencyServer(counting_policy(args.chunk_size), args.latency_ms, args.jitter_ms)
+    prefetcher = ChunkPrefetcher(server, args.refill_threshold, args.wait_when_empty)
+    result = run_control_loop(prefetcher, args.steps, args.fps)
+    prefetcher.close()
+    for key, value in result.items():
+        print(f"{key}: {value:.2f}" if isinstance(value, float) else f"{key}: {value}")
@@ -0,0 +1,161 @@
+import modal
+import os
+import time
+
+# Recorded as soon as the module is imported, i.e. when the container starts
+CONTAINER_STARTED = time.time()
+
+from lerobot_image import POLICY_WEIGHTS, lerobot_image
+from policy_server import PolicyRunner, batched_predictor, decode_arrays, dummy_observation, encode_arrays
+
+# Shared LeRobot image (see lerobot_image.py); the smolvla variant can also load ACT/diffusion
+image = lerobot_image("smolvla")
+
+# Hub policy whose weights are baked into the image of FastPolicyServer
+FAST_START_POLICY = os.environ.get("FAST_START_POLICY", "lerobot/smolvla_base")
+fast_image = lerobot_image("smolvla", weights=POLICY_WEIGHTS.get(FAST_START_POLICY, [FAST_START_POLICY]))
+
+app = modal.App("lerobot-policy-server", image=image)
+
+# Volume holding the checkpoints written by train_policy
+volume = modal.Volume.from_name(
+    os.environ.get("POLICY_VOLUME", "lerobot-smolvla-training-volume"), create_if_missing=True
+)
+
+
+def set_hf_token():
+    hf_token = os.environ.get("HUGGINGFACE_TOKEN")
+    if hf_token:
+        os.environ["HF_TOKEN"] = hf_token
+
+
+class PolicyServerBase:
+    # Methods shared by PolicyServer and FastPolicyServer, which differ in how
+    # they load the policy. Subclasses set `self.runner` and `self.startup`,
+    # then call `start_batcher`.
+
+    def start_batcher(self):
+        self.batcher = batched_predictor(self.runner, self.max_batch_size, self.max_wait_ms)
+        self.startup["ready"] = time.time()
+        self.startup["task_id"] = os.environ.get("MODAL_TASK_ID")
+
+    @modal.exit()
+    def close(self):
+        self.batcher.close()
+
+    @modal.method()
+    def features(self) -> dict:
+        """Return the observation keys and shapes the policy expects."""
+        return self.runner.features()
+
+    @modal.method()
+    def predict(self, observation: bytes, task: str = None) -> bytes:
+        """
+        Predict an action chunk.
+
+        Args:
+            observation (bytes): Observation arrays encoded with
+                `policy_server.encode_arrays`. Images may be uint8 (H, W, C).
+            task (str): Language instruction, for policies such as SmolVLA
+
+        Returns:
+            bytes: {"action": (chunk size, action dim) float32 array},
+            encoded with `policy_server.encode_arrays`
+        """
+        action = self.batcher((decode_arrays(observation), task))
+        return encode_arrays({"action": action})
+
+    @modal.method()
+    def stats(self) -> dict:
+        """Return this container's batch size and queue wait histograms."""
+        return self.batcher.stats()
+
+    @modal.method()
+    def startup_timings(self) -> dict:
+        """Return when this container started, how long loading took and when it was ready."""
+        return self.startup
+
+
+@app.cls(
+    gpu="L40S",
+    volumes={"/outputs": volume},
+    secrets=[modal.Secret.from_name("wandb-secret")],  # For HUGGINGFACE_TOKEN
+    container_idle_timeout=600
+)
+# Concurrent predict calls in one container are grouped into batches
+@modal.concurrent(max_inputs=64)
+class PolicyServer(PolicyServerBase):
+    # A pretrained_model directory, a checkpoints/NNNNNN directory or a
+    # train_policy output_dir (its newest checkpoint is used)
+    checkpoint: str = modal.parameter(default="/outputs/train_smolvla_run")
+    # Dynamic batching: a forward pass runs once `max_batch_size` requests are
+    # queued or the oldest one has waited `max_wait_ms`
+    max_batch_size: int = modal.parameter(default=16)
+    max_wait_ms: int = modal.parameter(default=5)
+
+    @modal.enter()
+    def load(self):
+        # Runs once per container: the policy then stays on the GPU
+        set_hf_token()
+        started = time.perf_counter()
+        self.runner = PolicyRunner(self.checkpoint, device="cuda")
+        self.startup = {"container_started": CONTAINER_STARTED, "load_s": time.perf_counter() - started}
+        print(f"Loaded {self.runner.pretrained_path} in {self.startup['load_s']:.1f}s")
+        self.start_batcher()
+
+
+@app.cls(
+    image=fast_image,
+    gpu="L40S",
+    volumes={"/outputs": volume},
+    secrets=[modal.Secret.from_name("wandb-secret")],  # For HUGGINGFACE_TOKEN
+    container_idle_timeout=600,
+    enable_memory_snapshot=True
+)
+@modal.concurrent(max_inputs=64)
+class FastPolicyServer(PolicyServerBase):
+    # Fast cold starts: the weights of FAST_START_POLICY are baked into the
+    # image, and the container is snapshotted once torch and LeRobot are
+    # imported and the policy is loaded on CPU. Later cold starts restore
+    # the snapshot and only move the weights to the GPU.
+    checkpoint: str = modal.parameter(default=FAST_START_POLICY)
+    max_batch_size: int = modal.parameter(default=16)
+    max_wait_ms: int = modal.parameter(default=5)
+
+    @modal.enter(snap=True)
+    def load(self):
+        # Included in the memory snapshot; GPUs are not available yet
+        set_hf_token()
+        started = time.perf_counter()
+        self.runner = PolicyRunner(self.checkpoint, device="cpu")
+        self.startup = {"container_started": CONTAINER_STARTED, "load_s": time.perf_counter() - started}
+        print(f"Loaded {self.runner.pretrained_path} on CPU in {self.startup['load_s']:.1f}s")
+
+    @modal.enter(snap=False)
+    def to_gpu(self):
+        # Runs after every restore. The module-level CONTAINER_STARTED of a
+        # restored container is the time the snapshot was taken.
+        self.startup["restored"] = time.time()
+        started = time.perf_counter()
+        self.runner.to("cuda")
+        self.startup["to_gpu_s"] = time.perf_counter() - started
+        self.start_batcher()
+
+
+@app.local_entrypoint()
+def main(checkpoint: str = "/outputs/train_smolvla_run", task: str = None, runs: int = 5, concurrency: int = 1,
+         fast: bool = False):
+    # Query a trained checkpoint with a zero observation:
+    # `modal run serve_policy_modal_app.py --checkpoint /outputs/train_smolvla_run`
+    server = (FastPolicyServer if fast else PolicyServer)(checkpoint=checkpoint)
+    features = server.features.remote()
+    print(f"Policy {features['policy_type']} expects {features['inputs']}")
+
+    payload = encode_arrays(dummy_observation(features))
+    for run in range(runs):
+        started = time.perf_counter()
+        # With --concurrency > 1, the requests are sent together and batched by the server
+        actions = list(server.predict.starmap([(payload, task)] * concurrency))
+        action = decode_arrays(actions[0])["action"]
+        print(f"Run {run}: {concurrency} action chunk(s) {action.shape} in {(time.perf_counter() - started) * 1000:.0f} ms")
+    print(f"Server stats: {server.stats.remote()}")
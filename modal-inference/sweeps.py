@@ -0,0 +1,410 @@
+"""
+Hyperparameter sweeps over the `train_policy` Modal functions.
+
+A sweep spec maps `train_policy` argument names to the values to try, e.g.
+{"batch_size": [32, 64], "steps": [5000, 10000]}. Every configuration gets
+its own `output_dir` and all of them run as parallel containers, so a sweep
+takes as long as its slowest run rather than the sum of all runs.
+
+`successive_halving` only needs a `train_batch` function, so it can be
+checked against a simulated trainer whose loss curves depend on the config:
+    python sweeps.py --simulate
+    python sweeps.py --simulate --mode random --num-samples 27 --eta 3 --fail-rate 0.1
+"""
+
+import argparse
+import csv
+import inspect
+import itertools
+import json
+import math
+import os
+import random
+import re
+
+RESULT_COLUMNS = ["run", "output_dir", "return_code", "success", "wall_time_s", "final_loss", "error"]
+
+
+def expand_grid(spec):
+    """
+    Return every combination of the values in a grid spec.
+
+    Values that are not lists are used as constants.
+    """
+    keys = list(spec)
+    values = [value if isinstance(value, list) else [value] for value in spec.values()]
+    return [dict(zip(keys, combination)) for combination in itertools.product(*values)]
+
+
+def sample_configs(spec, num_samples, seed=0):
+    """
+    Draw `num_samples` random configurations from a spec.
+
+    A list value is sampled uniformly from its items. A dict value such as
+    {"min": 1e-5, "max": 1e-3, "log": true} is sampled from that range (log
+    uniformly if "log" is set; integers if both bounds are integers). Other
+    values are used as constants.
+    """
+    rng = random.Random(seed)
+    configs = []
+    for _ in range(num_samples):
+        config = {}
+        for key, value in spec.items():
+            if isinstance(value, list):
+                config[key] = rng.choice(value)
+            elif isinstance(value, dict):
+                config[key] = _sample_range(rng, value)
+            else:
+                config[key] = value
+        configs.append(config)
+    return configs
+
+
+def _sample_range(rng, bounds):
+    low, high = bounds["min"], bounds["max"]
+    if bounds.get("log"):
+        value = math.exp(rng.uniform(math.log(low), math.log(high)))
+    else:
+        value = rng.uniform(low, high)
+    if isinstance(low, int) and isinstance(high, int):
+        return min(high, max(low, round(value)))
+    return value
+
+
+def run_name(index, config):
+    """Return a readable, filesystem-safe name for the `index`-th run."""
+    parts = [
+        f"{key}={value:.3g}" if isinstance(value, float) else f"{key}={value}"
+        for key, value in config.items()
+        if key != "output_dir"
+    ]
+    name = re.sub(r"[^A-Za-z0-9_.=-]+", "_", "-".join(parts))
+    return f"{index:03d}-{name}"[:120]
+
+
+def assign_output_dirs(configs, sweep_dir):
+    """Give every configuration its own output_dir under `sweep_dir`."""
+    return [
+        {**config, "output_dir": os.path.join(sweep_dir, run_name(i, config))}
+        for i, config in enumerate(configs)
+    ]
+
+
+def load_spec(spec):
+    """Load a sweep spec given as a JSON string or the path of a JSON file."""
+    if os.path.isfile(spec):
+        with open(spec) as f:
+            return json.load(f)
+    return json.loads(spec)
+
+
+def plan_sweep(spec, sweep_dir, mode="grid", num_samples=8, seed=0):
+    """
+    Return the configurations of a sweep, each with its own output_dir.
+
+    Args:
+        spec (dict): `train_policy` argument names mapped to values to try
+        sweep_dir (str): Directory holding the run directories and results
+        mode (str): "grid" for every combination, "random" for random search
+        num_samples (int): Number of configurations drawn in random mode
+        seed (int): Random seed of random mode
+    """
+    if mode == "grid":
+        configs = expand_grid(spec)
+    elif mode == "random":
+        configs = sample_configs(spec, num_samples, seed)
+    else:
+        raise ValueError(f"Unknown sweep mode {mode!r}, expected 'grid' or 'random'")
+    return assign_output_dirs(configs, sweep_dir)
+
+
+def bind_arguments(function, config):
+    """
+    Turn a configuration into the positional arguments of `function`.
+
+    Arguments missing from `config` take the function's defaults. Unknown
+    names raise a TypeError before anything is launched.
+    """
+    bound = inspect.signature(function).bind(**config)
+    bound.apply_defaults()
+    return bound.args
+
+
+def result_row(config, result):
+    """Build the results table row of one run from its `train_policy` result."""
+    row = {
+        "run": os.path.basename(config["output_dir"]),
+        "output_dir": config["output_dir"],
+        **{key: value for key, value in config.items() if key != "output_dir"},
+    }
+    if isinstance(result, BaseException):
+        row.update(return_code=None, success=False, wall_time_s=None, final_loss=None, error=repr(result))
+    else:
+        row.update(
+            return_code=result.get("return_code"),
+            success=result.get("success"),
+            wall_time_s=result.get("wall_time_s"),
+            final_loss=result.get("final_loss"),
+            error=None,
+        )
+    return row
+
+
+def run_sweep(train_fn, configs):
+    """
+    Run `train_fn` for every configuration in parallel containers.
+
+    Args:
+        train_fn (modal.Function): A `train_policy` function
+        configs (list): Keyword arguments of each run, including output_dir
+
+    Returns:
+        list: One results table row per configuration, in order. A run that
+        raised is recorded as failed instead of aborting the sweep.
+    """
+    raw_function = train_fn.get_raw_f()
+    arguments = [bind_arguments(raw_function, config) for config in configs]
+    results = train_fn.starmap(arguments, order_outputs=True, return_exceptions=True)
+    return [result_row(config, result) for config, result in zip(configs, results)]
+
+
+def write_results_table(rows, sweep_dir):
+    """
+    Write the sweep results as results.csv (and results.parquet if pandas
+    and pyarrow are installed) in `sweep_dir`.
+
+    Returns:
+        list: The paths written
+    """
+    os.makedirs(sweep_dir, exist_ok=True)
+    columns = RESULT_COLUMNS + sorted({key for row in rows for key in row} - set(RESULT_COLUMNS))
+
+    csv_path = os.path.join(sweep_dir, "results.csv")
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+    paths = [csv_path]
+
+    try:
+        import pandas as pd
+
+        parquet_path = os.path.join(sweep_dir, "results.parquet")
+        pd.DataFrame(rows, columns=columns).to_parquet(parquet_path)
+        paths.append(parquet_path)
+    except ImportError:
+        pass
+    return paths
+
+
+def format_results(rows):
+    """Format the results table for printing, best final loss first."""
+    def sort_key(row):
+        loss = row.get("final_loss")
+        return (loss is None, loss if loss is not None else 0)
+
+    lines = [f"{'run':<60} {'ok':<5} {'rc':>4} {'wall_s':>8} {'loss':>10}"]
+    for row in sorted(rows, key=sort_key):
+        loss = f"{row['final_loss']:.4f}" if row.get("final_loss") is not None else "-"
+        wall_time = f"{row['wall_time_s']:.0f}" if row.get("wall_time_s") is not None else "-"
+        lines.append(
+            f"{row['run'][:60]:<60} {str(bool(row['success'])):<5} "
+            f"{str(row['return_code']):>4} {wall_time:>8} {loss:>10}"
+        )
+    return "\n".join(lines)
+
+
+def rung_budgets(min_steps, max_steps, eta=3):
+    """Return the step budgets of successive halving: min_steps * eta**k, capped at max_steps."""
+    budgets = []
+    steps = min_steps
+    while steps < max_steps:
+        budgets.append(steps)
+        steps *= eta
+    budgets.append(max_steps)
+    return budgets
+
+
+def successive_halving(configs, train_batch, min_steps, max_steps, eta=3, metric="recent_loss"):
+    """
+    Early-stop a sweep with successive halving.
+
+    All configurations are first trained for `min_steps` steps. At the end
+    of each rung, only the best 1/eta of them (lowest `metric`) are kept
+    and trained further, up to `eta` times more steps, until the survivors
+    reach `max_steps`. Rungs are synchronous: every run of a rung finishes
+    before the next rung starts. Survivors resume from their checkpoints,
+    so a rung only costs the steps it adds.
+
+    Args:
+        configs (list): Keyword arguments of each run, including output_dir
+        train_batch (callable): Takes a list of configurations (with "steps"
+            set to the total steps to reach) and returns their results in
+            order, training them in parallel. Failed runs may be returned
+            as exceptions.
+        min_steps (int): Step budget of the first rung
+        max_steps (int): Step budget of the last rung
+        eta (int): Reduction factor between rungs
+        metric (str): Result key to minimize
+
+    Returns:
+        list: One row per run and rung it took part in, with its steps,
+        metric value and whether it was promoted to the next rung
+    """
+    budgets = rung_budgets(min_steps, max_steps, eta)
+    survivors = list(configs)
+    rows = []
+    for rung, steps in enumerate(budgets):
+        results = train_batch([{**config, "steps": steps} for config in survivors])
+        scored = []
+        for config, result in zip(survivors, results):
+            row = result_row(config, result)
+            value = None if isinstance(result, BaseException) or not result.get("success") else result.get(metric)
+            row.update(rung=rung, steps=steps, metric=value)
+            rows.append(row)
+            scored.append((math.inf if value is None else value, len(scored), config, row))
+
+        is_last_rung = rung == len(budgets) - 1
+        keep = 0 if is_last_rung else max(1, len(survivors) // eta)
+        scored.sort(key=lambda item: item[:2])
+        survivors = []
+        for value, _, config, row in scored:
+            row["promoted"] = len(survivors) < keep and value != math.inf
+            if row["promoted"]:
+                survivors.append(config)
+        if not survivors:
+            break
+    return rows
+
+
+def halving_summary(rows, max_steps):
+    """Compare the steps trained by successive halving with running every configuration to the end."""
+    trained_steps = {}
+    for row in rows:
+        trained_steps[row["run"]] = max(trained_steps.get(row["run"], 0), row["steps"])
+    total = sum(trained_steps.values())
+    full = len(trained_steps) * max_steps
+    finished = [row for row in rows if row["steps"] == max_steps and row["metric"] is not None]
+    best = min(finished, key=lambda row: row["metric"]) if finished else None
+    return {
+        "total_steps": total,
+        "full_sweep_steps": full,
+        "saved_fraction": 1 - total / full if full else 0.0,
+        "best_run": best["run"] if best else None,
+        "best_metric": best["metric"] if best else None,
+    }
+
+
+def modal_batch_trainer(train_fn):
+    """
+    Return a `train_batch` callable for `successive_halving` that runs a
+    resumable Modal training function with `starmap`.
+
+    Calls that chained into follow-up calls (see `train_policy_resumable`)
+    are followed until the end of their chain.
+    """
+    import modal
+
+    raw_function = train_fn.get_raw_f()
+
+    def train_batch(configs):
+        arguments = [bind_arguments(raw_function, config) for config in configs]
+        results = []
+        for result in train_fn.starmap(arguments, order_outputs=True, return_exceptions=True):
+            while isinstance(result, dict) and "next_call_id" in result:
+                result = modal.FunctionCall.from_id(result["next_call_id"]).get()
+            results.append(result)
+        return results
+
+    return train_batch
+
+
+class SimulatedTrainer:
+    """
+    Loss-curve model of training runs, standing in for `modal_batch_trainer`.
+
+    Every configuration (identified by its output_dir) gets a curve
+    floor + scale / (1 + steps / 1000) ** rate, with the three parameters
+    drawn from a generator seeded with the configuration, so a run resumed
+    with more steps continues on the same curve. Curves of different rates
+    cross, as real ones do. Each result carries some noise, and a run fails
+    with probability `fail_rate`.
+
+    Args:
+        step_s (float): Simulated wall time of a step
+        noise (float): Relative standard deviation of the reported loss
+        fail_rate (float): Probability that a call fails
+        seed (int): Seed of the curves
+    """
+
+    def __init__(self, step_s=0.05, noise=0.02, fail_rate=0.0, seed=0):
+        self.step_s = step_s
+        self.noise = noise
+        self.fail_rate = fail_rate
+        self.seed = seed
+        self.trained_steps = {}
+
+    def curve(self, config):
+        """Return the (floor, scale, rate) of a configuration's loss curve."""
+        key = json.dumps({k: v for k, v in config.items() if k != "steps"}, sort_keys=True, default=str)
+        rng = random.Random(f"{self.seed}:{key}")
+        return rng.uniform(0.02, 0.3), rng.uniform(0.5, 2.0), rng.uniform(0.3, 0.9)
+
+    def loss(self, config, steps):
+        floor, scale, rate = self.curve(config)
+        return floor + scale / (1 + steps / 1000) ** rate
+
+    def __call__(self, configs):
+        results = []
+        for config in configs:
+            run = config["output_dir"]
+            steps = config["steps"]
+            rng = random.Random(f"{self.seed}:{run}:{steps}")
+            if rng.random() < self.fail_rate:
+                results.append(RuntimeError(f"Simulated failure of {os.path.basename(run)} at {steps} steps"))
+                continue
+            new_steps = steps - self.trained_steps.get(run, 0)
+            self.trained_steps[run] = steps
+            loss = self.loss(config, steps) * (1 + rng.gauss(0, self.noise))
+            results.append({
+                "return_code": 0,
+                "success": True,
+                "wall_time_s": new_steps * self.step_s,
+                "final_loss": loss,
+                "recent_loss": loss,
+            })
+        return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run successive halving against a simulated trainer")
+    parser.add_argument("--simulate", action="store_true", help="Use the simulated trainer (required)")
+    parser.add_argument("--spec", default='{"batch_size": [16, 32, 48, 64, 96, 128], "lr": [1e-4, 3e-4, 1e-3]}')
+    parser.add_argument("--mode", default="grid", choices=["grid", "random"])
+    parser.add_argument("--num-samples", type=int, default=9)
+    parser.add_argument("--min-steps", type=int, default=1000)
+    parser.add_argument("--max-steps", type=int, default=20000)
+    parser.add_argument("--eta", type=int, default=3)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if not args.simulate:
+        parser.error("pass --simulate; real sweeps run with the `halving` Modal entrypoints")
+
+    configs = plan_sweep(load_spec(args.spec), "simulated_sweep", args.mode, args.num_samples, args.seed)
+    trainer = SimulatedTrainer(fail_rate=args.fail_rate, seed=args.seed)
+    rows = successive_halving(configs, trainer, args.min_steps, args.max_steps, args.eta)
+    for row in rows:
+        metric = f"{row['metric']:.4f}" if row["metric"] is not None else "failed"
+        print(f"rung {row['rung']} {row['steps']:>6} steps  {row['run'][:50]:<50} {metric:>8}"
+              f"{'  promoted' if row['promoted'] else ''}")
+
+    summary = halving_summary(rows, args.max_steps)
+    best_loss = min(trainer.loss(config, args.max_steps) for config in configs)
+    if summary["best_run"]:
+        print(f"Best run: {summary['best_run']} (loss {summary['best_metric']:.4f}, "
+              f"best of all configurations at {args.max_steps} steps: {best_loss:.4f})")
+    else:
+        print("No run reached the last rung")
+    print(f"Trained {summary['total_steps']} steps instead of {summary['full_sweep_steps']} "
+          f"({summary['saved_fraction']:.0%} saved)")
@@ -0,0 +1,459 @@
+"""
+Helpers for consuming the output of LeRobot's train.py while it runs.
+
+The Modal apps in this directory launch `lerobot/scripts/train.py` as a
+subprocess. Instead of buffering the whole run with `capture_output=True`,
+these helpers read stdout and stderr line by line so that progress can be
+shown live and memory stays flat no matter how long the run is.
+"""
+
+import gzip
+import json
+import os
+import queue
+import re
+import subprocess
+import threading
+import time
+from collections import deque, namedtuple
+
+from training_telemetry import ThroughputTelemetry, write_telemetry
+
+# A single line of output and the stream ("stdout" or "stderr") it came from
+LogLine = namedtuple("LogLine", ["stream", "text"])
+
+# Lines waiting to be consumed; readers block once this many are queued
+MAX_PENDING_LINES = 1000
+
+# train.py logs one line per `log_freq` steps, e.g.
+# "INFO ... step:2K smpl:128K ep:26 epch:0.07 loss:0.574 grdn:12.4 lr:1.0e-04 updt_s:0.150 data_s:0.003"
+_STEP_RE = re.compile(r"\bstep:\S+")
+_METRIC_RE = re.compile(r"(\w+):(\S+)")
+_SUFFIXES = {"K": 1e3, "M": 1e6, "B": 1e9, "T": 1e12, "Q": 1e15}
+
+# The archive is a series of independently gzipped blocks of this many lines
+# (or bytes, or seconds since the last block, whichever comes first).
+# Concatenated gzip members are still a valid gzip file, so
+# `zcat train.log.gz` works, while the index lets readers seek to a single
+# block.
+ARCHIVE_BLOCK_LINES = 1000
+ARCHIVE_BLOCK_BYTES = 256 * 1024
+ARCHIVE_BLOCK_SECONDS = 30
+ARCHIVE_NAME = "train.log.gz"
+INDEX_NAME = "train.log.idx"
+
+
+class TrainingProcess:
+    """
+    Run a command and iterate over its output lines as they are written.
+
+    Iterating yields `LogLine` tuples from both stdout and stderr in the
+    order they arrive. Once the iteration is finished, `returncode` holds
+    the exit code of the process. Stopping the iteration early kills it.
+
+    If `time_limit` (in seconds) is given, the process is terminated once
+    it has run that long and `timed_out` is set.
+    """
+
+    def __init__(self, cmd, cwd=None, env=None, time_limit=None):
+        self.cmd = list(cmd)
+        self.cwd = cwd
+        self.env = env
+        self.time_limit = time_limit
+        self.returncode = None
+        self.timed_out = False
+
+    def __iter__(self):
+        process = subprocess.Popen(
+            self.cmd,
+            cwd=self.cwd,
+            env=self.env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            bufsize=1,  # Line buffered
+        )
+        lines = queue.Queue(maxsize=MAX_PENDING_LINES)
+        readers = [
+            threading.Thread(target=_pump, args=(process.stdout, "stdout", lines), daemon=True),
+            threading.Thread(target=_pump, args=(process.stderr, "stderr", lines), daemon=True),
+        ]
+        for reader in readers:
+            reader.start()
+        timer = None
+        if self.time_limit is not None:
+            timer = threading.Timer(self.time_limit, self._terminate, args=(process,))
+            timer.daemon = True
+            timer.start()
+
+        try:
+            open_streams = len(readers)
+            while open_streams:
+                line = lines.get()
+                if line is None:
+                    open_streams -= 1
+                    continue
+                yield line
+        finally:
+            if open_streams:
+                if process.poll() is None:
+                    process.kill()
+                # Drain so the reader threads are not stuck on a full queue
+                while any(reader.is_alive() for reader in readers):
+                    try:
+                        lines.get(timeout=0.1)
+                    except queue.Empty:
+                        pass
+            if timer is not None:
+                timer.cancel()
+            self.returncode = process.wait()
+
+    def _terminate(self, process):
+        if process.poll() is None:
+            self.timed_out = True
+            process.terminate()
+
+
+def _pump(pipe, stream, lines):
+    """Forward every line of `pipe` to the `lines` queue, then a None sentinel."""
+    try:
+        for text in pipe:
+            lines.put(LogLine(stream, text.rstrip("\n")))
+    finally:
+        pipe.close()
+        lines.put(None)
+
+
+def parse_number(value):
+    """
+    Parse a number as formatted by train.py, e.g. "0.574", "1.0e-04" or "13K".
+
+    Returns None if the value is not a number.
+    """
+    multiplier = 1
+    if value and value[-1] in _SUFFIXES:
+        multiplier = _SUFFIXES[value[-1]]
+        value = value[:-1]
+    try:
+        return float(value) * multiplier
+    except ValueError:
+        return None
+
+
+def parse_step_line(line):
+    """
+    Parse a train.py training log line into a dict of metrics.
+
+    Args:
+        line (str): A line of train.py output
+
+    Returns:
+        dict: Metrics keyed by name (e.g. "step", "loss", "updt_s"), or None
+        if the line is not a training step log. Large counters such as
+        "step" are logged with a K/M suffix by train.py, so they are only
+        as precise as the log line.
+    """
+    match = _STEP_RE.search(line)
+    if not match:
+        return None
+
+    record = {}
+    for key, value in _METRIC_RE.findall(line[match.start():]):
+        number = parse_number(value)
+        if number is not None:
+            record[key] = number
+    return record if "step" in record else None
+
+
+def stream_events(process, log=None):
+    """
+    Turn a `TrainingProcess` into serializable events for a Modal generator.
+
+    Yields one {"stream", "line", "metrics"} dict per output line, where
+    "metrics" is the parsed step record or None. Lines are also recorded in
+    `log` (a `TrainingLog`) when one is given. `process.returncode` is set
+    once the events are exhausted.
+    """
+    for line in process:
+        yield {
+            "stream": line.stream,
+            "line": line.text,
+            "metrics": log.record(line) if log else parse_step_line(line.text),
+        }
+
+
+def log_dir_for(output_dir):
+    """
+    Return the directory where the log archive of a run is written.
+
+    train.py refuses to start if `output_dir` already exists, so the logs
+    live next to it, e.g. /outputs/logs/train_run for /outputs/train_run.
+    """
+    output_dir = output_dir.rstrip("/")
+    return os.path.join(os.path.dirname(output_dir), "logs", os.path.basename(output_dir))
+
+
+class LogArchive:
+    """
+    Append-only, block-compressed log file with an offset index.
+
+    Lines are written to `<log_dir>/train.log.gz` in gzip blocks. For every
+    block, one JSON line is appended to `<log_dir>/train.log.idx` with its
+    byte offset and length, the number of its first line and the range of
+    train.py steps it covers. Opening an existing archive appends to it, so
+    a resumed run keeps a single log.
+    """
+
+    def __init__(self, log_dir):
+        os.makedirs(log_dir, exist_ok=True)
+        self.path = os.path.join(log_dir, ARCHIVE_NAME)
+        self.index_path = os.path.join(log_dir, INDEX_NAME)
+        self.next_line = sum(entry["num_lines"] for entry in read_index(self.index_path))
+        self._file = open(self.path, "ab")
+        self._index = open(self.index_path, "a")
+        self._lines = []
+        self._size = 0
+        self._first_step = None
+        self._last_step = None
+        self._last_flush = time.monotonic()
+
+    def write(self, text, step=None):
+        """Add a line of output, with its train.py step if it has one."""
+        self._lines.append(text)
+        self._size += len(text) + 1
+        if step is not None:
+            if self._first_step is None:
+                self._first_step = step
+            self._last_step = step
+        if (
+            len(self._lines) >= ARCHIVE_BLOCK_LINES
+            or self._size >= ARCHIVE_BLOCK_BYTES
+            or time.monotonic() - self._last_flush >= ARCHIVE_BLOCK_SECONDS
+        ):
+            self.flush()
+
+    def flush(self):
+        """Compress the pending lines into a new block and index it."""
+        self._last_flush = time.monotonic()
+        if not self._lines:
+            return
+        data = gzip.compress(("\n".join(self._lines) + "\n").encode("utf-8"))
+        offset = self._file.tell()
+        self._file.write(data)
+        self._file.flush()
+        entry = {
+            "offset": offset,
+            "length": len(data),
+            "first_line": self.next_line,
+            "num_lines": len(self._lines),
+            "first_step": self._first_step,
+            "last_step": self._last_step,
+        }
+        self._index.write(json.dumps(entry) + "\n")
+        self._index.flush()
+
+        self.next_line += len(self._lines)
+        self._lines = []
+        self._size = 0
+        self._first_step = None
+        self._last_step = None
+
+    def close(self):
+        self.flush()
+        self._file.close()
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_index(index_path):
+    """Return the block entries of an archive index, or [] if there is none."""
+    if not os.path.exists(index_path):
+        return []
+    with open(index_path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class LogArchiveReader:
+    """
+    Query a `LogArchive` by decompressing only the blocks that are needed.
+
+    Meant to run where the archive is mounted (e.g. inside a Modal function
+    with the volume attached), so that only the selected blocks are read.
+    """
+
+    def __init__(self, log_dir):
+        self.path = os.path.join(log_dir, ARCHIVE_NAME)
+        self.index = read_index(os.path.join(log_dir, INDEX_NAME))
+
+    def _read_block(self, entry):
+        with open(self.path, "rb") as f:
+            f.seek(entry["offset"])
+            data = gzip.decompress(f.read(entry["length"]))
+        return data.decode("utf-8").split("\n")[:-1]
+
+    def tail(self, n=100):
+        """Return the last `n` lines."""
+        lines = []
+        for entry in reversed(self.index):
+            if len(lines) >= n:
+                break
+            lines = self._read_block(entry) + lines
+        return lines[-n:] if n else []
+
+    def grep(self, pattern, max_matches=None, min_step=None, max_step=None):
+        """
+        Return (line_number, line) pairs for the lines matching a regex.
+
+        Blocks are decompressed one at a time. `min_step`/`max_step` skip
+        the blocks whose logged steps are all outside that range.
+        """
+        regex = re.compile(pattern)
+        matches = []
+        for entry in self.index:
+            if entry["last_step"] is not None and min_step is not None and entry["last_step"] < min_step:
+                continue
+            if entry["first_step"] is not None and max_step is not None and entry["first_step"] > max_step:
+                continue
+            for i, line in enumerate(self._read_block(entry)):
+                if regex.search(line):
+                    matches.append((entry["first_line"] + i, line))
+                    if max_matches and len(matches) >= max_matches:
+                        return matches
+        return matches
+
+    def around_step(self, step, context=20):
+        """
+        Return the lines around the first log line at or after `step`.
+
+        Only the block holding that step and, when the context spills over,
+        its neighbours are decompressed.
+        """
+        for position, entry in enumerate(self.index):
+            if entry["last_step"] is not None and entry["last_step"] >= step:
+                break
+        else:
+            return []
+
+        lines = self._read_block(entry)
+        target = next(
+            i for i, line in enumerate(lines)
+            if (parse_step_line(line) or {}).get("step", -1) >= step
+        )
+        before = lines[max(0, target - context):target]
+        after = lines[target:target + context + 1]
+        if target < context and position > 0:
+            before = self._read_block(self.index[position - 1])[-(context - target):] + before
+        if len(after) < context + 1 and position + 1 < len(self.index):
+            after += self._read_block(self.index[position + 1])[:context + 1 - len(after)]
+        return before + after
+
+
+class TrainingLog:
+    """
+    Record the output of a training run with bounded memory.
+
+    Only the last `tail_lines` lines of each stream are kept in memory for
+    the result tails; every line is spooled to a `LogArchive` in `log_dir`.
+    `last_metrics` holds the most recent parsed step record and
+    `recent_losses` the last `recent_loss_count` logged losses;
+    `recent_step_times` holds the matching per-step times (update plus
+    data loading). `telemetry` collects the throughput of the whole run.
+    """
+
+    def __init__(self, log_dir, tail_lines=200, recent_loss_count=10):
+        self.archive = LogArchive(log_dir)
+        self.log_path = self.archive.path
+        self.last_metrics = None
+        self.recent_losses = deque(maxlen=recent_loss_count)
+        self.recent_step_times = deque(maxlen=recent_loss_count)
+        self.telemetry = ThroughputTelemetry()
+        self._tails = {
+            "stdout": deque(maxlen=tail_lines),
+            "stderr": deque(maxlen=tail_lines),
+        }
+
+    def record(self, line):
+        """Store a `LogLine` and return its parsed step metrics, if any."""
+        metrics = parse_step_line(line.text)
+        self._tails[line.stream].append(line.text)
+        self.archive.write(line.text, step=metrics["step"] if metrics else None)
+        self.telemetry.record(line.text, metrics)
+        if metrics:
+            self.last_metrics = metrics
+            if "loss" in metrics:
+                self.recent_losses.append(metrics["loss"])
+            if "updt_s" in metrics:
+                self.recent_step_times.append(metrics["updt_s"] + metrics.get("data_s", 0))
+        return metrics
+
+    def recent_loss(self):
+        """Return the mean of the recently logged losses, or None."""
+        if not self.recent_losses:
+            return None
+        return sum(self.recent_losses) / len(self.recent_losses)
+
+    def steps_per_s(self):
+        """Return the recent training throughput in steps per second, or None."""
+        if not self.recent_step_times or not sum(self.recent_step_times):
+            return None
+        return len(self.recent_step_times) / sum(self.recent_step_times)
+
+    def tail(self, stream, max_chars=1000):
+        """Return the last `max_chars` characters written to `stream`."""
+        return "\n".join(self._tails[stream])[-max_chars:]
+
+    def close(self):
+        self.archive.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def run_training(cmd, output_dir, cwd="/lerobot", time_limit=None):
+    """
+    Run train.py, echoing its output live and archiving it with bounded memory.
+
+    Args:
+        cmd (list): The train.py command line
+        output_dir (str): The train.py output directory, used to place the log
+        cwd (str): Working directory of the process
+        time_limit (float): Terminate train.py after this many seconds
+
+    Returns:
+        dict: The return code, whether the time limit was hit, the wall
+        time, the last logged loss and the mean of the last few logged
+        losses (less noisy for comparing runs), the recent steps per
+        second, the last 1000 characters of
+        stdout/stderr, the path of the compressed log archive on the
+        volume, and the throughput telemetry (see training_telemetry.py)
+        with the paths it was written to in the output directory.
+    """
+    started = time.monotonic()
+    process = TrainingProcess(cmd, cwd=cwd, time_limit=time_limit)
+    with TrainingLog(log_dir_for(output_dir)) as log:
+        for line in process:
+            print(line.text)
+            log.record(line)
+    telemetry_paths = write_telemetry(log.telemetry, output_dir)
+
+    return {
+        "return_code": process.returncode,
+        "timed_out": process.timed_out,
+        "wall_time_s": time.monotonic() - started,
+        "final_loss": (log.last_metrics or {}).get("loss"),
+        "recent_loss": log.recent_loss(),
+        "steps_per_s": log.steps_per_s(),
+        "stdout_tail": log.tail("stdout"),
+        "stderr_tail": log.tail("stderr"),
+        "log_path": log.log_path,
+        "telemetry": log.telemetry.to_dict(),
+        "telemetry_paths": telemetry_paths,
+    }
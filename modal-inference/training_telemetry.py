@@ -0,0 +1,209 @@
+"""
+Throughput telemetry of a train.py run, parsed from its log lines.
+
+Every step log line of train.py carries the average update time (`updt_s`)
+and data loading time (`data_s`) per step since the previous log line.
+`ThroughputTelemetry` turns them into a compact time series: the time to the
+first logged step, steps per second, the share of each step spent waiting
+for data, and GPU memory whenever a line reports it. It also keeps a summary
+that is enough to tell whether a run was data-loader bound.
+
+The series is kept at no more than `max_points` points, so memory stays
+bounded however long the run is. Once full, neighbouring points are merged
+in pairs and later lines are averaged in groups twice as large. A point
+therefore covers a number of log lines, not a fixed time or number of
+steps, and the newest points may cover fewer lines than the others.
+"""
+
+import json
+import os
+import re
+import time
+
+TELEMETRY_DIR = "telemetry"
+
+# Keys reporting GPU memory, with the unit of values that have none: the
+# step-line style keys ("gpu_mem:12.3GB", "max_mem_gb:20.1") and nvidia-smi's
+# query field ("memory.used: 850 MiB"). Only whole keys match, so e.g.
+# "memory_efficient=1" or "mem_frac:0.9" are not read as memory.
+GPU_MEMORY_KEYS = {"gpu_mem": "gb", "gpu_mem_gb": "gb", "max_mem_gb": "gb", "memory.used": "mib"}
+_MEMORY_RE = re.compile(
+    r"(?<![\w.])(" + "|".join(re.escape(key) for key in GPU_MEMORY_KEYS) + r")\s*[:=]\s*([\d.]+)\s*([GM]i?B)?\b",
+    re.IGNORECASE
+)
+_MEMORY_UNITS_GB = {"gb": 1.0, "gib": 1.073741824, "mb": 1e-3, "mib": 1.048576e-3}
+
+SERIES_FIELDS = ["t", "step", "steps_per_s", "updt_s", "data_s", "data_fraction", "gpu_mem_gb", "loss"]
+
+
+def parse_gpu_memory(line):
+    """
+    Return the GPU memory in GB reported by a log line, or None.
+
+    Only the keys of `GPU_MEMORY_KEYS` are read. Values without a unit are
+    in the key's default unit.
+    """
+    match = _MEMORY_RE.search(line)
+    if not match:
+        return None
+    key, value, unit = match.groups()
+    try:
+        value = float(value)
+    except ValueError:
+        return None
+    if unit is None:
+        unit = GPU_MEMORY_KEYS[key.lower()]
+    return value * _MEMORY_UNITS_GB[unit.lower()]
+
+
+def _mean(values):
+    values = [value for value in values if value is not None]
+    return sum(values) / len(values) if values else None
+
+
+def merge_points(points):
+    """Merge consecutive series points into one, ending where the last one ends."""
+    merged = {"t": points[-1]["t"], "step": points[-1]["step"]}
+    for field in ["steps_per_s", "updt_s", "data_s", "data_fraction", "loss"]:
+        merged[field] = _mean(point[field] for point in points)
+    memory = [point["gpu_mem_gb"] for point in points if point["gpu_mem_gb"] is not None]
+    merged["gpu_mem_gb"] = max(memory) if memory else None
+    return merged
+
+
+class ThroughputTelemetry:
+    """
+    Collect throughput metrics from train.py output as it is read.
+
+    Args:
+        max_points (int): Largest number of points kept in the series
+        started (float): `time.monotonic()` when train.py was started,
+            defaults to now
+    """
+
+    def __init__(self, max_points=256, started=None):
+        self.max_points = max_points
+        self.started = time.monotonic() if started is None else started
+        self.started_at = time.time() - (time.monotonic() - self.started)
+        self.time_to_first_step_s = None
+        self.last_t = None
+        self.last_step = None
+        self.peak_gpu_mem_gb = None
+        self.series = []
+        self._stride = 1  # Log lines per series point
+        self._pending = []
+        self._step_lines = 0
+        self._timed_lines = 0
+        self._updt_s = 0.0
+        self._data_s = 0.0
+
+    def record(self, line, metrics=None, now=None):
+        """
+        Record a line of train.py output.
+
+        Args:
+            line (str): The output line
+            metrics (dict): Its parsed step metrics (see
+                `training_logs.parse_step_line`), None for other lines
+            now (float): `time.monotonic()` when the line was read
+        """
+        memory = parse_gpu_memory(line)
+        if memory is not None:
+            self.peak_gpu_mem_gb = max(memory, self.peak_gpu_mem_gb or 0.0)
+        if not metrics:
+            return
+
+        t = (time.monotonic() if now is None else now) - self.started
+        if self.time_to_first_step_s is None:
+            self.time_to_first_step_s = t
+        self.last_t = t
+        self.last_step = metrics["step"]
+        self._step_lines += 1
+
+        updt_s = metrics.get("updt_s")
+        data_s = metrics.get("data_s")
+        step_s = (updt_s or 0.0) + (data_s or 0.0)
+        if updt_s is not None:
+            self._timed_lines += 1
+            self._updt_s += updt_s
+            self._data_s += data_s or 0.0
+
+        self._pending.append({
+            "t": t,
+            "step": metrics["step"],
+            "steps_per_s": 1 / step_s if step_s > 0 else None,
+            "updt_s": updt_s,
+            "data_s": data_s,
+            "data_fraction": (data_s or 0.0) / step_s if step_s > 0 else None,
+            "gpu_mem_gb": memory,
+            "loss": metrics.get("loss"),
+        })
+        if len(self._pending) == self._stride:
+            self.series.append(merge_points(self._pending))
+            self._pending = []
+            if len(self.series) > self.max_points:
+                # Halve the resolution of what is kept and of what comes next
+                self.series = [merge_points(self.series[i:i + 2]) for i in range(0, len(self.series), 2)]
+                self._stride *= 2
+
+    def summary(self):
+        """Return the whole-run throughput metrics."""
+        step_s = self._updt_s + self._data_s
+        data_fraction = self._data_s / step_s if step_s > 0 else None
+        return {
+            "time_to_first_step_s": self.time_to_first_step_s,
+            "last_step_s": self.last_t,
+            "last_step": self.last_step,
+            "step_lines": self._step_lines,
+            "mean_steps_per_s": self._timed_lines / step_s if step_s > 0 else None,
+            "mean_updt_s": self._updt_s / self._timed_lines if self._timed_lines else None,
+            "mean_data_s": self._data_s / self._timed_lines if self._timed_lines else None,
+            "data_fraction": data_fraction,
+            # More time waiting for batches than computing them
+            "data_loader_bound": data_fraction > 0.5 if data_fraction is not None else None,
+            "peak_gpu_mem_gb": self.peak_gpu_mem_gb,
+        }
+
+    def points(self):
+        """Return the time series, including the lines not merged into a point yet."""
+        return self.series + ([merge_points(self._pending)] if self._pending else [])
+
+    def to_dict(self):
+        return {"summary": self.summary(), "series": self.points()}
+
+
+def write_telemetry(telemetry, output_dir, name=None):
+    """
+    Write the telemetry next to the checkpoints, in `<output_dir>/telemetry/`,
+    as `<name>.json` (summary and series) and `<name>.parquet` (series, if
+    pandas and pyarrow are installed).
+
+    `name` defaults to `throughput_<UTC start time>`, so the calls of a
+    resumed run each keep their own file. Nothing is written if
+    `output_dir` does not exist, since train.py refuses to start in an
+    existing output_dir.
+
+    Returns:
+        list: The paths written
+    """
+    if not os.path.isdir(output_dir):
+        return []
+    name = name or time.strftime("throughput_%Y%m%dT%H%M%S", time.gmtime(telemetry.started_at))
+    telemetry_dir = os.path.join(output_dir, TELEMETRY_DIR)
+    os.makedirs(telemetry_dir, exist_ok=True)
+
+    data = telemetry.to_dict()
+    json_path = os.path.join(telemetry_dir, f"{name}.json")
+    with open(json_path, "w") as f:
+        json.dump(data, f, indent=2)
+    paths = [json_path]
+
+    try:
+        import pandas as pd
+
+        parquet_path = os.path.join(telemetry_dir, f"{name}.parquet")
+        pd.DataFrame(data["series"], columns=SERIES_FIELDS).to_parquet(parquet_path)
+        paths.append(parquet_path)
+    except ImportError:
+        pass
+    return paths